@@ -1,8 +1,10 @@
 from __future__ import annotations
+import os
+import sys
 import numpy as np
 from custom_types import Vector
 from board import Board
-from typing import TYPE_CHECKING, Callable
+from typing import TYPE_CHECKING, Callable, List, Optional
 
 # This is for static type-checking
 # Your IDE will interpret this as true, but it won't be true at run-time
@@ -56,16 +58,42 @@ def oob_check(board: Board, location: Vector) -> bool:
     :param location: the coordinates of the square as a 2x1 column vector
     :return: True if the square exists, False if not
     """
-    if location[0] < 0 or location[0] > board.board_array.shape[0] - 1:
+    if location[0] < 0 or location[0] > board.shape[0] - 1:
         return False
-    elif location[1] < 0 or location[1] > board.board_array.shape[1] - 1:
+    elif location[1] < 0 or location[1] > board.shape[1] - 1:
         return False
     else:
         return True
 
 
+def current_memory() -> int:
+    """
+    Measures how much memory the current process is using
+    :return: the resident set size in bytes (or the peak resident set size, if the current one can't be read,
+    or 0 if neither can, e.g. on Windows)
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    # not on Linux -- resource is Unix-only, so it's only imported here
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
 class Prompt:
     """Idk what I'm doing"""
+    # the command line slot and card a prompt was pushed for by Mech.read_command_line()
+    # (prompts pushed later on, while a card is being executed, keep None)
+    slot: Optional[int] = None
+    card: Optional[str] = None
+
     def __init__(self, num_options: int, executable: Callable[['Mech', int], None]):
         """
         This class's sole purpose is to store functions that the engine/player can execute depending on a choice,
@@ -78,6 +106,17 @@ class Prompt:
         self.executable: Callable[['Mech', int], None] = executable
 
 
+class ChancePrompt(Prompt):
+    """A Prompt whose option isn't picked by anyone, but drawn at random (e.g. a damage card)"""
+    def __init__(self, probabilities: List[float], executable: Callable[['Mech', int], None]):
+        """
+        :param probabilities: the chance of every option (should add up to 1)
+        :param executable: same as for a Prompt
+        """
+        super().__init__(len(probabilities), executable)
+        self.probabilities: List[float] = probabilities
+
+
 class CustomError(Exception):
     """Used to raise an Error with whatever message you want"""
     def __init__(self, message="An error occurred - good luck"):
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, NamedTuple, Optional
+from engine import SearchBudget
+from puzzles import Puzzle, load_puzzle
+from solve import solve, SolveCache, SolveOptions
+
+# Solves every puzzle file in a directory, several puzzles at a time.
+# Every puzzle streams its results into its own JSON-lines file (one line per searched job) as they're found,
+# and a summary table is printed once everything is done.
+
+
+class PuzzleSummary(NamedTuple):
+    name: str
+    jobs: int
+    wins: int
+    nodes: int
+    partial: int  # jobs that ran out of budget
+    seconds: float
+
+
+def solve_puzzle_file(path: str, output_directory: str, budget: Optional[SearchBudget] = None) -> PuzzleSummary:
+    """
+    Solves a single puzzle file, writing every result to <output_directory>/<puzzle name>.jsonl as it comes in
+    :param path: path of the puzzle file
+    :param output_directory: where the results file goes
+    :param budget: limits for every single job
+    :return: a PuzzleSummary
+    """
+    start_time = time.perf_counter()
+    puzzle: Puzzle = load_puzzle(path)
+    cache = SolveCache()
+    options = SolveOptions(budget=budget)
+    jobs = wins = nodes = partial = 0
+    with open(os.path.join(output_directory, f'{puzzle.name}.jsonl'), 'w') as output:
+        for mech_pose in puzzle.mech_poses:
+            for result in solve(puzzle.template, mech_pose, puzzle.cards, puzzle.decksizes, options, cache):
+                jobs += 1
+                wins += result.search.wins
+                nodes += result.search.nodes
+                partial += result.search.status == 'partial'
+                output.write(json.dumps({
+                    'position': list(mech_pose[0]), 'orientation': list(result.orientation),
+                    'cmd_line': list(result.cmd_line), 'status': result.search.status,
+                    'wins': result.search.wins, 'nodes': result.search.nodes,
+                    'best_minions': result.search.best_minions, 'seconds': result.search.seconds
+                }) + '\n')
+                output.flush()
+    return PuzzleSummary(puzzle.name, jobs, wins, nodes, partial, time.perf_counter() - start_time)
+
+
+def run_batch(puzzle_directory: str, output_directory: str, workers: int = os.cpu_count() or 1,
+              budget: Optional[SearchBudget] = None) -> List[PuzzleSummary]:
+    """
+    Solves every .json puzzle file in a directory, several at a time
+    :param puzzle_directory: directory with the puzzle files
+    :param output_directory: directory the result files are written to (created if needed)
+    :param workers: number of puzzles solved at the same time
+    :param budget: limits for every single job
+    :return: a PuzzleSummary for every puzzle, in the order they finished
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    paths = sorted(os.path.join(puzzle_directory, name) for name in os.listdir(puzzle_directory)
+                   if name.endswith('.json'))
+    summaries: List[PuzzleSummary] = []
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(solve_puzzle_file, path, output_directory, budget) for path in paths]
+        for future in as_completed(futures):
+            summaries.append(future.result())
+    return summaries
+
+
+def summary_table(summaries: List[PuzzleSummary]) -> str:
+    """Formats the summaries as a table"""
+    name_width = max([len('puzzle')] + [len(summary.name) for summary in summaries])
+    lines = [f"{'puzzle':<{name_width}}  {'jobs':>8}  {'wins':>6}  {'nodes':>12}  {'partial':>7}  {'seconds':>9}"]
+    for summary in sorted(summaries, key=lambda summary: summary.name):
+        lines.append(f'{summary.name:<{name_width}}  {summary.jobs:>8}  {summary.wins:>6}  {summary.nodes:>12}  '
+                     f'{summary.partial:>7}  {summary.seconds:>9.2f}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve every puzzle file in a directory')
+    parser.add_argument('puzzle_directory')
+    parser.add_argument('output_directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--max-nodes', type=int, default=None)
+    parser.add_argument('--max-seconds', type=float, default=None)
+    arguments = parser.parse_args()
+    batch_budget = SearchBudget(arguments.max_nodes, arguments.max_seconds)
+    print(summary_table(run_batch(arguments.puzzle_directory, arguments.output_directory, arguments.workers,
+                                  batch_budget)))
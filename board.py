@@ -1,6 +1,7 @@
 import numpy as np
 from numpy.typing import NDArray
-from typing import TYPE_CHECKING, Tuple, List
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Set, Tuple, List, Iterable, Iterator, Optional
 from custom_types import NDArray2D
 
 # This is for static type-checking
@@ -8,6 +9,27 @@ from custom_types import NDArray2D
 # It's only for the type hints in Tile.place_thing()
 if TYPE_CHECKING:
     from entities import Entity, Mech
+    from board_tables import BoardTables
+
+
+# the squares looked at through Board.__getitem__ while record_reads() is active (None the rest of the time)
+read_log: Optional[Set[Tuple[int, int]]] = None
+
+
+@contextmanager
+def record_reads() -> Iterator[Set[Tuple[int, int]]]:
+    """
+    Records every square any Board is indexed at inside the with block (only squares looked at one by one,
+    not the whole-board scans like count_minions()), e.g. to find out which squares a search depended on
+    :return: yields the set the squares are added to
+    """
+    global read_log
+    previous: Optional[Set[Tuple[int, int]]] = read_log
+    read_log = set()
+    try:
+        yield read_log
+    finally:
+        read_log = previous
 
 
 class Tile:
@@ -99,6 +121,26 @@ class Tile:
             return False
 
 
+class TileArray:
+    """
+    A 2D grid of Tiles that works like a NumPy object array for everything the code uses it for
+    (.shape, [x, y] indexing, and .flat). It's made of a plain Python list instead, because NumPy object arrays
+    are invisible to the garbage collector: every Board -> Tile -> Entity -> Board reference cycle that went through
+    one could never be freed, so every copied Board leaked.
+    """
+
+    def __init__(self, shape: Tuple[int, int], tiles: Optional[List[Tile]] = None) -> None:
+        """
+        :param shape: (width, height) of the grid
+        :param tiles: the Tiles in row-major order. If None, the grid is filled with new empty Tiles
+        """
+        self.shape: Tuple[int, int] = shape
+        self.flat: List[Tile] = tiles if tiles is not None else [Tile() for _ in range(shape[0] * shape[1])]
+
+    def __getitem__(self, index: Tuple[int, int]) -> Tile:
+        return self.flat[index[0] * self.shape[1] + index[1]]
+
+
 class Board:
     def __init__(self, boardspace: NDArray2D) -> None:
         """
@@ -106,17 +148,15 @@ class Board:
         :param boardspace: a 2D NDArray of the desired shape -- it doesn't matter what it actually contains
         """
         # makes new array full of new Tiles
-        def create_tile(x, y):
-            return Tile()
-
-        # if the code is changed such that the Tiles know their own location, then use this function instead:
-        # def create_tile(x, y):
-        #     return Tile(x, y)
-
-        vectorized_create_tile = np.vectorize(create_tile, otypes=[object])
-
-        self.board_array: NDArray[Tile] = np.fromfunction(vectorized_create_tile, boardspace.shape, dtype=object)
+        # if the code is changed such that the Tiles know their own location, then TileArray needs to pass it in
+        self.board_array: TileArray = TileArray(boardspace.shape)
         self.players: List['Mech'] = []
+        # precomputed lookup tables (see board_tables.py) -- optional, the cards work without them
+        self.tables: Optional['BoardTables'] = None
+        # the damage cards left in the deck, as a count per kind (see Mech.damage_kinds). None means a full deck
+        self.damage_deck: Optional[Tuple[int, ...]] = None
+        # the square the Bomb has to be brought to (None if the puzzle doesn't have one)
+        self.repair_pad: Optional[Tuple[int, int]] = None
 
     def __getitem__(self, index: Tuple[int, int]) -> Tile:
         """
@@ -124,7 +164,229 @@ class Board:
         :param index: a tuple of 2 ints, (x, y) coordinates
         :return: the Tile object that is stored at that position
         """
-        # My IDE does not like the return type; it thinks it's an ndarray[Any, dtype[Tile]] instead of a Tile object
-        # idk why
+        if read_log is not None:
+            read_log.add((int(index[0]), int(index[1])))
         return self.board_array[index]
 
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """(width, height) of the board"""
+        return self.board_array.shape
+
+    def tiles(self) -> Iterator[Tuple[Tuple[int, int], Tile]]:
+        """
+        Goes through every Tile of the board (like np.ndenumerate)
+        :return: yields ((x, y), Tile) pairs
+        """
+        height: int = self.board_array.shape[1]
+        for i, tile in enumerate(self.board_array.flat):
+            yield divmod(i, height), tile
+
+    def stored_tiles(self) -> Iterator[Tuple[Tuple[int, int], Tile]]:
+        """
+        Goes through every Tile that could have something on it or be oiled (for a dense board, that's all of them)
+        :return: yields ((x, y), Tile) pairs
+        """
+        return self.tiles()
+
+    def occupied(self) -> Iterator[Tuple[Tuple[int, int], Tile]]:
+        """
+        Goes through every Tile that has an Entity on it
+        :return: yields ((x, y), Tile) pairs
+        """
+        height: int = self.board_array.shape[1]
+        for i, tile in enumerate(self.board_array.flat):
+            if tile.thing is not None:
+                yield divmod(i, height), tile
+
+
+class SparseTile(Tile):
+    """
+    A Tile of a SparseBoard. Empty, unoiled Tiles aren't stored anywhere: the board hands out a new one every time
+    such a square is looked at, and the Tile only adds itself to the board once something is placed on it
+    (or oil is spilled on it). It takes itself back out once it's empty and unoiled again.
+    """
+
+    def __init__(self, board: 'SparseBoard', index: Tuple[int, int]) -> None:
+        super().__init__()
+        self.board: SparseBoard = board
+        self.index: Tuple[int, int] = index
+
+    def spill_oil(self) -> None:
+        super().spill_oil()
+        self.board.cells[self.index] = self
+
+    def place_thing(self, thing: 'Entity') -> None:
+        super().place_thing(thing)
+        self.board.cells[self.index] = self
+
+    def remove_thing(self) -> None:
+        super().remove_thing()
+        if not self.oil and self.board.cells.get(self.index) is self:
+            del self.board.cells[self.index]
+
+
+class SparseBoard(Board):
+    """
+    A Board that only stores the squares that have something on them or are oiled, in a dictionary.
+    It works exactly like a Board (same indexing, same Tiles), but on big, mostly empty maps it's a lot smaller,
+    which makes copying it (once for every branch of the search) a lot cheaper. See choose_backend().
+    """
+
+    def __init__(self, boardspace: NDArray2D) -> None:
+        """
+        Creates an empty sparse board object with the same shape as an input NDArray.
+        :param boardspace: a 2D NDArray of the desired shape -- it doesn't matter what it actually contains
+        """
+        self.size: Tuple[int, int] = (int(boardspace.shape[0]), int(boardspace.shape[1]))
+        self.cells: Dict[Tuple[int, int], SparseTile] = {}
+        self.players: List['Mech'] = []
+        self.tables: Optional['BoardTables'] = None
+        self.damage_deck: Optional[Tuple[int, ...]] = None
+        self.repair_pad: Optional[Tuple[int, int]] = None
+
+    def __getitem__(self, index: Tuple[int, int]) -> Tile:
+        key: Tuple[int, int] = (int(index[0]), int(index[1]))
+        if read_log is not None:
+            read_log.add(key)
+        tile: Optional[SparseTile] = self.cells.get(key)
+        if tile is None:
+            tile = SparseTile(self, key)
+        return tile
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.size
+
+    def tiles(self) -> Iterator[Tuple[Tuple[int, int], Tile]]:
+        for x in range(self.size[0]):
+            for y in range(self.size[1]):
+                yield (x, y), self[(x, y)]
+
+    def stored_tiles(self) -> Iterator[Tuple[Tuple[int, int], Tile]]:
+        return iter(list(self.cells.items()))
+
+    def occupied(self) -> Iterator[Tuple[Tuple[int, int], Tile]]:
+        return ((index, tile) for index, tile in list(self.cells.items()) if tile.thing is not None)
+
+
+# boards with at most this fraction of their squares occupied or oiled are made sparse. Copying a dense Board costs
+# the same no matter what's on it, while a SparseBoard only copies what's there: in board_benchmark.py the sparse one
+# searched faster up to about half the squares filled, on every size from 6x6 to 80x80
+sparse_max_density: float = 0.4
+
+
+def choose_backend(shape: Tuple[int, int], stored_squares: int) -> str:
+    """
+    Picks the Board class for a map
+    :param shape: (width, height) of the board
+    :param stored_squares: how many squares have something on them or are oiled
+    :return: 'dense' or 'sparse'
+    """
+    if stored_squares <= sparse_max_density * shape[0] * shape[1]:
+        return 'sparse'
+    return 'dense'
+
+
+class BoardTemplate:
+    """
+    A frozen description of a starting board: its size, where the Minions start, which squares are oiled,
+    where the walls are, and where the Bomb and the repair pad are (if the puzzle has them). Fresh Boards are made from it with instantiate(), which is a lot cheaper than
+    deep-copying an existing Board. Nothing about a BoardTemplate can be changed after it's made,
+    so it can be handed to worker processes once and shared between every job.
+    """
+
+    __slots__ = ('shape', 'minions', 'oil', 'walls', 'bomb', 'repair_pad')
+
+    def __init__(self, shape: Tuple[int, int], minions: Iterable = (), oil: Iterable = (),
+                 walls: Iterable[Tuple[Tuple[int, int], Tuple[int, int], bool]] = (),
+                 bomb: Optional[Tuple[Tuple[int, int], int]] = None,
+                 repair_pad: Optional[Tuple[int, int]] = None) -> None:
+        """
+        :param shape: (width, height) of the board
+        :param minions: (x, y) squares with a Minion on them (e.g. an Nx2 "Matrix")
+        :param oil: (x, y) squares that are oiled (e.g. an Nx2 "Matrix")
+        :param walls: ((x, y), spike orientation, is_spiked) triples
+        :param bomb: ((x, y), HP) of the Bomb, or None if there isn't one
+        :param repair_pad: (x, y) of the square the Bomb has to be brought to, or None
+        """
+        oil_mask: NDArray[np.bool_] = np.zeros(shape, dtype=bool)
+        for x, y in oil:
+            if 0 <= x < shape[0] and 0 <= y < shape[1]:
+                oil_mask[x, y] = True
+        oil_mask.setflags(write=False)
+        object.__setattr__(self, 'shape', (int(shape[0]), int(shape[1])))
+        object.__setattr__(self, 'minions', tuple((int(x), int(y)) for x, y in minions
+                                                  if 0 <= x < shape[0] and 0 <= y < shape[1]))
+        object.__setattr__(self, 'oil', oil_mask)
+        object.__setattr__(self, 'walls', tuple(((int(position[0]), int(position[1])),
+                                                 (int(orientation[0]), int(orientation[1])), bool(is_spiked))
+                                                for position, orientation, is_spiked in walls))
+        object.__setattr__(self, 'bomb', ((int(bomb[0][0]), int(bomb[0][1])), int(bomb[1]))
+                           if bomb is not None else None)
+        object.__setattr__(self, 'repair_pad', (int(repair_pad[0]), int(repair_pad[1]))
+                           if repair_pad is not None else None)
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError('BoardTemplates are frozen')
+
+    def __reduce__(self):
+        # __slots__ + a blocked __setattr__ means pickle needs to be told how to rebuild it
+        oil_squares = [tuple(square) for square in np.argwhere(self.oil)]
+        return BoardTemplate, (self.shape, self.minions, oil_squares, self.walls, self.bomb, self.repair_pad)
+
+    @classmethod
+    def from_board(cls, board: Board) -> 'BoardTemplate':
+        """
+        Freezes the current state of a Board (ignoring any Mechs)
+        :param board: the Board
+        :return: a BoardTemplate
+        """
+        minions, oil, walls = [], [], []
+        bomb: Optional[Tuple[Tuple[int, int], int]] = None
+        for index, tile in board.stored_tiles():
+            if tile.is_oiled():
+                oil.append(index)
+            if tile.has_minion():
+                minions.append(index)
+            elif tile.has_wall():
+                walls.append((index, tuple(tile.thing.orientation), tile.thing.is_spiked))
+            elif tile.has_friendly() and tile.thing.is_bomb:
+                bomb = (index, tile.thing.health)
+        return cls(board.shape, minions, oil, walls, bomb, board.repair_pad)
+
+    def instantiate(self, tables: Optional['BoardTables'] = None, backend: Optional[str] = None) -> Board:
+        """
+        Makes a fresh Board with the Minions, oil, walls and Bomb of the template
+        :param tables: precomputed lookup tables for boards of this size, shared with the new Board
+        :param backend: 'dense' for a Board, 'sparse' for a SparseBoard, or None to pick by density (choose_backend())
+        :return: the Board
+        """
+        # imported here since entities.py imports this file
+        from entities import Bomb, Minion, Wall
+
+        if backend is None:
+            # +1 for the Mech that's usually put on it
+            backend = choose_backend(self.shape, len(self.minions) + len(self.walls) + int(self.oil.sum()) + 1 +
+                                     int(self.bomb is not None))
+        if backend == 'sparse':
+            board: Board = SparseBoard(self.oil)
+            for x, y in np.argwhere(self.oil):
+                board[(x, y)].spill_oil()
+        else:
+            board: Board = Board.__new__(Board)
+            board.board_array = TileArray(self.shape)
+            board.players = []
+            board.damage_deck = None
+            for tile, oiled in zip(board.board_array.flat, self.oil.flat):
+                tile.oil = bool(oiled)
+        board.tables = tables
+        board.repair_pad = self.repair_pad
+        for x, y in self.minions:
+            Minion(board, np.array([x, y]))
+        for (x, y), orientation, is_spiked in self.walls:
+            Wall(board, np.array([x, y]), np.array(orientation), is_spiked)
+        if self.bomb is not None:
+            (x, y), health = self.bomb
+            Bomb(board, np.array([x, y]), health)
+        return board
@@ -0,0 +1,97 @@
+import random
+import time
+import tracemalloc
+import numpy as np
+from copy import deepcopy
+from typing import List, NamedTuple, Tuple
+from board import Board, BoardTemplate
+from engine import engine, SearchBudget
+from entities import Mech
+from game_flow import load_command_line, occupancy
+
+# Compares the dense Board with the SparseBoard on random maps of different sizes and densities.
+# The numbers that matter for the search are how long a copy takes (every branch copies the whole board)
+# and how many nodes per second the engine gets through; board.choose_backend() is tuned from these.
+
+Cell = Tuple[int, int]
+
+
+class BenchmarkRow(NamedTuple):
+    size: int
+    density: float
+    backend: str
+    copy_us: float  # microseconds per deepcopy
+    kilobytes: float  # memory of one board
+    scan_us: float  # microseconds per occupancy() call
+    nodes_per_second: float
+
+
+def random_template(size: int, density: float, rng: random.Random) -> Tuple[BoardTemplate, Cell]:
+    """
+    Makes a random square map
+    :param size: width and height of the map
+    :param density: roughly the fraction of squares that have a Minion, a wall or oil on them
+    :param rng: random number generator
+    :return: the template and a free square for the Mech
+    """
+    squares: List[Cell] = [(x, y) for x in range(size) for y in range(size)]
+    rng.shuffle(squares)
+    used: int = max(3, int(density * size * size))
+    minions, walls, oil = squares[1:used // 2 + 1], squares[used // 2 + 1:used * 3 // 4 + 1], squares[used * 3 // 4 + 1:used + 1]
+    return BoardTemplate((size, size), minions, oil, [(square, (1, 0), False) for square in walls]), squares[0]
+
+
+def measure(template: BoardTemplate, mech_square: Cell, backend: str, repeats: int = 50) -> Tuple[float, ...]:
+    """
+    Measures one map with one backend
+    :return: (copy_us, kilobytes, scan_us, nodes_per_second)
+    """
+    tracemalloc.start()
+    board: Board = template.instantiate(backend=backend)
+    mech = Mech(board, np.array(mech_square), np.array([1, 0]), 'Benchmark')
+    kilobytes: float = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        deepcopy(board)
+    copy_us: float = (time.perf_counter() - start_time) / repeats * 1e6
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        occupancy(board)
+    scan_us: float = (time.perf_counter() - start_time) / repeats * 1e6
+
+    load_command_line(mech, ['Fuel Tank1', 'Cyclotron2', 'Omnistomp1', 'Speed1'])
+    result = engine(board, mech, SearchBudget(max_nodes=2000))
+    nodes_per_second: float = result.nodes / max(result.seconds, 1e-9)
+    return copy_us, kilobytes, scan_us, nodes_per_second
+
+
+def run_benchmark(sizes: Tuple[int, ...] = (6, 10, 20, 40, 80), densities: Tuple[float, ...] = (0.02, 0.1, 0.3),
+                  seed: int = 0) -> List[BenchmarkRow]:
+    """
+    Runs the benchmark on every combination of size and density, with both backends
+    :return: a BenchmarkRow for every combination and backend
+    """
+    rng = random.Random(seed)
+    rows: List[BenchmarkRow] = []
+    for size in sizes:
+        for density in densities:
+            template, mech_square = random_template(size, density, rng)
+            for backend in ('dense', 'sparse'):
+                rows.append(BenchmarkRow(size, density, backend, *measure(template, mech_square, backend)))
+    return rows
+
+
+def benchmark_table(rows: List[BenchmarkRow]) -> str:
+    """Formats the rows as a table"""
+    lines = [f"{'size':>5}  {'density':>7}  {'backend':>7}  {'copy us':>9}  {'KB':>8}  {'scan us':>9}  {'nodes/s':>9}"]
+    for row in rows:
+        lines.append(f'{row.size:>5}  {row.density:>7.2f}  {row.backend:>7}  {row.copy_us:>9.1f}  {row.kilobytes:>8.1f}  '
+                     f'{row.scan_us:>9.1f}  {row.nodes_per_second:>9.0f}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    print(benchmark_table(run_benchmark()))
@@ -0,0 +1,234 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from numpy.typing import NDArray
+from typing import Dict, List, Optional, Tuple
+
+# Per-board lookup tables, so the cards don't have to work out which squares around the Mech exist
+# every single time they scan. They only depend on the size of the board, so they're built once
+# and then shared by every Board of that size (copying a Board doesn't copy its tables).
+#
+# Building them for a big board takes a while, and every process of a sweep would do it again, so they can also be
+# kept on disk (BoardTables.load()): every table is packed into two .npy arrays (where every square's list starts,
+# and all the squares one after the other), which are memory-mapped, and a square's list is only unpacked
+# the first time it's asked for. A process that only looks at a few squares never pays for the rest.
+
+Cell = Tuple[int, int]
+# (where every square's list starts in the squares array, the squares), see BoardTables.pack()
+PackedTable = Tuple[NDArray[np.int32], NDArray[np.int16]]
+
+# the version of the files written by BoardTables.save(): change it whenever the tables change, and the
+# old files are left alone (they're in a directory of their own)
+tables_version: int = 1
+
+
+def default_table_directory() -> str:
+    """Where the tables are kept on disk: $BOARD_TABLES_DIR if it's set, ~/.cache/board_tables otherwise"""
+    return os.environ.get('BOARD_TABLES_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'board_tables'))
+
+
+def table_path(directory: str, shape: Tuple[int, int]) -> str:
+    """The directory the tables of a board size are kept in"""
+    return os.path.join(directory, f'v{tables_version}', f'{shape[0]}x{shape[1]}')
+
+
+def scan_offsets(radius: int, towing: Optional[Cell] = None) -> List[Cell]:
+    """
+    Lists the offsets (relative to the Mech) that Mech.scan() looks at, in the order it looks at them
+    :param radius: int representing searching distance
+    :param towing: the towing direction (see Mech.scan()), or None
+    :return: a list of (x, y) offsets
+    """
+    offsets: List[Cell] = []
+    for x in range(-radius, radius + 1):
+        for y in range(-radius, radius + 1):
+            if x != 0 or y != 0:
+                if towing is not None:
+                    if x != 0 and y != 0:
+                        break
+                    elif x == towing[0] and y == towing[1]:
+                        break
+                offsets.append((x, y))
+    return offsets
+
+
+class BoardTables:
+    # the scans the cards actually use: Scythe (1), Hexmatic Aimbot (3), and towing (1, in every direction)
+    default_scans: List[Tuple[int, Optional[Cell]]] = [(1, None), (3, None), (1, (1, 0)), (1, (0, 1)),
+                                                       (1, (-1, 0)), (1, (0, -1))]
+
+    def __init__(self, shape: Tuple[int, int], build: bool = True) -> None:
+        """
+        Builds the lookup tables for a board of a certain size
+        :param shape: (width, height) of the board
+        :param build: if False, the tables are left empty (load() fills them from disk)
+        """
+        self.shape: Tuple[int, int] = (int(shape[0]), int(shape[1]))
+        # (radius, towing) -> one list of in-bounds squares per square of the board, in row-major order
+        # (a None is a list that hasn't been unpacked from self.packed yet)
+        self.neighbours: Dict[Tuple[int, Optional[Cell]], List[Optional[List[Cell]]]] = {}
+        # the 4 diagonal neighbours of every square (for Chain Lightning)
+        self.diagonals: List[Optional[List[Cell]]] = []
+        # table name -> the memory-mapped arrays the lists are unpacked from (only if the tables were loaded)
+        self.packed: Dict[str, PackedTable] = {}
+        # the directory the tables were loaded from (None if they were built in this process)
+        self.directory: Optional[str] = None
+        if build:
+            for radius, towing in self.default_scans:
+                self.build_scan(radius, towing)
+            self.diagonals = self.build_pattern([(-1, -1), (-1, 1), (1, -1), (1, 1)])
+
+    def build_pattern(self, offsets: List[Cell]) -> List[List[Cell]]:
+        """
+        Applies a list of offsets to every square of the board, keeping only the squares that exist
+        :param offsets: (x, y) offsets
+        :return: one list of squares per square of the board, in row-major order
+        """
+        width, height = self.shape
+        return [[(x + dx, y + dy) for dx, dy in offsets if 0 <= x + dx < width and 0 <= y + dy < height]
+                for x in range(width) for y in range(height)]
+
+    def build_scan(self, radius: int, towing: Optional[Cell]) -> List[List[Cell]]:
+        table = self.build_pattern(scan_offsets(radius, towing))
+        self.neighbours[(radius, towing)] = table
+        return table
+
+    def squares_around(self, position: Cell, radius: int, towing: Optional[Cell] = None) -> List[Cell]:
+        """
+        The squares Mech.scan() checks around a position (only the ones that exist)
+        :param position: (x, y) of the Mech
+        :param radius: int representing searching distance
+        :param towing: the towing direction, or None
+        :return: a list of squares
+        """
+        table = self.neighbours.get((radius, towing))
+        if table is None:
+            table = self.build_scan(radius, towing)
+        index: int = position[0] * self.shape[1] + position[1]
+        squares: Optional[List[Cell]] = table[index]
+        if squares is None:
+            squares = table[index] = self.unpack(scan_name(radius, towing), index)
+        return squares
+
+    def diagonal_squares(self, position: Cell) -> List[Cell]:
+        """The diagonal neighbours of a position (only the ones that exist)"""
+        index: int = position[0] * self.shape[1] + position[1]
+        squares: Optional[List[Cell]] = self.diagonals[index]
+        if squares is None:
+            squares = self.diagonals[index] = self.unpack('diagonals', index)
+        return squares
+
+    # -- Keeping them on disk --
+
+    @staticmethod
+    def pack(table: List[Optional[List[Cell]]]) -> PackedTable:
+        """Turns a table into two arrays: where every square's list starts, and all the squares one after the other"""
+        starts: NDArray[np.int32] = np.zeros(len(table) + 1, dtype=np.int32)
+        starts[1:] = np.cumsum([len(squares) for squares in table])
+        squares: NDArray[np.int16] = np.array([square for squares in table for square in squares],
+                                              dtype=np.int16).reshape(-1, 2)
+        return starts, squares
+
+    def unpack(self, name: str, index: int) -> List[Cell]:
+        """The list of one square, out of a packed table"""
+        starts, squares = self.packed[name]
+        return [(x, y) for x, y in squares[starts[index]:starts[index + 1]].tolist()]
+
+    def full_table(self, name: str, table: List[Optional[List[Cell]]]) -> List[List[Cell]]:
+        """A table with every list unpacked (for saving it again)"""
+        return [squares if squares is not None else self.unpack(name, index) for index, squares in enumerate(table)]
+
+    def save(self, directory: str) -> None:
+        """
+        Writes the tables to disk (see load()). The files are written somewhere else first and then moved into place,
+        so processes that load the tables at the same time never see half of them
+        :param directory: the top directory of the tables of every board size
+        :return: None
+        """
+        path: str = table_path(directory, self.shape)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging: str = tempfile.mkdtemp(dir=os.path.dirname(path))
+        try:
+            self._write(staging)
+        except OSError:
+            # e.g. the disk is full: don't leave half a staging directory behind
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        try:
+            os.rename(staging, path)
+        except OSError:
+            # another process got there first
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _write(self, staging: str) -> None:
+        """Writes every file of the tables into a directory (see save())"""
+        tables: Dict[str, List[Optional[List[Cell]]]] = {scan_name(*key): table for key, table in self.neighbours.items()}
+        tables['diagonals'] = self.diagonals
+        for name, table in tables.items():
+            starts, squares = self.pack(self.full_table(name, table))
+            np.save(os.path.join(staging, f'{name}_starts.npy'), starts)
+            np.save(os.path.join(staging, f'{name}_squares.npy'), squares)
+        with open(os.path.join(staging, 'index.json'), 'w') as file:
+            json.dump({'version': tables_version, 'shape': list(self.shape),
+                       'scans': [[radius, list(towing) if towing is not None else None]
+                                 for radius, towing in self.neighbours]}, file)
+
+    @classmethod
+    def load(cls, shape: Tuple[int, int], directory: Optional[str] = None) -> 'BoardTables':
+        """
+        Memory-maps the tables of a board size from disk, building (and saving) them first if they aren't there yet.
+        If they can't be saved there, the built tables are returned (with directory None)
+        :param shape: (width, height) of the board
+        :param directory: the top directory of the tables of every board size (default_table_directory() if None)
+        :return: the BoardTables
+        """
+        directory = directory if directory is not None else default_table_directory()
+        shape = (int(shape[0]), int(shape[1]))
+        path: str = table_path(directory, shape)
+        tables = cls(shape, build=False)
+        try:
+            with open(os.path.join(path, 'index.json')) as file:
+                index = json.load(file)
+            if index['version'] != tables_version or tuple(index['shape']) != shape:
+                raise ValueError(f'the tables in {path} are for something else')
+            scans: List[Tuple[int, Optional[Cell]]] = [(radius, tuple(towing) if towing is not None else None)
+                                                       for radius, towing in index['scans']]
+            for name in [scan_name(*key) for key in scans] + ['diagonals']:
+                tables.packed[name] = (np.load(os.path.join(path, f'{name}_starts.npy'), mmap_mode='r'),
+                                       np.load(os.path.join(path, f'{name}_squares.npy'), mmap_mode='r'))
+        except (OSError, ValueError, KeyError):
+            # not saved yet (or unreadable): build them, and save them for next time
+            tables = cls(shape)
+            try:
+                tables.save(directory)
+            except OSError:
+                # the directory can't be written to: the tables still work, they just aren't cached,
+                # and they're sent to worker processes whole instead of being mapped from disk there
+                return tables
+            tables.directory = directory
+            return tables
+        squares: int = shape[0] * shape[1]
+        tables.neighbours = {key: [None] * squares for key in scans}
+        tables.diagonals = [None] * squares
+        tables.directory = directory
+        return tables
+
+    def __reduce_ex__(self, protocol):
+        # tables that are on disk are sent to worker processes as just their size, and the workers map them themselves
+        if self.directory is not None:
+            return BoardTables.load, (self.shape, self.directory)
+        return super().__reduce_ex__(protocol)
+
+    def __deepcopy__(self, memo: dict) -> 'BoardTables':
+        # the tables never change, so every copy of a Board can share them
+        return self
+
+    def __copy__(self) -> 'BoardTables':
+        return self
+
+
+def scan_name(radius: int, towing: Optional[Cell]) -> str:
+    """The name a scan's table is saved under"""
+    return f'scan_{radius}' + (f'_{towing[0]}_{towing[1]}' if towing is not None else '')
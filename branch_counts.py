@@ -0,0 +1,85 @@
+import numpy as np
+from board import Board
+from entities import Mech
+from game_flow import initialize_starting_board
+from copy import deepcopy
+from typing import Dict, List, Tuple
+
+
+# Reports how many branches each card creates, before and after the cards started collapsing identical outcomes.
+# The "before" numbers are just the option counts the cards used to hand out,
+# the "after" numbers come from actually resolving the card on every square and orientation of a board.
+
+def naive_branches(card: str, level: int, num_targets: int) -> int:
+    """
+    The number of options a card used to create, before duplicate outcomes were collapsed
+    :param card: name of the card as a string
+    :param level: int from 1-3
+    :param num_targets: the number of Minions in range (only relevant for Scythe)
+    :return: the number of options
+    """
+    if card == 'Scythe':
+        if num_targets < level:
+            return level + 1
+        num_combinations = 1
+        for i in range(level):
+            num_combinations = num_combinations * (num_targets - i) // (i + 1)
+        return num_combinations * (level + 1)
+    # Fuel Tank, Cyclotron, Memory Core and Speed all had (level + 1) options
+    return level + 1
+
+
+def collapsed_branches(mech: Mech, card: str, level: int) -> int:
+    """
+    Resolves a card until it asks for a real choice and returns the number of options in that choice
+    :param mech: a Mech standing somewhere on the board (it's modified)
+    :param card: name of the card as a string
+    :param level: int from 1-3
+    :return: the number of options
+    """
+    mech.translations[card](mech, level)
+    # some cards (Short Circuit) don't ask anything at all
+    if not mech.prompt_stack:
+        return 1
+    prompt = mech.prompt_stack.pop()
+    # Scythe and Speed first scan the board, and then push the actual choice
+    while prompt.num_options == 1:
+        prompt.executable(mech, 0)
+        if not mech.prompt_stack:
+            return 1
+        prompt = mech.prompt_stack.pop()
+    return prompt.num_options
+
+
+def branch_counts(board: Board, cards: List[str]) -> Dict[Tuple[str, int], Tuple[float, float]]:
+    """
+    Averages the branch counts of some cards over every empty square and orientation of the board
+    :param board: the game board (without any Mechs on it)
+    :param cards: names of the cards to report on
+    :return: a dictionary mapping (card, level) to (average branches before, average branches after)
+    """
+    orientations = [np.array([1, 0]), np.array([0, 1]), np.array([-1, 0]), np.array([0, -1])]
+    report: Dict[Tuple[str, int], Tuple[float, float]] = {}
+    for card in cards:
+        for level in range(1, 4):
+            before: List[int] = []
+            after: List[int] = []
+            for index, tile in board.tiles():
+                if not tile.is_empty():
+                    continue
+                for orientation in orientations:
+                    mech = Mech(deepcopy(board), np.array(index), orientation.copy(), 'Report')
+                    before.append(naive_branches(card, level, len(mech.scan(1, 'Minions'))))
+                    after.append(collapsed_branches(mech, card, level))
+            report[(card, level)] = (sum(before) / len(before), sum(after) / len(after))
+    return report
+
+
+if __name__ == '__main__':
+    # the same puzzle as in main.py
+    report_board: Board = Board(np.zeros((6, 6)))
+    initialize_starting_board(report_board, np.array([[0, 2], [1, 2], [2, 0], [2, 1], [2, 4], [5, 2]]),
+                              np.array([[2, 2], [2, 3], [3, 2], [3, 3]]))
+    for (report_card, report_level), (avg_before, avg_after) in branch_counts(
+            report_board, ['Scythe', 'Fuel Tank', 'Cyclotron', 'Speed', 'Memory Core']).items():
+        print(f'{report_card}[{report_level}]: {avg_before:.2f} -> {avg_after:.2f} branches')
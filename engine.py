@@ -1,9 +1,22 @@
+import heapq
+import time
+import numpy as np
 from board import Board
-from entities import Mech
-from typing import List
-from auxiliary_functions import Prompt
+from entities import Bomb, Mech
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Set, Tuple
+from auxiliary_functions import ChancePrompt, Prompt, current_memory
 from copy import deepcopy
-from game_flow import count_minions
+from custom_types import Matrix
+from functools import partial
+from types import FunctionType
+from itertools import combinations, product
+from feasibility import Cell, Footprint, Pose, footprint_from, in_bounds, minion_squares
+from game_flow import count_minions, minions_phase, occupancy
+from objectives import Objective, find_bomb, remaining_footprint
+
+if TYPE_CHECKING:
+    from memory_monitor import MemoryMonitor
+    from tree_export import TreeRecorder
 
 
 # The engine logic shall be contained here.
@@ -14,6 +27,31 @@ from game_flow import count_minions
 # instead they should raise some sort of user-input prompt
 # which the engine can then "automate", and create branches as necessary
 
+# the budget is only checked every so often, since reading the memory usage isn't free
+budget_check_interval: int = 256
+
+
+class SearchBudget(NamedTuple):
+    max_nodes: Optional[int] = None  # number of executed prompts
+    max_seconds: Optional[float] = None  # wall time
+    max_memory: Optional[int] = None  # resident memory of the process, in bytes
+
+
+class SearchResult(NamedTuple):
+    # 'complete' if the whole tree was searched, 'partial' if the budget ran out,
+    # 'stopped' if it stopped at the first winning line (see engine(..., stop_at_first=True))
+    status: str
+    nodes: int
+    seconds: float
+    wins: int
+    best_minions: Optional[int]  # the fewest minions left on the board by any finished line (None if none finished)
+    best_mech: Optional[Mech]  # the Mech that left the fewest minions
+    # how far the search had got when it found its first winning line (None if it never did):
+    # the number of lines finished by then (the winning one included), and the time
+    first_win_lines: Optional[int] = None
+    first_win_seconds: Optional[float] = None
+
+
 def win_check(board: Board) -> bool:
     """
     Checks if the puzzle is solved
@@ -21,39 +59,635 @@ def win_check(board: Board) -> bool:
     :return: True if completed, False if failed
     """
     if count_minions(board) == 0:
-        # here check if the bomb is on the repair pad
-        print("A winning line was found")
+        # if there's a repair pad, the Bomb has to be on it too
+        if board.repair_pad is not None:
+            bomb: Optional[Bomb] = find_bomb(board)
+            if bomb is not None:
+                return (int(bomb.position[0]), int(bomb.position[1])) == tuple(board.repair_pad)
         return True
     else:
         return False
 
 
-def engine(board: Board, mech: Mech) -> None:
-    """Good Luck"""
-    # prompt_number = 1
-    # DFS
-    mech.read_command_line()
+def over_budget(budget: SearchBudget, nodes: int, start_time: float) -> bool:
+    """
+    Checks if a search has used up any part of its budget
+    :param budget: the SearchBudget
+    :param nodes: number of prompts executed so far
+    :param start_time: time.perf_counter() at the start of the search
+    :return: True if the search should stop
+    """
+    if budget.max_nodes is not None and nodes >= budget.max_nodes:
+        return True
+    if budget.max_seconds is not None and time.perf_counter() - start_time >= budget.max_seconds:
+        return True
+    if budget.max_memory is not None and current_memory() >= budget.max_memory:
+        return True
+    return False
+
+
+def depth_first(mech: Mech, budget: Optional[SearchBudget], start_time: float, nodes: int,
+                done: Callable[[Mech], Optional[Mech]], prune: Optional[Callable[[Mech], bool]] = None,
+                record: bool = False, tree: Optional['TreeRecorder'] = None,
+                order: Optional[Callable[[Mech, Prompt], Sequence[int]]] = None,
+                monitor: Optional['MemoryMonitor'] = None) -> Tuple[bool, int]:
+    """
+    The DFS shared by the engines: executes every option of every prompt on the Mech's prompt stack
+    :param mech: the Mech whose prompt stack is searched (its command line should already be read)
+    :param budget: limits on the search, or None
+    :param start_time: time.perf_counter() at the start of the search
+    :param nodes: number of prompts executed before this search started (counts towards the budget)
+    :param done: called with every Mech whose prompt stack runs out. It can hand over another Mech
+    (on the same board) with prompts of its own, which is then searched as well
+    :param prune: called with every Mech before its next prompt is expanded. If it returns True,
+    nothing below that Mech is searched
+    :param record: if True, every option picked is appended to the Mech's choices (which has to be a list)
+    :param tree: if given, every executed prompt is reported to it as a node of the search tree
+    :param order: called with the Mech and the prompt it just took off its stack, returns the prompt's options in the
+    order they should be searched (see move_order.py). If None, they're searched from 0 up
+    :param monitor: if given, it's shown the stack at every iteration (see memory_monitor.py). It can raise
+    MemoryBudgetExceeded
+    :return: (True if the search finished before the budget ran out, number of prompts executed in total)
+    """
+    next_budget_check: int = nodes
     mech_stack: List[Mech] = [mech]
+    if tree is not None:
+        tree.start(mech)
     while mech_stack:
+        if tree is not None:
+            # everything above this point of the stack has been searched
+            tree.close_subtrees(len(mech_stack))
+        if budget is not None and nodes >= next_budget_check:
+            if over_budget(budget, nodes, start_time):
+                if tree is not None:
+                    tree.close_subtrees(0)
+                return False, nodes
+            next_budget_check = nodes + budget_check_interval
+        if monitor is not None:
+            monitor.observe(mech_stack)
         curr_mech: Mech = mech_stack.pop()
+        if tree is not None:
+            tree.expand(curr_mech)
+        if not curr_mech.prompt_stack:
+            # only happens if the whole command line is empty
+            next_mech: Optional[Mech] = done(curr_mech)
+            if next_mech is not None:
+                mech_stack.append(next_mech)
+            continue
+        if prune is not None and prune(curr_mech):
+            continue
         top_prompt: Prompt = curr_mech.prompt_stack.pop()
+        options: Sequence[int] = range(top_prompt.num_options)
+        if order is not None and top_prompt.num_options > 1:
+            options = order(curr_mech, top_prompt)
 
-        for i in range(1, top_prompt.num_options)[::-1]:
+        # the first option goes on the stack last, so it's searched first
+        for i in options[1:][::-1]:
+            if tree is not None:
+                started: float = time.perf_counter()
             copy_mech: Mech = deepcopy(curr_mech)
             top_prompt.executable(copy_mech, i)
-            # print(f'A prompt was executed. #{prompt_number}')
-            # prompt_number += 1
+            nodes += 1
+            if record:
+                copy_mech.choices.append(i)
+            if tree is not None:
+                tree.add(copy_mech, top_prompt, i, time.perf_counter() - started, len(mech_stack))
             if not copy_mech.prompt_stack:
-                if win_check(copy_mech.board):
-                    print(copy_mech.name, copy_mech.command_line)
+                copy_mech = done(copy_mech)
+                if copy_mech is not None:
+                    mech_stack.append(copy_mech)
             else:
                 mech_stack.append(copy_mech)
 
-        top_prompt.executable(curr_mech, 0)
-        # print(f'A prompt was executed. #{prompt_number}')
-        # prompt_number += 1
+        # a prompt with no options (e.g. Hexmatic Aimbot without any targets) does nothing
+        if top_prompt.num_options > 0:
+            if tree is not None:
+                started: float = time.perf_counter()
+            top_prompt.executable(curr_mech, options[0])
+            nodes += 1
+            if record:
+                curr_mech.choices.append(options[0])
+            if tree is not None:
+                tree.add(curr_mech, top_prompt, options[0], time.perf_counter() - started, len(mech_stack))
         if not curr_mech.prompt_stack:
-            if win_check(curr_mech.board):
-                print(curr_mech.name, curr_mech.command_line)
+            curr_mech = done(curr_mech)
+            if curr_mech is not None:
+                mech_stack.append(curr_mech)
         else:
             mech_stack.append(curr_mech)
+    if tree is not None:
+        tree.close_subtrees(0)
+    return True, nodes
+
+
+def engine(board: Board, mech: Mech, budget: Optional[SearchBudget] = None,
+           on_win: Optional[Callable[[Mech], None]] = None, tree: Optional['TreeRecorder'] = None,
+           order: Optional[Callable[[Mech, Prompt], Sequence[int]]] = None,
+           stop_at_first: bool = False, monitor: Optional['MemoryMonitor'] = None) -> SearchResult:
+    """
+    Searches every way the Mech's command line could play out (DFS), and reports the winning lines
+    :param board: the game board
+    :param mech: the Mech (on the board) whose command line is searched
+    :param budget: limits on the search. If any of them is hit, the search stops and reports what it found so far
+    :param on_win: called with the finished Mech every time a winning line is found.
+    Nothing is printed by the engine itself, so keep this cheap
+    :param tree: if given, the search tree is recorded into it (see tree_export.py). It slows the search down a bit
+    :param order: the order to search the options of every prompt in (see depth_first() and move_order.py)
+    :param stop_at_first: if True, the search stops as soon as it finds a winning line
+    :param monitor: if given, the memory of the search is accounted for by it, and its report
+    (monitor.report()) is ready once the search is done. It raises MemoryBudgetExceeded if the process goes over
+    its limit (see memory_monitor.py)
+    :return: a SearchResult
+    """
+    start_time = time.perf_counter()
+    wins: int = 0
+    best_minions: Optional[int] = None
+    best_mech: Optional[Mech] = None
+    lines: int = 0
+    first_win: Optional[Tuple[int, float]] = None
+
+    def finish(finished_mech: Mech) -> None:
+        """Checks a Mech that's done executing its command line"""
+        nonlocal wins, best_minions, best_mech, lines, first_win
+        lines += 1
+        if win_check(finished_mech.board):
+            wins += 1
+            if first_win is None:
+                first_win = (lines, time.perf_counter() - start_time)
+            if on_win is not None:
+                on_win(finished_mech)
+        minions_left: int = count_minions(finished_mech.board)
+        if best_minions is None or minions_left < best_minions:
+            best_minions, best_mech = minions_left, finished_mech
+
+    def found_one(curr_mech: Mech) -> bool:
+        # once there's a win, everything left on the stack is skipped
+        return wins > 0
+
+    mech.read_command_line()
+    if monitor is not None:
+        monitor.start()
+    complete, nodes = depth_first(mech, budget, start_time, 0, finish, found_one if stop_at_first else None,
+                                  tree=tree, order=order, monitor=monitor)
+    if monitor is not None:
+        monitor.finish()
+    status: str = 'complete' if complete else 'partial'
+    if stop_at_first and wins > 0:
+        status = 'stopped'
+    return SearchResult(status, nodes, time.perf_counter() - start_time, wins, best_minions, best_mech,
+                        *(first_win if first_win is not None else (None, None)))
+
+
+# -- Objectives --
+
+class ScoredLine(NamedTuple):
+    score: float
+    choices: List[int]  # the option picked at every prompt, in order (see game_flow.resolve_prompts())
+    mech: Mech  # the Mech at the end of the line
+
+
+class OptimizeResult(NamedTuple):
+    status: str  # 'complete' if the whole tree was searched (or pruned), 'partial' if the budget ran out
+    nodes: int
+    seconds: float
+    lines: List[ScoredLine]  # the best lines, best first
+    pruned: int  # subtrees skipped because they couldn't beat the lines found so far
+
+
+def optimize(board: Board, mech: Mech, objective: Objective, top_k: int = 1,
+             budget: Optional[SearchBudget] = None) -> OptimizeResult:
+    """
+    Finds the best lines of a Mech's command line according to an objective, with branch-and-bound:
+    once top_k lines have been found, any Mech whose upper bound (see Objective.bound()) can't beat
+    the worst of them isn't searched any further
+    :param board: the game board
+    :param mech: the Mech (on the board) whose command line is searched
+    :param objective: what to maximise (see objectives.py)
+    :param top_k: how many lines to keep
+    :param budget: limits on the search
+    :return: an OptimizeResult
+    """
+    start_time = time.perf_counter()
+    # a min-heap of (score, tiebreaker, line), so the worst line kept is always on top
+    best: List[Tuple[float, int, ScoredLine]] = []
+    finished: int = 0
+    pruned: int = 0
+
+    def finish(finished_mech: Mech) -> None:
+        nonlocal finished
+        finished += 1
+        score: float = objective.score(finished_mech.board)
+        if len(best) < top_k:
+            heapq.heappush(best, (score, finished, ScoredLine(score, finished_mech.choices, finished_mech)))
+        elif score > best[0][0]:
+            heapq.heapreplace(best, (score, finished, ScoredLine(score, finished_mech.choices, finished_mech)))
+
+    def prune(curr_mech: Mech) -> bool:
+        nonlocal pruned
+        if len(best) < top_k:
+            return False
+        if objective.bound(curr_mech, remaining_footprint(curr_mech)) <= best[0][0]:
+            pruned += 1
+            return True
+        return False
+
+    mech.choices = []
+    mech.read_command_line()
+    complete, nodes = depth_first(mech, budget, start_time, 0, finish, prune, record=True)
+    lines: List[ScoredLine] = [line for _, _, line in sorted(best, key=lambda entry: (-entry[0], entry[1]))]
+    return OptimizeResult('complete' if complete else 'partial', nodes, time.perf_counter() - start_time,
+                          lines, pruned)
+
+
+# -- Several Mechs --
+# The Mechs execute their whole command lines one after another, in hourglass order (the order of board.players).
+# Every Mech multiplies the size of the tree, but Mechs that can't possibly get in each other's way don't need
+# to be searched together: whatever one of them does, the other one plays out exactly the same.
+# So the Mechs are split into independent groups (using the footprints from feasibility.py), every group is
+# searched on its own, and the results are multiplied back together. This is the same as only exploring one
+# interleaving of independent steps, except it doesn't even need to explore the cross product of the groups.
+# The Bomb is shared by everybody, but the footprints follow it (wherever a Mech could push or tow it to is part of
+# that Mech's footprint), so two Mechs that could both move it end up in the same group.
+# reduction_check.py compares the reduction with the full search.
+
+class JointSearchResult(NamedTuple):
+    status: str  # 'complete' if every group was searched completely, 'partial' if the budget ran out
+    nodes: int
+    seconds: float
+    wins: int  # the number of winning joint lines (every combination of lines of the groups counts once)
+    best_minions: Optional[int]  # the fewest minions any combination of the groups' lines leaves on the board
+    groups: List[List[int]]  # indices (into board.players) of the Mechs searched together, in hourglass order
+    best_mechs: List[Optional[Mech]]  # for every group, the last Mech of its best line (on that line's board)
+
+
+def region(board: Board, reach: Set[Cell], damage: Set[Cell]) -> Set[Cell]:
+    """
+    Every square a Mech could affect or be affected through: where it could go, what it could damage,
+    and the squares next to where it could go (pushing, towing and scanning for Minions happen there)
+    """
+    squares: Set[Cell] = reach | damage
+    for x, y in reach:
+        squares.update((x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                       if in_bounds(board, (x + dx, y + dy)))
+    return squares
+
+
+def independent_groups(board: Board, players: List[Mech]) -> Tuple[List[List[int]], List[Set[Cell]]]:
+    """
+    Splits Mechs into groups, where no Mech could interact with a Mech of another group
+    :param board: the game board
+    :param players: the Mechs (with their command lines filled in), in hourglass order
+    :return: (lists of indices into players, the damageable squares of every group)
+    """
+    poses: List[Set[Pose]] = [{((int(mech.position[0]), int(mech.position[1])),
+                                (int(mech.orientation[0]), int(mech.orientation[1])))} for mech in players]
+    while True:
+        footprints: List[Footprint] = [footprint_from(board, poses[i], mech.command_line)
+                                       for i, mech in enumerate(players)]
+        regions: List[Set[Cell]] = [region(board, *footprint) for footprint in footprints]
+        # merge overlapping regions (a tiny union-find)
+        parents: List[int] = list(range(len(players)))
+
+        def root(i: int) -> int:
+            while parents[i] != i:
+                i = parents[i]
+            return i
+
+        for i, j in combinations(range(len(players)), 2):
+            if regions[i] & regions[j]:
+                parents[root(j)] = root(i)
+        groups: Dict[int, List[int]] = {}
+        for i in range(len(players)):
+            groups.setdefault(root(i), []).append(i)
+
+        # the footprints assume nobody pushes or tows the Mech, which isn't true inside of a group:
+        # a Mech could start its command line anywhere the rest of its group can move it to
+        grown: bool = False
+        for members in groups.values():
+            if len(members) == 1:
+                continue
+            group_squares: Set[Cell] = set().union(*(regions[i] for i in members))
+            for i in members:
+                orientation: Cell = next(iter(poses[i]))[1]
+                new_poses: Set[Pose] = {(square, orientation) for square in group_squares
+                                        if not board[square].has_wall()}
+                if not new_poses <= poses[i]:
+                    poses[i] |= new_poses
+                    grown = True
+        if not grown:
+            group_list: List[List[int]] = sorted(groups.values())
+            return group_list, [set().union(*(footprints[i].damage for i in members)) for members in group_list]
+
+
+def joint_engine(board: Board, budget: Optional[SearchBudget] = None, reduce: bool = True) -> JointSearchResult:
+    """
+    Searches every way the command lines of all the Mechs on the board could play out, with the Mechs
+    executing their command lines in hourglass order (see game_flow.rotate_hourglass())
+    :param board: the game board, with every Mech's command line already filled in
+    :param budget: limits on the whole search (shared between the groups)
+    :param reduce: if False, every Mech is searched in one big group (only useful for checking the reduction)
+    :return: a JointSearchResult
+    """
+    start_time = time.perf_counter()
+    players: List[Mech] = list(board.players)
+    if reduce:
+        groups, group_damage = independent_groups(board, players)
+    else:
+        groups, group_damage = [list(range(len(players)))], [set(product(range(board.shape[0]),
+                                                                          range(board.shape[1])))]
+    minions: Set[Cell] = minion_squares(board)
+    # Minions nobody can reach stay on the board whatever happens
+    unreachable: int = len(minions - set().union(*group_damage))
+
+    nodes: int = 0
+    complete: bool = True
+    wins: int = 1 if not unreachable else 0
+    best_minions: Optional[int] = unreachable
+    best_mechs: List[Optional[Mech]] = []
+    for members, damage in zip(groups, group_damage):
+        targets: List[Cell] = sorted(minions & damage)
+        group_wins: int = 0
+        group_best: Optional[int] = None
+        group_best_mech: Optional[Mech] = None
+
+        def done(finished_mech: Mech) -> Optional[Mech]:
+            """Hands over to the next Mech of the group, or checks the line if it was the last one"""
+            nonlocal group_wins, group_best, group_best_mech
+            players_now: List[Mech] = finished_mech.board.players
+            position: int = members.index(players_now.index(finished_mech))
+            if position + 1 < len(members):
+                next_mech: Mech = players_now[members[position + 1]]
+                next_mech.read_command_line()
+                return next_mech
+            minions_left: int = sum(finished_mech.board[square].has_minion() for square in targets)
+            if minions_left == 0:
+                group_wins += 1
+            if group_best is None or minions_left < group_best:
+                group_best, group_best_mech = minions_left, finished_mech
+            return None
+
+        # the groups don't touch each other's squares, so they can all be searched on copies of the same board
+        first_mech: Mech = deepcopy(players[members[0]])
+        first_mech.read_command_line()
+        complete, nodes = depth_first(first_mech, budget, start_time, nodes, done)
+        wins *= group_wins
+        best_minions = best_minions + group_best if best_minions is not None and group_best is not None else None
+        best_mechs.append(group_best_mech)
+        if not complete:
+            break
+
+    return JointSearchResult('complete' if complete else 'partial', nodes, time.perf_counter() - start_time,
+                             wins, best_minions, groups, best_mechs)
+
+
+# -- Random damage --
+# Once Minions attack, the Mechs draw damage cards, which makes the outcome of a line random.
+# expected_engine() plays several turns and works out the exact chance of winning: at a normal prompt
+# the best option is taken, at a ChancePrompt (a damage draw) the options are averaged by their probabilities.
+# Lots of different draws end up in the same place (same board, same damage deck, same command line), so every
+# state is only evaluated once (see state_key()).
+
+class ExpectedResult(NamedTuple):
+    win_probability: float  # the chance of winning, playing the best options
+    expected_minions: float  # the expected number of Minions left at the end (when playing the best options)
+    nodes: int  # prompts executed
+    states: int  # distinct states evaluated
+    memo_hits: int  # states that were looked up instead of evaluated
+    seconds: float
+
+
+def freeze(value, keep_alive: List, in_progress: Optional[Set[int]] = None) -> Hashable:
+    """
+    Turns the arguments of a prompt into something hashable
+    :param value: anything
+    :param keep_alive: objects that are identified by their id() get added here, so their ids can't be reused
+    :param in_progress: ids of the closures being frozen further up (a closure can capture itself)
+    :return: a hashable version of the value
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return 'array', value.shape, tuple(value.flat)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item, keep_alive, in_progress) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item, keep_alive, in_progress)) for key, item in value.items()))
+    keep_alive.append(value)
+    if isinstance(value, FunctionType):
+        # the cards make new closures every time they're executed, so two copies of a Mech that made the same choices
+        # end up with different (but identical) functions on their stacks: they're identified by their code
+        # and whatever they captured instead
+        in_progress = in_progress if in_progress is not None else set()
+        if value.__closure__ is None or id(value) in in_progress:
+            return 'function', id(value.__code__)
+        in_progress.add(id(value))
+        captured: List[Hashable] = []
+        for cell in value.__closure__:
+            try:
+                captured.append(freeze(cell.cell_contents, keep_alive, in_progress))
+            except ValueError:
+                # a variable that hasn't been assigned yet
+                captured.append('empty')
+        in_progress.discard(id(value))
+        return 'function', id(value.__code__), tuple(captured)
+    return 'id', id(value)
+
+
+def prompt_key(prompt: Prompt, keep_alive: List) -> Hashable:
+    """
+    Identifies what a prompt will do. Partials and closures are identified by their function and arguments
+    (or captured variables), since copying a Mech makes new partials and executing a card makes new closures
+    """
+    executable = prompt.executable
+    if isinstance(executable, partial):
+        executable_key = (freeze(executable.func, keep_alive), freeze(executable.args, keep_alive),
+                          freeze(executable.keywords, keep_alive))
+    else:
+        executable_key = freeze(executable, keep_alive)
+    return type(prompt).__name__, prompt.num_options, executable_key
+
+
+def state_key(mech: Mech, keep_alive: List) -> Hashable:
+    """
+    Everything about a Mech's situation that can change what happens next: what's on every square,
+    where every player is and what's in their command lines, the Bomb's HP, the damage deck, and the Mech's prompt stack
+    :param mech: the Mech whose prompts are being executed
+    :param keep_alive: see freeze()
+    :return: a hashable key
+    """
+    board: Board = mech.board
+    players = tuple((int(player.position[0]), int(player.position[1]), int(player.orientation[0]),
+                     int(player.orientation[1]), tuple(player.command_line)) for player in board.players)
+    bomb: Optional[Bomb] = find_bomb(board)
+    return (occupancy(board).tobytes(), players, bomb.health if bomb is not None else None, board.damage_deck,
+            tuple(prompt_key(prompt, keep_alive) for prompt in mech.prompt_stack))
+
+
+def expected_engine(board: Board, mech: Mech, turns: int = 1, spawn_points: Sequence[Cell] = (),
+                    memoize: bool = True) -> ExpectedResult:
+    """
+    Plays the Mech's command line for several turns, with the Minion phases (and the damage they cause) in between,
+    and works out the chance of winning when the best options are always picked.
+    The state of the search is a single Mech, like in engine() (damage to other players isn't resolved)
+    :param board: the game board
+    :param mech: the Mech (on the board) whose command line is played
+    :param turns: the number of times the command line is executed. The Minions move, spawn and attack in between
+    :param spawn_points: (x, y) squares the Minions spawn from
+    :param memoize: if False, identical states are evaluated again every time (only useful for checking)
+    :return: an ExpectedResult
+    """
+    start_time = time.perf_counter()
+    spawn_array: Matrix = np.array(spawn_points, dtype=int).reshape(-1, 2)
+    memo: Dict[Hashable, Tuple[float, float]] = {}
+    # the objects whose ids are part of the memo keys
+    keep_alive: List = []
+    nodes: int = 0
+    memo_hits: int = 0
+
+    def value(curr_mech: Mech, turns_left: int, attacked: bool) -> Tuple[float, float]:
+        """(chance of winning, expected Minions left) of a state"""
+        nonlocal nodes, memo_hits
+        key = None
+        if memoize:
+            key = (state_key(curr_mech, keep_alive), turns_left, attacked)
+            if key in memo:
+                memo_hits += 1
+                return memo[key]
+
+        # like in depth_first(), the Mech itself is used up by the last option, and only the others get copies
+        if not curr_mech.prompt_stack:
+            if attacked:
+                # the damage is dealt with, so on to the next turn
+                curr_mech.read_command_line()
+                result = value(curr_mech, turns_left - 1, False)
+            elif win_check(curr_mech.board):
+                result = (1.0, 0.0)
+            elif turns_left <= 1:
+                result = (0.0, float(count_minions(curr_mech.board)))
+            else:
+                minions_phase(curr_mech.board, spawn_array)
+                result = value(curr_mech, turns_left, True)
+        else:
+            top_prompt: Prompt = curr_mech.prompt_stack.pop()
+            num_options: int = top_prompt.num_options
+            outcomes: List[Tuple[float, float]] = []
+            for i in range(1, num_options):
+                copy_mech: Mech = deepcopy(curr_mech)
+                top_prompt.executable(copy_mech, i)
+                nodes += 1
+                outcomes.append(value(copy_mech, turns_left, attacked))
+            # a prompt with no options does nothing, but still has to come off the stack
+            if num_options > 0:
+                top_prompt.executable(curr_mech, 0)
+                nodes += 1
+            outcomes.insert(0, value(curr_mech, turns_left, attacked))
+            if isinstance(top_prompt, ChancePrompt):
+                result = (sum(p * outcome[0] for p, outcome in zip(top_prompt.probabilities, outcomes)),
+                          sum(p * outcome[1] for p, outcome in zip(top_prompt.probabilities, outcomes)))
+            else:
+                result = max(outcomes, key=lambda outcome: (outcome[0], -outcome[1]))
+
+        if memoize:
+            memo[key] = result
+        return result
+
+    mech.read_command_line()
+    win_probability, expected_minions = value(mech, turns, False)
+    return ExpectedResult(win_probability, expected_minions, nodes, len(memo), memo_hits,
+                          time.perf_counter() - start_time)
+
+
+# -- Counting --
+
+class CountResult(NamedTuple):
+    status: str  # 'complete', or 'partial' if the budget ran out (the counts are then only lower bounds)
+    paths: int  # lines (ways of picking every option) that finish the command line
+    winning_paths: int  # lines that win (the same as engine().wins)
+    final_states: int  # distinct boards the lines end on
+    winning_final_states: int  # distinct boards the winning lines end on
+    best_minions: Optional[int]  # the fewest minions left by any line
+    nodes: int  # prompts executed
+    states: int  # distinct states searched (only counting the ones at the start of a card, or at the end)
+    merged: int  # times a state was reached again, and its counts were reused instead of searching it again
+    seconds: float
+
+
+def count_engine(board: Board, mech: Mech, budget: Optional[SearchBudget] = None) -> CountResult:
+    """
+    Counts the lines of a Mech's command line (and the winning ones) without going through them one by one:
+    every state is searched once (states are told apart by state_key()), and when another line reaches it,
+    its counts are added again (times however many lines lead there) instead of searching it again.
+    The lines are the same ones engine() goes through, so winning_paths is exactly engine().wins
+    :param board: the game board
+    :param mech: the Mech (on the board) whose command line is searched
+    :param budget: limits on the search
+    :return: a CountResult
+    """
+    start_time = time.perf_counter()
+    # state key -> (lines, winning lines) from that state onwards
+    memo: Dict[Hashable, Tuple[int, int]] = {}
+    keep_alive: List = []
+    final_states: Set[Hashable] = set()
+    winning_final_states: Set[Hashable] = set()
+    best_minions: Optional[int] = None
+    nodes: int = 0
+    merged: int = 0
+    next_budget_check: int = 0
+    out_of_budget: bool = False
+
+    def count(curr_mech: Mech) -> Tuple[int, int]:
+        """(lines, winning lines) from a state onwards (the Mech is used up)"""
+        nonlocal nodes, merged, next_budget_check, out_of_budget, best_minions
+        if budget is not None and nodes >= next_budget_check:
+            out_of_budget = out_of_budget or over_budget(budget, nodes, start_time)
+            next_budget_check = nodes + budget_check_interval
+        if out_of_budget:
+            return 0, 0
+        # states are only looked up where a card starts (and where the line ends): that's where lines that
+        # took different routes through a card meet up again, and keys aren't cheap enough to make everywhere
+        key = None
+        if not curr_mech.prompt_stack or curr_mech.prompt_stack[-1].slot is not None:
+            key = state_key(curr_mech, keep_alive)
+            if key in memo:
+                merged += 1
+                return memo[key]
+
+        if not curr_mech.prompt_stack:
+            final_states.add(key)
+            minions_left: int = count_minions(curr_mech.board)
+            if best_minions is None or minions_left < best_minions:
+                best_minions = minions_left
+            if win_check(curr_mech.board):
+                winning_final_states.add(key)
+                result: Tuple[int, int] = (1, 1)
+            else:
+                result = (1, 0)
+        else:
+            # like in depth_first(), the Mech itself is used up by the last option, and only the others get copies
+            top_prompt: Prompt = curr_mech.prompt_stack.pop()
+            paths = wins = 0
+            for i in range(1, top_prompt.num_options):
+                copy_mech: Mech = deepcopy(curr_mech)
+                top_prompt.executable(copy_mech, i)
+                nodes += 1
+                option_paths, option_wins = count(copy_mech)
+                paths, wins = paths + option_paths, wins + option_wins
+            # a prompt with no options does nothing, but still has to come off the stack
+            if top_prompt.num_options > 0:
+                top_prompt.executable(curr_mech, 0)
+                nodes += 1
+            option_paths, option_wins = count(curr_mech)
+            result = (paths + option_paths, wins + option_wins)
+
+        # a state that ran out of budget half way through would be remembered with the wrong counts
+        if key is not None and not out_of_budget:
+            memo[key] = result
+        return result
+
+    mech.read_command_line()
+    total_paths, total_wins = count(mech)
+    return CountResult('partial' if out_of_budget else 'complete', total_paths, total_wins, len(final_states),
+                       len(winning_final_states), best_minions, nodes, len(memo), merged,
+                       time.perf_counter() - start_time)
@@ -4,7 +4,8 @@ from abc import ABC, abstractmethod
 from board import Tile, Board
 from custom_types import Vector
 from typing import Optional, List, Dict, Callable, Tuple
-from auxiliary_functions import vector_to_tuple, oob_check, rotate, Prompt, CustomError
+from auxiliary_functions import vector_to_tuple, oob_check, rotate, Prompt, ChancePrompt, CustomError
+from board_tables import scan_offsets
 from itertools import combinations, product
 from functools import partial
 
@@ -162,9 +163,9 @@ class Minion(Entity):
                     # remove from current location, move to new location
                     self.raw_move(starting_position, tentative_position)
                 else:
-                    # search for another direction to move in (thus a new tentative position)
-                    # figure this out later
-                    pass
+                    # blocked, so stay put -- picking another direction is up to the caller
+                    # (game_flow.minions_move() already picks a detour for the whole Minion phase)
+                    break
             remaining_moves -= 1
 
     def take_damage(self) -> None:
@@ -302,6 +303,11 @@ class Mech(Friendly):
             ('Empty', 1)
         ]
         self.prompt_stack: List[Prompt] = []
+        # the options picked so far, for engines that keep track of the line (see engine.optimize())
+        self.choices: Optional[List[int]] = None
+        # (node id, command line slot, card sequence) of the node this Mech is at, if the search tree is being
+        # recorded (see tree_export.TreeRecorder)
+        self.tree_node: Optional[Tuple[int, Optional[int], Tuple[str, ...]]] = None
         self.board.players.append(self)
 
     def stack_push(self, prompt):
@@ -313,6 +319,7 @@ class Mech(Friendly):
         'Fuel Tank': 'red', 'Blaze': 'red', 'Flamespitter': 'red',
         'Cyclotron': 'yellow', 'Speed': 'yellow', 'Chain Lightning': 'yellow',
         'Memory Core': 'green', 'Omnistomp': 'green', 'Hexmatic Aimbot': 'green',
+        'Short Circuit': 'damage', 'Stuck Left': 'damage', 'Stuck Right': 'damage', 'Stuck Forward': 'damage',
         'Empty': 'none'
     }
 
@@ -348,22 +355,23 @@ class Mech(Friendly):
         :return: a list of Vectors that represent the positions of the objects found
         """
         squares: List[Vector] = []
-        for x in range(-radius, radius + 1):
-            for y in range(-radius, radius + 1):
-                if x != 0 or y != 0:
-                    if towing is not None:
-                        if x != 0 and y != 0:
-                            break
-                        elif x == towing[0] and y == towing[1]:
-                            break
-                    current_square: Vector = self.position + np.array([x, y])
-                    if oob_check(self.board, current_square):
-                        if faction == 'Minions':
-                            if self.board[vector_to_tuple(current_square)].has_minion():
-                                squares.append(current_square)
-                        elif faction == 'Mechs':
-                            if self.board[vector_to_tuple(current_square)].has_friendly():
-                                squares.append(current_square)
+        if self.board.tables is not None:
+            # the squares that exist around the Mech were worked out ahead of time
+            towing_direction: Optional[Tuple[int, int]] = None
+            if towing is not None:
+                towing_direction = (int(towing[0]), int(towing[1]))
+            candidates: List[Vector] = [np.array(square) for square in self.board.tables.squares_around(
+                (int(self.position[0]), int(self.position[1])), radius, towing_direction)]
+        else:
+            candidates: List[Vector] = [self.position + np.array(offset) for offset in scan_offsets(radius, towing)]
+            candidates = [square for square in candidates if oob_check(self.board, square)]
+        for current_square in candidates:
+            if faction == 'Minions':
+                if self.board[vector_to_tuple(current_square)].has_minion():
+                    squares.append(current_square)
+            elif faction == 'Mechs':
+                if self.board[vector_to_tuple(current_square)].has_friendly():
+                    squares.append(current_square)
         return squares
 
     def move(self, direction: Vector, num_squares: int, pushed: Optional[Entity] = None) -> None:
@@ -424,12 +432,68 @@ class Mech(Friendly):
         begin_movement_chain_prompt: Prompt = Prompt(1, begin_movement_chain)
         self.stack_push(begin_movement_chain_prompt)
 
+    def distinct_move_distances(self, direction: Vector, distances: range | List[int]) -> List[int]:
+        """
+        Collapses a set of movement distances down to the ones that can actually end up in different places.
+        A Mech can't get past a wall or the edge of the board, so every distance past that point behaves the same.
+        Towing costs 2 movement steps for 1 square, so if anything could be towed, the cap is doubled.
+        :param direction: Vector representing the direction of the movement
+        :param distances: the candidate numbers of movement steps
+        :return: a sorted list of the distances that are worth trying
+        """
+        free_squares: int = 0
+        pointer: Vector = self.position + direction
+        while oob_check(self.board, pointer) and not self.board[vector_to_tuple(pointer)].has_wall():
+            free_squares += 1
+            pointer = pointer + direction
+        # the Mech itself is always on the board, so anything beyond 1 friendly means pushing/towing is possible
+        num_friendlies: int = sum(1 for _, tile in self.board.occupied() if tile.has_friendly())
+        if num_friendlies > 1:
+            free_squares *= 2
+        return sorted({min(distance, free_squares) for distance in distances})
+
+    turn_angles: List[int] = [90, -90, 180, 0]
+
+    def turn_options(self, level: int) -> List[int]:
+        """
+        Lists the turning angles a card of a certain level allows, dropping any angles that would lead to
+        the same orientation as an earlier one
+        :param level: int from 1-3 representing the level of the card
+        :return: a list of angles (degrees), where the index is the choice number
+        """
+        angles: List[int] = []
+        orientations: List[tuple] = []
+        for angle in self.turn_angles[:level + 1]:
+            orientation: tuple = vector_to_tuple(rotate(self.orientation, angle))
+            if orientation not in orientations:
+                orientations.append(orientation)
+                angles.append(angle)
+        return angles
+
+    def turn_prompt(self, level: int) -> Prompt:
+        """
+        Creates the Prompt used by the cards that just turn the Mech (Fuel Tank and Memory Core)
+        :param level: int from 1-3 representing the level of the card
+        :return: a Prompt with one option per distinct turning angle
+        """
+        turn_angles: List[int] = self.turn_options(level)
+
+        def turn_1(mech_1: Mech, choice_1: int) -> None:
+            mech_1.turn(turn_angles[choice_1])
+
+        return Prompt(len(turn_angles), turn_1)
+
+    # the kinds of damage cards, and how many of each the damage deck starts with
+    damage_kinds: List[str] = ['Short Circuit', 'Stuck Left', 'Stuck Right', 'Stuck Forward']
+    damage_deck_counts: Tuple[int, ...] = (4, 3, 3, 3)
+
     def take_damage(self) -> None:
         """
-        Draws a damage card -- this will be implemented much later
+        Draws a damage card from the damage deck (see Board.damage_deck), and rolls a d6 for the slot it goes into,
+        replacing whatever card was there. Both are random, so this pushes a ChancePrompt (once it's reached)
         :return: None
         """
-        raise NotImplementedError
+        self.stack_push(Prompt(1, draw_damage))
 
     def scythe(self, level: int) -> None:
 
@@ -441,24 +505,16 @@ class Mech(Friendly):
                 damage_combinations: List[tuple[Vector]] = [tuple(squares_with_minions)]
             else:
                 damage_combinations: List[tuple[Vector]] = list(combinations(squares_with_minions, level))
-            num_damage_combinations: int = len(damage_combinations)
+            turn_angles: List[int] = mech_1.turn_options(level)
 
             def scythe_2(mech_2: Mech, choice_2: int) -> None:
                 """Damages a specific set of squares (with Minions) and rotates by a specific angle"""
-                chosen_strike, turn_angle = divmod(num_damage_combinations, choice_2)
+                chosen_strike, turn_index = divmod(choice_2, len(turn_angles))
                 targeted_squares: List[Vector] = list(damage_combinations[chosen_strike])
                 mech_2.damage_multiple(targeted_squares)
-                match choice_2:
-                    case 0:
-                        mech_2.turn(90)
-                    case 1:
-                        mech_2.turn(-90)
-                    case 2:
-                        mech_2.turn(180)
-                    case 3:
-                        mech_2.turn(0)
-
-            scythe_damage_and_turn = Prompt(num_damage_combinations * (level + 1), scythe_2)
+                mech_2.turn(turn_angles[turn_index])
+
+            scythe_damage_and_turn = Prompt(len(damage_combinations) * len(turn_angles), scythe_2)
             mech_1.stack_push(scythe_damage_and_turn)
 
         scythe_scan = Prompt(1, scythe_1)
@@ -494,20 +550,7 @@ class Mech(Friendly):
         self.stack_push(ripsaw_command)
 
     def fuel_tank(self, level: int) -> None:
-
-        def fuel_tank_1(mech_1: Mech, choice_1: int) -> None:
-            match choice_1:
-                case 0:
-                    mech_1.turn(90)
-                case 1:
-                    mech_1.turn(-90)
-                case 2:
-                    mech_1.turn(180)
-                case 3:
-                    mech_1.turn(0)
-
-        fuel_tank_command = Prompt(level + 1, fuel_tank_1)
-        self.stack_push(fuel_tank_command)
+        self.stack_push(self.turn_prompt(level))
 
     def blaze(self, level: int) -> None:
 
@@ -534,18 +577,18 @@ class Mech(Friendly):
 
         def flamespitter_1(mech_1: Mech, choice_1: int) -> None:
             target_squares: List[Vector] = []
-            pointer: Vector = self.orientation.copy()
+            pointer: Vector = mech_1.position + mech_1.orientation
             target_squares.append(pointer.copy())
-            pointer += self.orientation
+            pointer += mech_1.orientation
             target_squares.append(pointer.copy())
             if level >= 2:
-                target_squares.append(pointer + rotate(self.orientation, -90))
-                target_squares.append(pointer + rotate(self.orientation, 90))
+                target_squares.append(pointer + rotate(mech_1.orientation, -90))
+                target_squares.append(pointer + rotate(mech_1.orientation, 90))
                 if level == 3:
-                    pointer += self.orientation
+                    pointer += mech_1.orientation
                     target_squares.append(pointer.copy())
-                    target_squares.append(pointer + rotate(self.orientation, -90))
-                    target_squares.append(pointer + rotate(self.orientation, 90))
+                    target_squares.append(pointer + rotate(mech_1.orientation, -90))
+                    target_squares.append(pointer + rotate(mech_1.orientation, 90))
 
             mech_1.damage_multiple(target_squares)
 
@@ -553,6 +596,7 @@ class Mech(Friendly):
         self.stack_push(flamespitter_command)
 
     def cyclotron(self, level: int) -> None:
+        turn_angles: List[int] = self.turn_options(level)
 
         def cyclotron_1(mech_1, choice_1: int) -> None:
             target_squares: List[Vector] = []
@@ -560,33 +604,25 @@ class Mech(Friendly):
                 target_squares += [mech_1.position + np.array(coordinate_pair) for coordinate_pair in
                                    product((-i, i), (-i, i))]
             mech_1.damage_multiple(target_squares)
-            match choice_1:
-                case 0:
-                    mech_1.turn(90)
-                case 1:
-                    mech_1.turn(-90)
-                case 2:
-                    mech_1.turn(180)
-                case 3:
-                    mech_1.turn(0)
+            mech_1.turn(turn_angles[choice_1])
 
-        cyclotron_command = Prompt(level + 1, cyclotron_1)
+        cyclotron_command = Prompt(len(turn_angles), cyclotron_1)
         self.stack_push(cyclotron_command)
 
     def speed(self, level: int) -> None:
 
         def speed_1(mech_1: Mech, choice_1: int) -> None:
-            match choice_1:
-                case 0:
-                    mech_1.move(mech_1.orientation, level)
-                case 1:
-                    mech_1.move(mech_1.orientation, level + 1)
-                case 2:
-                    mech_1.move(mech_1.orientation, level + 2)
-                case 3:
-                    mech_1.move(mech_1.orientation, level + 3)
+            """Works out which of the movement distances actually lead to different places"""
+            distances: List[int] = mech_1.distinct_move_distances(mech_1.orientation,
+                                                                  range(level, 2 * level + 1))
+
+            def speed_2(mech_2: Mech, choice_2: int) -> None:
+                mech_2.move(mech_2.orientation, distances[choice_2])
 
-        speed_command = Prompt(level + 1, speed_1)
+            speed_move = Prompt(len(distances), speed_2)
+            mech_1.stack_push(speed_move)
+
+        speed_command = Prompt(1, speed_1)
         self.stack_push(speed_command)
 
     def chain_lightning(self, level: int) -> None:
@@ -594,10 +630,14 @@ class Mech(Friendly):
         def chain_check(mech: Mech, curr_square: Vector, alr_hit_squares: List[Vector]) -> List[Vector]:
             """Helper function"""
             available_chaining_squares: List[Vector] = []
-            diagonals: List[Vector] = [curr_square + np.array(coordinate_pair) for coordinate_pair in
-                                       product((-1, 1), (1, 1))]
+            if mech.board.tables is not None:
+                diagonals: List[Vector] = [np.array(square) for square in mech.board.tables.diagonal_squares(
+                    (int(curr_square[0]), int(curr_square[1])))]
+            else:
+                diagonals: List[Vector] = [curr_square + np.array(coordinate_pair) for coordinate_pair in
+                                           product((-1, 1), (-1, 1))]
             for square in diagonals:
-                if oob_check(square):
+                if oob_check(mech.board, square):
                     if mech.board[vector_to_tuple(square)].has_minion():
                         if not any(np.array_equal(square, arr) for arr in alr_hit_squares):
                             available_chaining_squares.append(square)
@@ -643,7 +683,8 @@ class Mech(Friendly):
                         return
                     # otherwise, begin the chain process
                     num_first_available_chains: int = len(first_chain_targets)
-                    first_chain: Callable[[Mech, int], None] = partial(chain_lightning_2, prev_hit_squares=first_square,
+                    first_chain: Callable[[Mech, int], None] = partial(chain_lightning_2,
+                                                                       prev_hit_squares=[first_square],
                                                                        avail_squares=first_chain_targets)
                     first_chain_prompt = Prompt(num_first_available_chains, first_chain)
                     mech_1.stack_push(first_chain_prompt)
@@ -652,20 +693,7 @@ class Mech(Friendly):
         self.stack_push(chain_lightning_command)
 
     def memory_core(self, level: int) -> None:
-
-        def memory_core_1(mech_1, choice_1: int) -> None:
-            match choice_1:
-                case 0:
-                    mech_1.turn(90)
-                case 1:
-                    mech_1.turn(-90)
-                case 2:
-                    mech_1.turn(180)
-                case 3:
-                    mech_1.turn(0)
-
-        memory_core_command = Prompt(level + 1, memory_core_1)
-        self.stack_push(memory_core_command)
+        self.stack_push(self.turn_prompt(level))
 
     def omnistomp(self, level: int) -> None:
 
@@ -697,21 +725,82 @@ class Mech(Friendly):
         hexmatic_aimbot_scan = Prompt(1, hexmatic_aimbot_1)
         self.stack_push(hexmatic_aimbot_scan)
 
+    # -- Damage cards --
+
+    def short_circuit(self, level: int) -> None:
+        """The slot is fried, so nothing happens"""
+        return None
+
+    def stuck_left(self, level: int) -> None:
+
+        def stuck_left_1(mech_1: Mech, choice_1: int) -> None:
+            mech_1.turn(90)
+
+        self.stack_push(Prompt(1, stuck_left_1))
+
+    def stuck_right(self, level: int) -> None:
+
+        def stuck_right_1(mech_1: Mech, choice_1: int) -> None:
+            mech_1.turn(-90)
+
+        self.stack_push(Prompt(1, stuck_right_1))
+
+    def stuck_forward(self, level: int) -> None:
+
+        def stuck_forward_1(mech_1: Mech, choice_1: int) -> None:
+            mech_1.move(mech_1.orientation, 1)
+
+        self.stack_push(Prompt(1, stuck_forward_1))
+
     translations: Dict[str, Callable[[Mech, int], Prompt | None]] = {
         'Scythe': scythe, 'Skewer': skewer, 'Ripsaw': ripsaw,
         'Fuel Tank': fuel_tank, 'Blaze': blaze, 'Flamespitter': flamespitter,
         'Cyclotron': cyclotron, 'Speed': speed, 'Chain Lightning': chain_lightning,
         'Memory Core': memory_core, 'Omnistomp': omnistomp, 'Hexmatic Aimbot': hexmatic_aimbot,
+        'Short Circuit': short_circuit, 'Stuck Left': stuck_left, 'Stuck Right': stuck_right,
+        'Stuck Forward': stuck_forward,
         'Empty': lambda x, y: None
     }
 
-    def read_command_line(self) -> None:
+    def read_command_line(self, start_slot: int = 1) -> None:
         """
         Translates all the information on the command line into prompt objects and pushes them to the prompt stack
+        :param start_slot: the first slot to read (the ones before it are left out, as if they'd already been executed)
         :return: None
         """
-        for slot in range(1, 7)[::-1]:
+        for slot in range(start_slot, 7)[::-1]:
             command_card_string = self.command_line[slot - 1][0]
             command_card_level = self.command_line[slot - 1][1]
             command_card_method: Callable[[Mech, int], None] = self.translations[command_card_string]
+            stack_size: int = len(self.prompt_stack)
             command_card_method(self, command_card_level)
+            # tag the card's prompts, so that it's known which slots haven't been executed yet
+            for prompt in self.prompt_stack[stack_size:]:
+                prompt.slot = slot
+                prompt.card = command_card_string
+
+
+# The damage deck is drawn from with these two instead of closures, so that the prompts they create look the same
+# in every copy of a Mech (engine.state_key() relies on that to spot identical states)
+
+def draw_damage(mech: Mech, choice: int) -> None:
+    """Works out the odds of every (damage card, slot) pair from what's left in the damage deck"""
+    deck: Tuple[int, ...] = mech.board.damage_deck if mech.board.damage_deck is not None else Mech.damage_deck_counts
+    total: int = sum(deck)
+    # an empty deck can't hurt anybody
+    if total == 0:
+        return
+    outcomes: Tuple[Tuple[int, int], ...] = tuple((kind, slot) for kind, count in enumerate(deck) if count
+                                                  for slot in range(1, 7))
+    probabilities: List[float] = [deck[kind] / total / 6 for kind, _ in outcomes]
+    mech.stack_push(ChancePrompt(probabilities, partial(slot_damage, outcomes=outcomes)))
+
+
+def slot_damage(mech: Mech, choice: int, outcomes: Tuple[Tuple[int, int], ...]) -> None:
+    """Takes the drawn damage card out of the deck and puts it in the rolled slot"""
+    kind, slot = outcomes[choice]
+    deck: List[int] = list(mech.board.damage_deck if mech.board.damage_deck is not None else Mech.damage_deck_counts)
+    deck[kind] -= 1
+    mech.board.damage_deck = tuple(deck)
+    # damage cards don't stack, they just replace the card
+    mech.command_line[slot - 1] = (Mech.damage_kinds[kind], 1)
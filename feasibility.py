@@ -0,0 +1,255 @@
+from board import Board
+from entities import Bomb, Mech
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+# A cheap static analysis that runs before the engine.
+# Instead of following a single Mech through every choice, it follows the *set* of poses the Mech could
+# possibly be in after each slot of its command line, and collects every square it could possibly damage.
+# Everything here is an over-approximation: walls and the board edge are respected, but anything
+# that could stop the Mech early (friendlies, running out of targets, etc.) is ignored.
+# Therefore, if the damage footprint doesn't cover every Minion, the command line can't be a winning one.
+# The Bomb is followed as a set of squares too: the Mech can push it (and the Bomb stomps the Minions it's pushed
+# onto) or tow it, so every square it could be pushed through counts as damageable (see movement()).
+# The only thing not accounted for is another Mech pushing this one around
+# (engine.independent_groups() deals with that by letting the Mech start from several poses, see footprint_from()).
+
+Cell = Tuple[int, int]
+Pose = Tuple[Cell, Cell]  # (position, orientation)
+
+
+class Footprint(NamedTuple):
+    reach: Set[Cell]
+    damage: Set[Cell]
+
+
+def in_bounds(board: Board, cell: Cell) -> bool:
+    """Same as oob_check, except for tuples"""
+    return 0 <= cell[0] < board.shape[0] and 0 <= cell[1] < board.shape[1]
+
+
+def turn_cell(direction: Cell, angle: int) -> Cell:
+    """Same as rotate, except for tuples"""
+    x, y = direction
+    if angle in (90, -270):
+        return -y, x
+    elif angle in (180, -180):
+        return -x, -y
+    elif angle in (270, -90):
+        return y, -x
+    return x, y
+
+
+def ray(board: Board, position: Cell, direction: Cell, steps: int) -> List[Cell]:
+    """
+    Lists every square a Mech could pass through while moving a certain number of steps in a direction.
+    Landing on oil makes the Mech slide one more square for free.
+    :param board: the game board
+    :param position: starting square
+    :param direction: direction of the movement
+    :param steps: number of movement steps
+    :return: the squares in the order they'd be passed
+    """
+    squares: List[Cell] = []
+    sliding: bool = False
+    current: Cell = position
+    while True:
+        next_square: Cell = (current[0] + direction[0], current[1] + direction[1])
+        if not in_bounds(board, next_square) or board[next_square].has_wall():
+            break
+        if sliding:
+            sliding = False
+        elif steps > 0:
+            steps -= 1
+        else:
+            break
+        squares.append(next_square)
+        current = next_square
+        if board[next_square].is_oiled():
+            sliding = True
+    return squares
+
+
+def in_line(board: Board, position: Cell, direction: Cell, target: Cell, max_distance: int) -> bool:
+    """Checks if a square is at most a number of squares straight ahead, with no wall in between"""
+    current: Cell = position
+    for _ in range(max_distance):
+        current = (current[0] + direction[0], current[1] + direction[1])
+        if not in_bounds(board, current) or board[current].has_wall():
+            return False
+        if current == target:
+            return True
+    return False
+
+
+def movement(board: Board, pose: Pose, direction: Cell, steps: int,
+             poses: Set[Pose], damage: Set[Cell], bombs: Optional[Set[Cell]] = None) -> List[Cell]:
+    """
+    Adds every pose the Mech could end up in after moving (and every Minion it could stomp on the way)
+    :param bombs: the squares the Bomb could be on. If given, the Mech could push or tow it: whatever it could be
+    pushed onto is damaged (the Bomb stomps Minions), and wherever it could end up is added
+    :return: the squares the Mech could end up on, including the starting square
+    """
+    position, orientation = pose
+    squares: List[Cell] = ray(board, position, direction, steps)
+    damage.update(squares)
+    ends: List[Cell] = [position] + squares
+    poses.update((end, orientation) for end in ends)
+    if bombs and squares:
+        moved: Set[Cell] = set()
+        for bomb in bombs:
+            # the Mech can push the Bomb through other Mechs standing in between, so it could be a bit further
+            # ahead than the Mech gets, and it can't be pushed further than the Mech moves (plus sliding on oil)
+            if in_line(board, position, direction, bomb, len(squares) + len(board.players)):
+                pushed: List[Cell] = ray(board, bomb, direction, len(squares))
+                damage.update(pushed)
+                moved.update(pushed)
+            # towing puts it on a square the Mech just left, from a square next to the Mech (no stomping there)
+            if any(abs(bomb[0] - x) + abs(bomb[1] - y) == 1 for x, y in ends):
+                moved.update(ends)
+        bombs.update(moved)
+    return ends
+
+
+def turning(pose: Pose, level: int, poses: Set[Pose]) -> None:
+    """Adds every pose the Mech could end up in after turning"""
+    position, orientation = pose
+    for angle in Mech.turn_angles[:level + 1]:
+        poses.add((position, turn_cell(orientation, angle)))
+
+
+def chain(board: Board, first_squares: List[Cell], max_hits: int) -> Set[Cell]:
+    """Every square Chain Lightning could reach by jumping diagonally between Minions"""
+    reached: Set[Cell] = set(first_squares)
+    frontier: List[Cell] = [square for square in first_squares
+                            if in_bounds(board, square) and board[square].has_minion()]
+    for _ in range(max_hits - 1):
+        next_frontier: List[Cell] = []
+        for x, y in frontier:
+            for dx in (-1, 1):
+                for dy in (-1, 1):
+                    square: Cell = (x + dx, y + dy)
+                    if square not in reached and in_bounds(board, square) and board[square].has_minion():
+                        reached.add(square)
+                        next_frontier.append(square)
+        frontier = next_frontier
+    return reached
+
+
+def card_footprint(board: Board, pose: Pose, card: str, level: int, poses: Set[Pose], damage: Set[Cell],
+                   bombs: Optional[Set[Cell]] = None) -> None:
+    """
+    Adds the poses a card could leave the Mech in, and the squares it could damage, for a single starting pose
+    :param board: the game board
+    :param pose: the pose of the Mech before the card is executed
+    :param card: name of the card as a string
+    :param level: int from 1-3
+    :param poses: set of poses to add the resulting poses to
+    :param damage: set of squares to add the damaged squares to
+    :param bombs: set of squares the Bomb could be on, which grows if the card could push or tow it
+    :return: None
+    """
+    (x, y), orientation = pose
+    ox, oy = orientation
+    left: Cell = turn_cell(orientation, 90)
+    right: Cell = turn_cell(orientation, -90)
+    match card:
+        case 'Scythe':
+            damage.update((x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy)
+            turning(pose, level, poses)
+        case 'Skewer':
+            movement(board, pose, orientation, level, poses, damage, bombs)
+        case 'Ripsaw':
+            # the saw reaches along the line, but the Mech stays put (and pushes nothing)
+            movement(board, pose, orientation, max(board.shape), set(), damage)
+            poses.add(pose)
+        case 'Fuel Tank' | 'Memory Core':
+            turning(pose, level, poses)
+        case 'Blaze':
+            for end_x, end_y in movement(board, pose, orientation, level, poses, damage, bombs):
+                damage.add((end_x + left[0], end_y + left[1]))
+                damage.add((end_x + right[0], end_y + right[1]))
+        case 'Flamespitter':
+            damage.update([(x + ox, y + oy), (x + 2 * ox, y + 2 * oy)])
+            if level >= 2:
+                damage.update([(x + 2 * ox + left[0], y + 2 * oy + left[1]),
+                               (x + 2 * ox + right[0], y + 2 * oy + right[1])])
+            if level == 3:
+                damage.update([(x + 3 * ox, y + 3 * oy),
+                               (x + 3 * ox + left[0], y + 3 * oy + left[1]),
+                               (x + 3 * ox + right[0], y + 3 * oy + right[1])])
+            poses.add(pose)
+        case 'Cyclotron':
+            damage.update((x + dx, y + dy) for i in range(1, level + 1) for dx in (-i, i) for dy in (-i, i))
+            turning(pose, level, poses)
+        case 'Speed':
+            movement(board, pose, orientation, 2 * level, poses, damage, bombs)
+        case 'Chain Lightning':
+            front: Cell = (x + ox, y + oy)
+            first_squares: List[Cell] = [front, (front[0] + left[0], front[1] + left[1]),
+                                         (front[0] + right[0], front[1] + right[1])]
+            damage.update(chain(board, first_squares, 2 * level))
+            poses.add(pose)
+        case 'Omnistomp':
+            for direction in (left, orientation, right):
+                movement(board, pose, direction, level, poses, damage, bombs)
+        case 'Hexmatic Aimbot':
+            damage.update((x + dx, y + dy) for dx in range(-3, 4) for dy in range(-3, 4))
+            poses.add(pose)
+        case 'Stuck Left':
+            poses.add(((x, y), left))
+        case 'Stuck Right':
+            poses.add(((x, y), right))
+        case 'Stuck Forward':
+            movement(board, pose, orientation, 1, poses, damage, bombs)
+        case _:
+            poses.add(pose)
+
+
+def footprint(mech: Mech) -> Footprint:
+    """
+    Over-approximates the squares a Mech could reach and damage while executing its command line
+    :param mech: a Mech with its command line already filled in
+    :return: a Footprint (the reachable squares, and the damageable squares)
+    """
+    position: Cell = (int(mech.position[0]), int(mech.position[1]))
+    orientation: Cell = (int(mech.orientation[0]), int(mech.orientation[1]))
+    return footprint_from(mech.board, {(position, orientation)}, mech.command_line)
+
+
+def footprint_from(board: Board, poses: Set[Pose], command_line: List[Tuple[str, int]]) -> Footprint:
+    """
+    Same as footprint(), except the Mech could start in any of several poses
+    :param board: the game board
+    :param poses: the poses the Mech could start in
+    :param command_line: (card, level) for every slot
+    :return: a Footprint (the reachable squares, and the damageable squares)
+    """
+    reach: Set[Cell] = {pose[0] for pose in poses}
+    damage: Set[Cell] = set()
+    bombs: Set[Cell] = bomb_squares(board)
+    for card, level in command_line:
+        new_poses: Set[Pose] = set()
+        for pose in poses:
+            card_footprint(board, pose, card, level, new_poses, damage, bombs)
+        poses = new_poses
+        reach.update(pose[0] for pose in poses)
+    return Footprint(reach, {square for square in damage if in_bounds(board, square)})
+
+
+def bomb_squares(board: Board) -> Set[Cell]:
+    """Lists the squares that currently have the Bomb on them (so either one or none)"""
+    return {(int(index[0]), int(index[1])) for index, tile in board.occupied() if isinstance(tile.thing, Bomb)}
+
+
+def minion_squares(board: Board) -> Set[Cell]:
+    """Lists the squares that currently have a Minion on them"""
+    return {(int(index[0]), int(index[1])) for index, tile in board.tiles() if tile.has_minion()}
+
+
+def is_feasible(mech: Mech) -> bool:
+    """
+    Checks if a Mech's command line could possibly clear the board. Never rejects a command line that can win.
+    :param mech: a Mech with its command line already filled in
+    :return: False if some Minion is out of reach of every card, True otherwise
+    """
+    return minion_squares(mech.board) <= footprint(mech).damage
@@ -1,6 +1,7 @@
 import numpy as np
+from numpy.typing import NDArray
 from auxiliary_functions import vector_to_tuple, oob_check, Prompt
-from typing import List
+from typing import Callable, List, Optional, Sequence, Tuple
 from custom_types import Matrix
 from board import Board
 from entities import Minion, Mech
@@ -42,6 +43,30 @@ def initialize_starting_board(board: Board, minion_squares: Matrix, oil_squares:
             board[vector_to_tuple(oil_coordinate)].spill_oil()
 
 
+def parse_card(card: str) -> Tuple[str, int]:
+    """
+    Splits a card string (as generated by basislists.py) into the card name and its level.
+    Cards without a level at the end of their name (e.g. 'Blaze') are level 1, otherwise the last character
+    is the level (e.g. 'Omnistomp2').
+    :param card: the card string
+    :return: (name of the card, level)
+    """
+    if card in Mech.card_colors:
+        return card, 1
+    return card[:-1], int(card[-1])
+
+
+def load_command_line(mech: Mech, cmd_line: Sequence[str]) -> None:
+    """
+    Slots a command line written as card strings into a Mech's command line
+    :param mech: the Mech whose command line is filled in
+    :param cmd_line: up to 6 card strings, in slot order
+    :return: None
+    """
+    for slot, card in enumerate(cmd_line, start=1):
+        mech.modify_command_line(slot, *parse_card(card))
+
+
 # this shouldn't be necessary anymore since instantiating Mechs already does this I think
 # def place_player_mechs(board: Board, playing_mechs: List[Mech]) -> None:
 #     """Place player mechs"""
@@ -65,14 +90,31 @@ def slot_cards(board: Board):
     raise NotImplementedError
 
 
-def players_move(board: Board) -> None:
+def resolve_prompts(mech: Mech, choose: Optional[Callable[[Mech, Prompt], int]] = None) -> None:
     """
-    Players execute their command lines in order
+    Executes everything on a Mech's prompt stack, one prompt at a time
+    :param mech: the Mech
+    :param choose: picks the option for every prompt, given the Mech and the prompt.
+    If None, the first option is always picked
     :return: None
     """
-    # for player in board.players:
-    #     execute_command_line(player)
-    raise NotImplementedError
+    while mech.prompt_stack:
+        prompt: Prompt = mech.prompt_stack.pop()
+        if prompt.num_options > 0:
+            prompt.executable(mech, choose(mech, prompt) if choose is not None else 0)
+
+
+def players_move(board: Board, choose: Optional[Callable[[Mech, Prompt], int]] = None) -> None:
+    """
+    Players execute their command lines in order (the order of board.players, see rotate_hourglass())
+    :param board: the game board
+    :param choose: picks the option for every prompt, given the Mech and the prompt.
+    If None, the first option is always picked (engine.joint_engine() searches all of them instead)
+    :return: None
+    """
+    for player in list(board.players):
+        player.read_command_line()
+        resolve_prompts(player, choose)
 
 
 def rotate_hourglass(board: Board) -> None:
@@ -89,7 +131,184 @@ def count_minions(board: Board) -> int:
     :return: the number of minions
     """
     count = 0
-    for index, tile in np.ndenumerate(board.board_array):
+    for _, tile in board.occupied():
         if tile.has_minion():
             count += 1
     return count
+
+
+# -- Minion phases --
+# These work on arrays of positions instead of going Minion by Minion, so that simulating whole turns stays cheap.
+# Only the final result is written back onto the Tiles.
+
+# what a square currently holds, as used by occupancy()
+EMPTY, MINION, FRIENDLY, WALL = 0, 1, 2, 3
+
+# the squares a Minion attacks from (every square around a Mech, including the diagonals)
+attack_offsets: Matrix = np.array([[dx, dy] for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy])
+
+
+def occupancy(board: Board) -> NDArray[np.int8]:
+    """
+    Summarizes the board as a grid of EMPTY, MINION, FRIENDLY or WALL
+    :param board: the game board
+    :return: an int8 array with the shape of the board
+    """
+    grid: NDArray[np.int8] = np.zeros(board.shape, dtype=np.int8)
+    for (x, y), tile in board.occupied():
+        if tile.thing.faction == 'Minions':
+            grid[x, y] = MINION
+        elif tile.thing.faction == 'Mechs':
+            grid[x, y] = FRIENDLY
+        else:
+            grid[x, y] = WALL
+    return grid
+
+
+def minion_positions(board: Board) -> Matrix:
+    """
+    Lists the squares that have a Minion on them
+    :param board: the game board
+    :return: a Nx2 "Matrix" of positions, in row-major order
+    """
+    return np.argwhere(occupancy(board) == MINION)
+
+
+def mech_positions(board: Board) -> Matrix:
+    """The positions of the players, in hourglass order, as a Nx2 "Matrix\""""
+    return np.array([player.position for player in board.players], dtype=int).reshape(-1, 2)
+
+
+def minions_move(board: Board) -> int:
+    """
+    Every Minion steps 1 square toward the nearest Mech (Manhattan distance, ties go to the earlier player),
+    along the axis where the Mech is furthest away. If that square is blocked by a wall, a friendly or the edge
+    of the board, the Minion tries the other axis instead. Minions already next to a Mech stay where they are.
+    Conflicts are resolved by priority: Minions closer to their Mech go first (then row-major order), and a Minion
+    can only move into a square that's free, or that's being left by a Minion that does move.
+    :param board: the game board
+    :return: the number of Minions that moved
+    """
+    grid = occupancy(board)
+    minions: Matrix = np.argwhere(grid == MINION)
+    mechs: Matrix = mech_positions(board)
+    if len(minions) == 0 or len(mechs) == 0:
+        return 0
+
+    offsets: Matrix = mechs[np.newaxis, :, :] - minions[:, np.newaxis, :]
+    distances = np.abs(offsets).sum(axis=2)
+    nearest = distances.argmin(axis=1)
+    delta: Matrix = offsets[np.arange(len(minions)), nearest]
+    distance = distances[np.arange(len(minions)), nearest]
+
+    # the primary step is along the longer axis (x on ties), the secondary one along the other axis
+    x_first = np.abs(delta[:, 0]) >= np.abs(delta[:, 1])
+    primary: Matrix = np.where(x_first[:, np.newaxis], np.stack([np.sign(delta[:, 0]), 0 * delta[:, 1]], axis=1),
+                               np.stack([0 * delta[:, 0], np.sign(delta[:, 1])], axis=1))
+    secondary: Matrix = np.where(x_first[:, np.newaxis], np.stack([0 * delta[:, 0], np.sign(delta[:, 1])], axis=1),
+                                 np.stack([np.sign(delta[:, 0]), 0 * delta[:, 1]], axis=1))
+
+    def open_square(step: Matrix) -> NDArray[np.bool_]:
+        """Which Minions could step somewhere not blocked by the edge, a wall or a friendly"""
+        targets: Matrix = minions + step
+        inside = ((targets >= 0) & (targets < np.array(grid.shape))).all(axis=1) & step.any(axis=1)
+        clipped: Matrix = np.clip(targets, 0, np.array(grid.shape) - 1)
+        return inside & (grid[clipped[:, 0], clipped[:, 1]] <= MINION)
+
+    primary_open = open_square(primary)
+    secondary_open = open_square(secondary)
+    step: Matrix = np.where(primary_open[:, np.newaxis], primary,
+                            np.where(secondary_open[:, np.newaxis], secondary, 0))
+    moving = (distance > 1) & step.any(axis=1)
+    targets: Matrix = minions + step
+
+    # conflict resolution pass: highest priority first
+    priority = np.lexsort((np.arange(len(minions)), distance))
+    rank = np.empty_like(priority)
+    rank[priority] = np.arange(len(minions))
+    width: int = grid.shape[1]
+    source_keys = minions[:, 0] * width + minions[:, 1]
+    # which Minion (by index) starts on every square, -1 if none
+    owner = np.full(grid.shape, -1)
+    owner[minions[:, 0], minions[:, 1]] = np.arange(len(minions))
+    while True:
+        target_keys = np.where(moving, targets[:, 0] * width + targets[:, 1], source_keys)
+        # several Minions want the same square: only the highest priority one gets it
+        order = np.lexsort((rank, target_keys))
+        first_claim = np.ones(len(order), dtype=bool)
+        first_claim[1:] = target_keys[order][1:] != target_keys[order][:-1]
+        winners = np.zeros(len(minions), dtype=bool)
+        winners[order[first_claim]] = True
+        blocked = moving & ~winners
+        # the square is taken by a Minion that isn't leaving it
+        staying_keys = source_keys[~moving]
+        blocked |= moving & np.isin(target_keys, staying_keys)
+        # two Minions can't swap squares (the lower priority one stays)
+        other = owner.flat[target_keys]
+        swapping = moving & (other >= 0) & moving[other] & (target_keys[other] == source_keys) & (rank[other] < rank)
+        blocked |= swapping
+        if not blocked.any():
+            break
+        moving &= ~blocked
+
+    # write the moves back onto the board (everyone leaves first, so nobody overwrites anybody)
+    movers = np.flatnonzero(moving)
+    things = [board[(int(minions[i, 0]), int(minions[i, 1]))].thing for i in movers]
+    for i, thing in zip(movers, things):
+        board[(int(minions[i, 0]), int(minions[i, 1]))].remove_thing()
+    for i, thing in zip(movers, things):
+        thing.position = targets[i].copy()
+        board[(int(targets[i, 0]), int(targets[i, 1]))].place_thing(thing)
+    return len(movers)
+
+
+def minions_spawn(board: Board, spawn_points: Matrix) -> int:
+    """
+    Spawns a Minion on every spawn point that's on the board and empty
+    :param board: the game board
+    :param spawn_points: a Nx2 "Matrix" of spawn points
+    :return: the number of Minions spawned
+    """
+    spawn_points = np.asarray(spawn_points, dtype=int).reshape(-1, 2)
+    grid = occupancy(board)
+    inside = ((spawn_points >= 0) & (spawn_points < np.array(grid.shape))).all(axis=1)
+    spawn_points = np.unique(spawn_points[inside], axis=0)
+    free = spawn_points[grid[spawn_points[:, 0], spawn_points[:, 1]] == EMPTY]
+    for x, y in free:
+        Minion(board, np.array([x, y]))
+    return len(free)
+
+
+def minions_attack(board: Board, resolve: bool = True) -> List[int]:
+    """
+    Every Minion attacks every Mech it's next to (see attack_offsets), for 1 damage each
+    :param board: the game board
+    :param resolve: if True, the Mechs take the damage: every hit pushes a damage draw onto the Mech's prompt stack
+    (see Mech.take_damage()), which still has to be executed. If False, the hits are only counted
+    :return: the number of hits on every player, in hourglass order
+    """
+    minion_grid = np.pad(occupancy(board) == MINION, 1)
+    mechs: Matrix = mech_positions(board)
+    if len(mechs) == 0:
+        return []
+    # +1 for the padding
+    squares = mechs[:, np.newaxis, :] + attack_offsets[np.newaxis, :, :] + 1
+    hits: List[int] = minion_grid[squares[:, :, 0], squares[:, :, 1]].sum(axis=1).tolist()
+    if resolve:
+        for player, player_hits in zip(list(board.players), hits):
+            for _ in range(player_hits):
+                player.take_damage()
+    return hits
+
+
+def minions_phase(board: Board, spawn_points: Matrix, resolve: bool = True) -> List[int]:
+    """
+    Plays out the end of a turn: Minions Move, Minions Spawn, Minions Attack
+    :param board: the game board
+    :param spawn_points: a Nx2 "Matrix" of spawn points
+    :param resolve: passed on to minions_attack()
+    :return: the number of hits on every player, in hourglass order
+    """
+    minions_move(board)
+    minions_spawn(board, spawn_points)
+    return minions_attack(board, resolve)
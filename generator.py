@@ -0,0 +1,158 @@
+import os
+import random
+import numpy as np
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from board import Board, BoardTemplate
+from entities import Wall
+from game_flow import initialize_starting_board
+from puzzles import Puzzle, save_puzzle
+
+# Makes random puzzles, so there's more to test the engine on than puzzle_1.
+# Every puzzle comes from a GeneratorConfig and a seed, and the same pair always makes the same puzzle.
+# The board is set up the same way a real game is (game_flow.initialize_starting_board(), plus the walls),
+# and frozen into a BoardTemplate, so the puzzles can be saved (puzzles.save_puzzle()) and solved like any other.
+
+Cell = Tuple[int, int]
+
+# the cards basislists.generate() knows about
+pool_cards: Tuple[str, ...] = ('Scythe', 'Skewer', 'Ripsaw', 'Fuel Tank', 'Blaze', 'Flamespitter',
+                               'Memory Core', 'Omnistomp', 'Hexmatic Aimbot', 'Cyclotron', 'Speed', 'Chain Lightning')
+
+
+class GeneratorConfig(NamedTuple):
+    size: int = 6  # width and height of the board
+    minion_density: float = 0.15  # fraction of the squares with a Minion on them (at least 1 Minion)
+    oil_density: float = 0.1  # fraction of the squares that are oiled
+    wall_density: float = 0.05  # fraction of the squares with a wall on them
+    spiked_fraction: float = 0.3  # fraction of the walls that are spiked
+    pool_size: int = 7  # cards in the card pool
+    decksizes: Tuple[int, ...] = (4,)  # command line lengths to try (see basislists.generate())
+
+
+def generate_puzzle(config: GeneratorConfig, seed: int, name: Optional[str] = None) -> Puzzle:
+    """
+    Makes a random puzzle: Minions, walls and the Mech on distinct squares, oil anywhere but under the walls,
+    and a random card pool (cards can come up more than once, like they do in a real draft)
+    :param config: what kind of puzzle to make
+    :param seed: seed of the random numbers
+    :param name: the puzzle's name (made from the config and seed if None)
+    :return: the Puzzle
+    """
+    rng = random.Random(seed)
+    # the pool is drawn first, so it only depends on the seed and the pool size
+    cards: List[str] = sorted(rng.choice(pool_cards) for _ in range(config.pool_size))
+    squares: List[Cell] = [(x, y) for x in range(config.size) for y in range(config.size)]
+    rng.shuffle(squares)
+    total: int = len(squares)
+    minion_count: int = min(max(1, round(config.minion_density * total)), total - 1)
+    wall_count: int = min(round(config.wall_density * total), total - 1 - minion_count)
+    mech_square: Cell = squares[0]
+    minion_squares: List[Cell] = squares[1:1 + minion_count]
+    wall_squares: List[Cell] = squares[1 + minion_count:1 + minion_count + wall_count]
+    # oil goes on the free squares, the Minions' and the Mech's (walls aren't standing in any oil)
+    oil_candidates: List[Cell] = [square for square in squares if square not in set(wall_squares)]
+    oil_squares: List[Cell] = rng.sample(oil_candidates, min(round(config.oil_density * total), len(oil_candidates)))
+
+    board = Board(np.zeros((config.size, config.size)))
+    initialize_starting_board(board, np.array(minion_squares).reshape(-1, 2), np.array(oil_squares).reshape(-1, 2))
+    for square in wall_squares:
+        is_spiked: bool = rng.random() < config.spiked_fraction
+        facing: Cell = rng.choice([(1, 0), (0, 1), (-1, 0), (0, -1)])
+        # only spikes have a facing; plain walls face (1, 0), like the ones puzzle_from_dict() makes, so saved
+        # puzzles load back the same (the facing is still drawn, so a seed makes the same puzzle as before)
+        Wall(board, np.array(square), np.array(facing if is_spiked else (1, 0)), is_spiked)
+    template: BoardTemplate = BoardTemplate.from_board(board)
+
+    orientation: Cell = rng.choice([(1, 0), (0, 1), (-1, 0), (0, -1)])
+    if name is None:
+        name = (f'gen_{config.size}x{config.size}_m{config.minion_density:g}_o{config.oil_density:g}'
+                f'_p{config.pool_size}_s{seed}')
+    return Puzzle(name, template, [(mech_square, orientation)], cards, list(config.decksizes))
+
+
+def check_puzzle(puzzle: Puzzle) -> None:
+    """
+    Makes sure a puzzle can be played: everything is on the board, nothing shares a square,
+    there's a Minion to clear, and the cards are ones basislists.generate() knows
+    :param puzzle: the Puzzle
+    :return: None (raises a ValueError if something's wrong)
+    """
+    template: BoardTemplate = puzzle.template
+    width, height = template.shape
+    wall_squares: List[Cell] = [position for position, _, _ in template.walls]
+    taken: List[Cell] = list(template.minions) + wall_squares + [tuple(pose[0]) for pose in puzzle.mech_poses]
+    if template.bomb is not None:
+        taken.append(template.bomb[0])
+    if not template.minions:
+        raise ValueError(f'{puzzle.name} has no Minions')
+    if any(not (0 <= x < width and 0 <= y < height) for x, y in taken):
+        raise ValueError(f'{puzzle.name} has something off the board')
+    if len(set(taken)) != len(taken):
+        raise ValueError(f'{puzzle.name} has two things on the same square')
+    if any(template.oil[square] for square in wall_squares):
+        raise ValueError(f'{puzzle.name} has oil under a wall')
+    unknown: List[str] = [card for card in puzzle.cards if card not in pool_cards]
+    if unknown:
+        raise ValueError(f'{puzzle.name} has cards basislists.generate() doesn\'t know: {unknown}')
+
+
+def one_at_a_time(base: GeneratorConfig, sizes: Sequence[int] = (), minion_densities: Sequence[float] = (),
+                  oil_densities: Sequence[float] = (), pool_sizes: Sequence[int] = ()) -> List[Tuple[str,
+                                                                                                    GeneratorConfig]]:
+    """
+    Varies one parameter of a config at a time, keeping the others where they are in the base config
+    :return: (name of the parameter that was varied, config) pairs
+    """
+    configs: List[Tuple[str, GeneratorConfig]] = []
+    for parameter, values in (('size', sizes), ('minion_density', minion_densities),
+                              ('oil_density', oil_densities), ('pool_size', pool_sizes)):
+        configs += [(parameter, base._replace(**{parameter: value})) for value in values]
+    return configs
+
+
+def generate_corpus(configs: Sequence[GeneratorConfig], per_config: int = 3,
+                    seed: int = 0) -> List[Tuple[GeneratorConfig, Puzzle]]:
+    """
+    Makes a few puzzles for every config. The i-th puzzle of every config gets the same seed (worked out from the
+    corpus seed), so configs that only differ in one parameter get puzzles that are as alike as they can be
+    (the same card pool, if it's the same size), and the whole corpus comes out the same every time
+    :param configs: the configs
+    :param per_config: puzzles per config
+    :param seed: seed of the corpus
+    :return: (config, puzzle) pairs
+    """
+    corpus: List[Tuple[GeneratorConfig, Puzzle]] = []
+    for config in configs:
+        for i in range(per_config):
+            puzzle: Puzzle = generate_puzzle(config, seed * 1_000_003 + i)
+            check_puzzle(puzzle)
+            corpus.append((config, puzzle))
+    return corpus
+
+
+def save_corpus(corpus: Sequence[Tuple[GeneratorConfig, Puzzle]], directory: str) -> List[str]:
+    """
+    Writes every puzzle of a corpus to a puzzle file (so e.g. batch.py can solve them)
+    :return: the paths of the files
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths: List[str] = []
+    for _, puzzle in corpus:
+        path: str = os.path.join(directory, f'{puzzle.name}.json')
+        save_puzzle(puzzle, path)
+        paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write a corpus of random puzzles')
+    parser.add_argument('directory')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--per-config', type=int, default=3)
+    arguments = parser.parse_args()
+    corpus_configs = [config for _, config in one_at_a_time(GeneratorConfig(), (5, 6, 8, 10, 14), (0.05, 0.15, 0.3),
+                                                             (0.0, 0.1, 0.3), (5, 7, 9))]
+    print(f'{len(save_corpus(generate_corpus(corpus_configs, arguments.per_config, arguments.seed), arguments.directory))}'
+          f' puzzles written to {arguments.directory}')
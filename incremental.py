@@ -0,0 +1,156 @@
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Set, Tuple
+from board import BoardTemplate, record_reads
+from board_tables import BoardTables
+from engine import SearchResult
+from feasibility import footprint
+from solve import list_jobs, make_mech, run_jobs, SolveCache, SolveOptions, SolveResult
+
+# Re-solves a puzzle after small edits (a Minion added, one more oiled square, ...) without redoing the whole sweep.
+# Every job records the squares its search looked at (board.record_reads()). A job whose squares weren't edited
+# would play out exactly the same way, so its old result is kept. The one thing a search sees without looking at
+# a square is the number of Minions left at the end, which is where the Minions that were edited out of its reach
+# come in: they're added to (or taken off) the result, and only if that could make the job win is it searched again.
+
+Cell = Tuple[int, int]
+Job = Tuple[Tuple[str, ...], Cell]
+
+
+class IncrementalReport(NamedTuple):
+    jobs: int  # jobs in the new solve
+    reused: int  # results kept as they were
+    adjusted: int  # results kept, with the Minions edited out of reach added or taken off
+    resolved: int  # jobs that were searched again (or for the first time)
+    reused_nodes: int  # search nodes of the kept results (reused + adjusted)
+    resolved_nodes: int  # search nodes spent on the jobs that were searched again
+    changed_squares: int  # squares the edit touched
+
+    @property
+    def reuse_fraction(self) -> float:
+        """The share of the search effort of the new solve that came from the previous one"""
+        total: int = self.reused_nodes + self.resolved_nodes
+        return self.reused_nodes / total if total > 0 else 1.0
+
+
+def changed_squares(old: BoardTemplate, new: BoardTemplate) -> Set[Cell]:
+    """
+    The squares whose Minion, oil or wall is different between two templates of the same size
+    :param old: the template before the edit
+    :param new: the template after the edit
+    :return: the set of (x, y) squares
+    """
+    changed: Set[Cell] = set(old.minions) ^ set(new.minions)
+    changed |= {(int(x), int(y)) for x, y in zip(*(old.oil != new.oil).nonzero())}
+    old_walls: Dict[Cell, Tuple[Cell, bool]] = {position: (facing, spiked) for position, facing, spiked in old.walls}
+    new_walls: Dict[Cell, Tuple[Cell, bool]] = {position: (facing, spiked) for position, facing, spiked in new.walls}
+    changed |= {position for position in old_walls.keys() | new_walls.keys()
+                if old_walls.get(position) != new_walls.get(position)}
+    return changed
+
+
+class IncrementalSolver:
+    def __init__(self, mech_pose: Tuple[Cell, Optional[Cell]], card_pool: Sequence[str], decksizes: Sequence[int],
+                 options: Optional[SolveOptions] = None, cache: Optional[SolveCache] = None) -> None:
+        """
+        Solves the same Mech and card pool on one version of a board after another
+        (the arguments are the same as for solve.solve(), without an objective)
+        """
+        options = options if options is not None else SolveOptions()
+        if options.objective is not None:
+            raise ValueError('incremental solves only count wins (an objective can score any square)')
+        self.mech_pose: Tuple[Cell, Optional[Cell]] = mech_pose
+        self.card_pool: List[str] = list(card_pool)
+        self.decksizes: List[int] = list(decksizes)
+        self.options: SolveOptions = options._replace(record_reads=True)
+        self.cache: SolveCache = cache if cache is not None else SolveCache()
+        self.template: Optional[BoardTemplate] = None
+        self.results: Dict[Job, SolveResult] = {}
+        self.footprints: Dict[Job, Tuple[FrozenSet[Cell], FrozenSet[Cell]]] = {}
+        self.last_report: Optional[IncrementalReport] = None
+
+    def solve(self, template: BoardTemplate) -> List[SolveResult]:
+        """
+        Solves a (new version of the) board, reusing whatever the edit since the last solve didn't affect
+        :param template: the board
+        :return: a SolveResult for every job (see self.last_report for how much was reused)
+        """
+        tables = self.cache.tables(template.shape)
+        position: Cell = (int(self.mech_pose[0][0]), int(self.mech_pose[0][1]))
+
+        changed: Set[Cell] = set()
+        minions_added = minions_removed = 0
+        # the Bomb and the repair pad change what winning means for every job, wherever they are, so moving
+        # them starts over like a different size does
+        if (self.template is not None and self.template.shape == template.shape and
+                self.template.bomb == template.bomb and self.template.repair_pad == template.repair_pad):
+            changed = changed_squares(self.template, template)
+            minions_added = len(set(template.minions) - set(self.template.minions))
+            minions_removed = len(set(self.template.minions) - set(template.minions))
+        elif self.template is not None:
+            # a different size (or Bomb) changes everything
+            self.results = {}
+            self.footprints = {}
+
+        jobs: List[Job] = list_jobs(template, tables, self.mech_pose, self.card_pool, self.decksizes,
+                                    self.options._replace(prefilter=False), self.cache)
+        if self.options.prefilter:
+            minions: Set[Cell] = set(template.minions)
+            jobs = [job for job in jobs if minions <= self._damage_footprint(template, tables, position, job, changed)]
+
+        results: Dict[Job, SolveResult] = {}
+        to_search: List[Job] = []
+        reused = adjusted = reused_nodes = 0
+        for job in jobs:
+            old: Optional[SolveResult] = self.results.get(job)
+            if old is None or old.read_set is None or not old.read_set.isdisjoint(changed):
+                to_search.append(job)
+                continue
+            if minions_added == minions_removed == 0:
+                results[job] = old
+                reused += 1
+                reused_nodes += old.search.nodes
+                continue
+            # the edited Minions are all out of this job's reach, so they're still there at the end of every line
+            search: SearchResult = old.search
+            if search.best_minions is None:
+                # no line finished, so there's nothing to adjust
+                results[job] = old
+                reused += 1
+                reused_nodes += search.nodes
+                continue
+            best_minions: int = search.best_minions + minions_added - minions_removed
+            if best_minions == 0:
+                # some lines that used to leave only the removed Minions behind now win, but it's not known how many
+                to_search.append(job)
+                continue
+            # best_mech is left out, since its board doesn't have the edit
+            results[job] = old._replace(search=search._replace(wins=0, best_minions=best_minions, best_mech=None))
+            adjusted += 1
+            reused_nodes += search.nodes
+
+        resolved_nodes: int = 0
+        for result in run_jobs(template, tables, position, to_search, self.options, self.cache):
+            results[(result.cmd_line, result.orientation)] = result
+            resolved_nodes += result.search.nodes
+
+        self.template = template
+        self.results = results
+        self.cache.last_job_count = len(jobs)
+        self.last_report = IncrementalReport(len(jobs), reused, adjusted, len(to_search), reused_nodes,
+                                             resolved_nodes, len(changed))
+        return [results[job] for job in jobs]
+
+    def _damage_footprint(self, template: BoardTemplate, tables: BoardTables, position: Cell, job: Job,
+                          changed: Set[Cell]) -> FrozenSet[Cell]:
+        """
+        The squares a job could damage (see feasibility.footprint()), which the prefilter compares with the Minions.
+        Working them out means making a board for every job, so they're kept (with the squares they looked at)
+        for as long as the edits don't touch those squares
+        """
+        known: Optional[Tuple[FrozenSet[Cell], FrozenSet[Cell]]] = self.footprints.get(job)
+        if known is not None and known[1].isdisjoint(changed):
+            return known[0]
+        mech = make_mech(template, tables, position, job[1], job[0])
+        with record_reads() as read_set:
+            damage: FrozenSet[Cell] = frozenset(footprint(mech).damage)
+        self.footprints[job] = (damage, frozenset(read_set))
+        return damage
@@ -0,0 +1,260 @@
+import heapq
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from board import Board, BoardTemplate
+from board_tables import BoardTables
+from engine import depth_first, win_check, SearchBudget
+from entities import Bomb, Mech
+from game_flow import MINION, WALL, count_minions, occupancy
+
+# A breadth-first alternative to engine.engine(), one command line slot at a time.
+# Lines that took different routes through a card very often end up in exactly the same place (same squares occupied,
+# same Mech pose), so after every slot, the whole frontier is merged down to its distinct states, each with the number
+# of lines that lead there. A state between two slots is stored as a compact key (the Mech's pose and what's on every
+# square, as bytes), and is rebuilt from the starting board and Mech.read_command_line(start_slot) when its turn comes.
+# If a frontier gets too big for the memory budget, it's written to disk in sorted runs, which are merged back
+# together (adding up the line counts of the duplicates) while the next slot is being searched.
+#
+# Only the Mech moves things around and nothing damages it, so the oil, the walls and the command line are the
+# same in every state and don't need to be in the keys. Boards with other players or a Bomb aren't supported.
+
+# a line count in a spilled run
+count_format = struct.Struct('<Q')
+
+
+class LayerStats(NamedTuple):
+    slot: int  # the command line slot that was executed
+    states_in: int  # distinct states the slot started from
+    states_out: Optional[int]  # distinct states after the slot (None if the budget ran out)
+    nodes: int  # prompts executed
+    spilled_runs: int  # sorted runs written to disk for the next frontier
+    peak_bytes: Optional[int]  # peak traced memory during the slot (None if trace_memory was off)
+    seconds: float
+
+
+class LayeredResult(NamedTuple):
+    status: str  # 'complete', or 'partial' if the budget ran out (and nothing is counted)
+    paths: int  # lines that finish the command line
+    winning_paths: int  # lines that win (the same as engine().wins)
+    final_states: int  # distinct boards the lines end on
+    best_minions: Optional[int]  # the fewest minions left by any line
+    nodes: int
+    layers: List[LayerStats]
+    seconds: float
+
+
+class StateCodec:
+    def __init__(self, template: BoardTemplate, command_line: List[Tuple[str, int]], name: str,
+                 tables: Optional[BoardTables] = None) -> None:
+        """
+        Turns the states of a single Mech's search into compact keys and back
+        :param template: the starting board (its oil and walls are in every state)
+        :param command_line: the Mech's command line
+        :param name: the Mech's name
+        :param tables: lookup tables for the rebuilt boards
+        """
+        self.template: BoardTemplate = template
+        self.tables: Optional[BoardTables] = tables
+        self.command_line: List[Tuple[str, int]] = list(command_line)
+        self.name: str = name
+        self.walls: Dict[Tuple[int, int], Tuple[Tuple[int, int], Tuple[int, int], bool]] = {
+            wall[0]: wall for wall in template.walls}
+        self.oil_squares: List[Tuple[int, int]] = [(int(x), int(y)) for x, y in np.argwhere(template.oil)]
+        self.key_length: int = 4 + template.shape[0] * template.shape[1]
+
+    def encode(self, mech: Mech) -> bytes:
+        """The key of a Mech's state: its pose (4 bytes) and what's on every square (1 byte each)"""
+        pose = bytes(np.array([mech.position[0], mech.position[1], mech.orientation[0], mech.orientation[1]],
+                              dtype=np.int8))
+        return pose + occupancy(mech.board).tobytes()
+
+    def decode(self, key: bytes, start_slot: int) -> Mech:
+        """
+        Rebuilds a Mech (and its board) from a key, with the prompts of the slots from start_slot on
+        :param key: see encode()
+        :param start_slot: the next slot to execute (7 if the command line is done)
+        :return: the Mech
+        """
+        x, y, orientation_x, orientation_y = np.frombuffer(key[:4], dtype=np.int8).tolist()
+        grid = np.frombuffer(key[4:], dtype=np.int8).reshape(self.template.shape)
+        minions = [(int(i), int(j)) for i, j in np.argwhere(grid == MINION)]
+        walls = [self.walls[(int(i), int(j))] for i, j in np.argwhere(grid == WALL)]
+        board: Board = BoardTemplate(self.template.shape, minions, self.oil_squares, walls).instantiate(self.tables)
+        mech = Mech(board, np.array([x, y]), np.array([orientation_x, orientation_y]), self.name)
+        mech.command_line = list(self.command_line)
+        mech.read_command_line(start_slot)
+        return mech
+
+
+class Frontier:
+    def __init__(self, key_length: int, memory_budget: Optional[int], spill_directory: str) -> None:
+        """
+        The distinct states of one layer with their line counts. Kept in a dictionary, until that gets bigger than
+        the memory budget: then it's sorted and written to disk as a run, and a new dictionary is started
+        :param key_length: the length of every key, in bytes
+        :param memory_budget: roughly how many bytes the dictionary may take up (None for no limit)
+        :param spill_directory: where the runs go
+        """
+        self.key_length: int = key_length
+        self.record_length: int = key_length + count_format.size
+        self.spill_directory: str = spill_directory
+        # a dictionary entry costs about the key, the count and the dictionary slot
+        entry_bytes: int = sys.getsizeof(bytes(key_length)) + sys.getsizeof(2 ** 40) + 40
+        self.max_entries: Optional[int] = memory_budget // entry_bytes if memory_budget is not None else None
+        self.counts: Dict[bytes, int] = {}
+        self.runs: List[str] = []
+
+    def add(self, key: bytes, count: int) -> None:
+        self.counts[key] = self.counts.get(key, 0) + count
+        if self.max_entries is not None and len(self.counts) >= self.max_entries:
+            self.spill()
+
+    def spill(self) -> None:
+        """Writes the dictionary to disk as a sorted run"""
+        path: str = os.path.join(self.spill_directory, f'run_{id(self)}_{len(self.runs)}.bin')
+        with open(path, 'wb') as file:
+            for key in sorted(self.counts):
+                file.write(key)
+                file.write(count_format.pack(self.counts[key]))
+        self.runs.append(path)
+        self.counts = {}
+
+    def _read_run(self, path: str) -> Iterator[Tuple[bytes, int]]:
+        file: BinaryIO
+        with open(path, 'rb') as file:
+            while True:
+                record: bytes = file.read(self.record_length)
+                if not record:
+                    return
+                yield record[:self.key_length], count_format.unpack(record[self.key_length:])[0]
+
+    def drain(self) -> Iterator[Tuple[bytes, int]]:
+        """
+        Goes through the distinct states (in key order if anything was spilled), merging the runs on the way.
+        The runs are deleted afterwards
+        :return: yields (key, line count) pairs
+        """
+        if not self.runs:
+            yield from self.counts.items()
+            return
+        in_memory: List[Tuple[bytes, int]] = sorted(self.counts.items())
+        self.counts = {}
+        merged = heapq.merge(in_memory, *(self._read_run(path) for path in self.runs), key=lambda record: record[0])
+        current_key: Optional[bytes] = None
+        current_count: int = 0
+        for key, count in merged:
+            if key == current_key:
+                current_count += count
+                continue
+            if current_key is not None:
+                yield current_key, current_count
+            current_key, current_count = key, count
+        if current_key is not None:
+            yield current_key, current_count
+        for path in self.runs:
+            os.remove(path)
+        self.runs = []
+
+    def __len__(self) -> int:
+        """The number of entries (duplicates in different runs are counted once per run)"""
+        return len(self.counts) + sum(os.path.getsize(path) // self.record_length for path in self.runs)
+
+
+def layered_engine(board: Board, mech: Mech, budget: Optional[SearchBudget] = None,
+                   memory_budget: Optional[int] = None, spill_directory: Optional[str] = None,
+                   trace_memory: bool = True) -> LayeredResult:
+    """
+    Counts the lines (and winning lines) of a Mech's command line slot by slot, merging identical states in between
+    :param board: the game board (the Mech has to be the only player, and there can't be a Bomb)
+    :param mech: the Mech whose command line is searched
+    :param budget: limits on the search
+    :param memory_budget: roughly how many bytes a frontier may take up before it's spilled to disk (None for no limit)
+    :param spill_directory: where to put the spilled runs (a temporary directory if None)
+    :param trace_memory: if True, the peak memory of every layer is measured with tracemalloc (which slows it down)
+    :return: a LayeredResult
+    """
+    if board.players != [mech] or any(isinstance(tile.thing, Bomb) for _, tile in board.occupied()):
+        raise ValueError('the layered engine only searches boards with a single Mech and no Bomb')
+    start_time = time.perf_counter()
+    codec = StateCodec(BoardTemplate.from_board(board), mech.command_line, mech.name, board.tables)
+    own_directory: bool = spill_directory is None
+    spill_directory = tempfile.mkdtemp(prefix='layered_') if own_directory else spill_directory
+    started_tracing: bool = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    layers: List[LayerStats] = []
+    nodes: int = 0
+    complete: bool = True
+    frontier = Frontier(codec.key_length, memory_budget, spill_directory)
+    frontier.add(codec.encode(mech), 1)
+    # the layer being searched, the frontier it fills, and the number of lines that lead to the state being searched
+    slot: int = 0
+    next_frontier: Frontier = frontier
+    lines: int = 1
+
+    def line_done(reached: Mech) -> None:
+        """Hands a Mech that's executed its whole command line over to the next frontier"""
+        next_frontier.add(codec.encode(reached), lines)
+        return None
+
+    def past_slot(curr_mech: Mech) -> bool:
+        """Hands a Mech that's done with this slot over to the next frontier (and stops searching it)"""
+        top_slot: Optional[int] = curr_mech.prompt_stack[-1].slot
+        if top_slot is not None and top_slot > slot:
+            next_frontier.add(codec.encode(curr_mech), lines)
+            return True
+        return False
+
+    try:
+        for slot in range(1, 7):
+            layer_start: float = time.perf_counter()
+            layer_nodes: int = nodes
+            if trace_memory:
+                tracemalloc.reset_peak()
+            next_frontier = Frontier(codec.key_length, memory_budget, spill_directory)
+            states_in: int = 0
+            for key, lines in frontier.drain():
+                states_in += 1
+                complete, nodes = depth_first(codec.decode(key, slot), budget, start_time, nodes, line_done, past_slot)
+                if not complete:
+                    break
+            layers.append(LayerStats(slot, states_in, None, nodes - layer_nodes, len(next_frontier.runs),
+                                     tracemalloc.get_traced_memory()[1] if trace_memory else None,
+                                     time.perf_counter() - layer_start))
+            frontier = next_frontier
+            if not complete:
+                break
+
+        # the last frontier holds the ends of the lines
+        paths = winning_paths = final_states = 0
+        best_minions: Optional[int] = None
+        if complete:
+            for key, count in frontier.drain():
+                final_states += 1
+                final_mech: Mech = codec.decode(key, 7)
+                paths += count
+                if win_check(final_mech.board):
+                    winning_paths += count
+                minions_left: int = count_minions(final_mech.board)
+                if best_minions is None or minions_left < best_minions:
+                    best_minions = minions_left
+            # a spilled frontier only knows how many distinct states it has once it's been merged
+            for i in range(len(layers)):
+                layers[i] = layers[i]._replace(
+                    states_out=layers[i + 1].states_in if i + 1 < len(layers) else final_states)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        if own_directory:
+            shutil.rmtree(spill_directory, ignore_errors=True)
+
+    return LayeredResult('complete' if complete else 'partial', paths, winning_paths, final_states, best_minions,
+                         nodes, layers, time.perf_counter() - start_time)
@@ -1,13 +1,15 @@
-import numpy as np
-from custom_types import Vector, Matrix
-from basislists import generate
+import json
+import os
 from typing import List
 from entities import Mech
-from board import Board
-from game_flow import initialize_starting_board
-from copy import deepcopy
-from engine import engine
-from itertools import permutations
+from board_tables import default_table_directory
+from engine import SearchBudget
+from puzzles import load_puzzle
+from solve import solve, SolveCache, SolveOptions
+from telemetry import SweepTelemetry
+
+# a single pathological command line shouldn't be able to stall the whole sweep
+job_budget: SearchBudget = SearchBudget(max_nodes=2_000_000, max_seconds=60.0, max_memory=4 * 1024 ** 3)
 
 
 if __name__ == '__main__':
@@ -24,55 +26,29 @@ if __name__ == '__main__':
     # for basis_list in generate(['Blaze', 'Cyclotron', 'Flamespitter', 'Omnistomp', 'Omnistomp', 'Skewer', 'Speed'], [5]):
     #   make mechs with specific cmd lines here
 
-    base_board: Board = Board(np.zeros((6, 6)))
-    starting_minions: Matrix = np.array(
-        [
-            [0, 2],
-            [1, 2],
-            [2, 0],
-            [2, 1],
-            [2, 4],
-            [5, 2]
-        ]
-    )
-    starting_oil: Matrix = np.array(
-        [
-            [2, 2],
-            [2, 3],
-            [3, 2],
-            [3, 3]
-        ]
-    )
-    initialize_starting_board(base_board, starting_minions, starting_oil)
-
-    command_lines = []
-    for basis_list in generate(['Blaze', 'Cyclotron', 'Flamespitter', 'Omnistomp', 'Omnistomp', 'Skewer', 'Speed'], [6]):
-        command_lines += permutations(basis_list)
-
-    Tristanas = []
-    for cmd_line in command_lines:
-        Right_Tristana = Mech(deepcopy(base_board), np.array([4, 4]), np.array([1, 0]), 'Right')
-        for i in range(len(cmd_line)):
-            if cmd_line[i] in {'Blaze', 'Cyclotron', 'Flamespitter', 'Omnistomp', 'Skewer', 'Speed'}:
-                Right_Tristana.modify_command_line(i, cmd_line[i])
-            else:
-                level = int(cmd_line[i][-1])
-                command = cmd_line[i][:-1]
-                Right_Tristana.modify_command_line(i, command, level)
-        Up_Tristana = deepcopy(Right_Tristana)
-        Up_Tristana.turn(90)
-        Up_Tristana.name = 'Up'
-        Left_Tristana = deepcopy(Up_Tristana)
-        Left_Tristana.turn(90)
-        Left_Tristana.name = 'Left'
-        Down_Tristana = deepcopy(Left_Tristana)
-        Down_Tristana.turn(90)
-        Down_Tristana.name = 'Down'
-        Tristanas += [Right_Tristana, Up_Tristana, Left_Tristana, Down_Tristana]
-
-    trist_num = 0
-    for Tristana in Tristanas:
-        engine(Tristana.board, Tristana)
-        trist_num += 1
-        print(f"A Tristana has been resolved. #{trist_num}")
-
+    # the puzzle itself lives in puzzles/ (see puzzles.py for the format)
+    puzzle = load_puzzle(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'puzzles', 'puzzle_1.json'))
+
+    # the lookup tables are kept on disk, so the next run (and every worker) just maps them
+    cache = SolveCache(default_table_directory())
+    options = SolveOptions(budget=job_budget, workers=os.cpu_count() or 1, timings_path='card_timings.json')
+    results = solve(puzzle.template, puzzle.mech_poses[0], puzzle.cards, puzzle.decksizes, options, cache)
+
+    # jobs that ran out of budget get saved, so that they can be re-run later with bigger limits
+    unfinished_jobs = []
+    telemetry = SweepTelemetry(0, options.workers, stats_path='sweep_stats.json')
+    for result in results:
+        # the jobs are only counted once solve() gets going
+        telemetry.total_jobs = cache.last_job_count
+        telemetry.job_done(result.worker, result.search.nodes, result.search.wins, result.search.seconds)
+        if result.search.wins:
+            print(f"{result.search.wins} winning line(s): {result.orientation} {result.cmd_line}")
+        if result.search.status == 'partial':
+            unfinished_jobs.append((result.cmd_line, result.orientation))
+    telemetry.close()
+    if cache.last_report is not None:
+        print(cache.last_report)
+    if unfinished_jobs:
+        with open('unfinished_jobs.json', 'w') as unfinished_file:
+            json.dump(unfinished_jobs, unfinished_file)
+        print(f"{len(unfinished_jobs)} Tristanas ran out of budget, they were saved to unfinished_jobs.json")
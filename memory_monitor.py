@@ -0,0 +1,236 @@
+import inspect
+import sys
+import time
+import tracemalloc
+from functools import partial
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from auxiliary_functions import current_memory
+from board_tables import BoardTables
+from entities import Mech
+
+# Opt-in memory accounting for the engine (engine(..., monitor=MemoryMonitor())), for sweeps that run out of memory.
+# While the search runs, the monitor keeps track of how long the search stack gets, every so often measures how
+# big a single state is (the Mech, its Board and the closures on its prompt stack, followed all the way down),
+# and checks the memory of the process against a hard limit, so a worker fails with a clear error instead of
+# getting killed by the OS. With tracing on, the allocations that are alive when the traced memory peaks are
+# also put down to the card methods of entities.py that made them.
+
+# how deep tracemalloc looks into the stack of every allocation (it needs to get from the allocation up to the card)
+trace_frames: int = 25
+
+
+class MemoryBudgetExceeded(MemoryError):
+    def __init__(self, message: str, report: 'MemoryReport') -> None:
+        """Raised by the monitor when the process goes over its hard memory limit (the report is up to that point)"""
+        super().__init__(message)
+        self.report: MemoryReport = report
+
+
+class StateSize(NamedTuple):
+    total: int  # bytes of everything the state holds on to
+    board: int  # the Board, its Tiles and what's on them (other players included)
+    prompts: int  # the prompt stack, with the closures and everything they captured
+    mech: int  # the rest: the Mech itself, its command line, position, ...
+
+
+class MemoryReport(NamedTuple):
+    nodes: int  # search stack iterations the monitor saw
+    peak_stack: int  # the longest the search stack got
+    samples: int  # states whose size was measured
+    mean_state: Optional[StateSize]  # the average measured state (None if nothing was measured)
+    max_state: Optional[StateSize]  # the biggest measured state
+    peak_stack_bytes: int  # the biggest the stack got, in bytes (its length times the size of the state on top)
+    peak_process_bytes: int  # the most memory the process used, as far as the checks saw
+    peak_traced_bytes: Optional[int]  # peak traced memory (None if tracing was off)
+    by_card: Dict[str, int]  # bytes alive at the traced peak, per card method (and 'copying', 'other')
+    seconds: float
+
+
+def deep_size(root: object, seen: Optional[Set[int]] = None) -> int:
+    """
+    The bytes of an object and everything it refers to (containers, attributes, closure cells, partial arguments).
+    Things that are shared by every state aren't counted: classes, modules, code, globals and the BoardTables
+    :param root: the object
+    :param seen: ids of the objects already counted (shared between calls to split one state into parts)
+    :return: the number of bytes
+    """
+    seen = seen if seen is not None else set()
+    total: int = 0
+    # a stack instead of recursion, since a big board is a long way down
+    to_visit: List[object] = [root]
+    while to_visit:
+        thing = to_visit.pop()
+        if id(thing) in seen or isinstance(thing, (type, ModuleType, BuiltinFunctionType, BoardTables)):
+            continue
+        seen.add(id(thing))
+        total += sys.getsizeof(thing)
+        if isinstance(thing, dict):
+            to_visit.extend(thing.keys())
+            to_visit.extend(thing.values())
+        elif isinstance(thing, (list, tuple, set, frozenset)):
+            to_visit.extend(thing)
+        elif isinstance(thing, FunctionType):
+            # the closure is what a prompt actually holds on to (the code and the globals are shared)
+            to_visit.extend(cell.cell_contents for cell in thing.__closure__ or () if cell_is_full(cell))
+            to_visit.extend(thing.__defaults__ or ())
+        elif isinstance(thing, partial):
+            to_visit.extend((thing.func, thing.args, thing.keywords))
+        elif isinstance(thing, MethodType):
+            to_visit.append(thing.__self__)
+        else:
+            if hasattr(thing, '__dict__'):
+                to_visit.append(vars(thing))
+            for slot in getattr(type(thing), '__slots__', ()):
+                if hasattr(thing, slot):
+                    to_visit.append(getattr(thing, slot))
+    return total
+
+
+def cell_is_full(cell) -> bool:
+    try:
+        cell.cell_contents
+    except ValueError:
+        return False
+    return True
+
+
+def state_size(mech: Mech) -> StateSize:
+    """Measures a state, split into its prompt stack, the rest of the Mech and its Board"""
+    # everything points at everything else (the Board holds the Mech, the closures hold both), so the parts are
+    # measured from the inside out, with the Mech and the Board off limits until it's their turn
+    seen: Set[int] = {id(mech), id(mech.board)}
+    prompts: int = deep_size(mech.prompt_stack, seen)
+    seen.discard(id(mech))
+    rest: int = deep_size(mech, seen)
+    seen.discard(id(mech.board))
+    board: int = deep_size(mech.board, seen)
+    return StateSize(board + prompts + rest, board, prompts, rest)
+
+
+def card_line_ranges() -> List[Tuple[str, int, int]]:
+    """The (card, first line, last line) of every card method of entities.py (closures included)"""
+    ranges: List[Tuple[str, int, int]] = []
+    for card, method in Mech.translations.items():
+        if not isinstance(method, FunctionType) or method.__name__ == '<lambda>':
+            continue
+        lines, first_line = inspect.getsourcelines(method)
+        ranges.append((card, first_line, first_line + len(lines) - 1))
+    return ranges
+
+
+class MemoryMonitor:
+    def __init__(self, sample_every: int = 1000, check_every: int = 256, max_bytes: Optional[int] = None,
+                 trace: bool = False) -> None:
+        """
+        :param sample_every: measure the state on top of the search stack every this many iterations
+        :param check_every: check the memory of the process every this many iterations
+        :param max_bytes: the hard limit on the memory of the process (resident set size). Going over it raises
+        MemoryBudgetExceeded. None for no limit
+        :param trace: if True, allocations are traced (tracemalloc) and put down to the card methods. It's slow
+        """
+        self.sample_every: int = sample_every
+        self.check_every: int = check_every
+        self.max_bytes: Optional[int] = max_bytes
+        self.trace: bool = trace
+        self.nodes: int = 0
+        self.peak_stack: int = 0
+        self.sizes: List[StateSize] = []
+        self.peak_stack_bytes: int = 0
+        self.peak_process_bytes: int = 0
+        self.peak_traced_bytes: int = 0
+        self.peak_snapshot: Optional[tracemalloc.Snapshot] = None
+        self.started_tracing: bool = False
+        self.start_time: float = 0.0
+        self.seconds: float = 0.0
+
+    def start(self) -> None:
+        """Called by engine() before the search"""
+        self.start_time = time.perf_counter()
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start(trace_frames)
+            self.started_tracing = True
+
+    def observe(self, mech_stack: List[Mech]) -> None:
+        """Called by engine.depth_first() at every iteration, with its search stack"""
+        self.nodes += 1
+        if len(mech_stack) > self.peak_stack:
+            self.peak_stack = len(mech_stack)
+        if mech_stack and self.nodes % self.sample_every == 1:
+            size: StateSize = state_size(mech_stack[-1])
+            self.sizes.append(size)
+            self.peak_stack_bytes = max(self.peak_stack_bytes, size.total * len(mech_stack))
+            if self.trace:
+                traced: int = tracemalloc.get_traced_memory()[0]
+                if traced > self.peak_traced_bytes:
+                    self.peak_traced_bytes = traced
+                    self.peak_snapshot = tracemalloc.take_snapshot()
+        if self.nodes % self.check_every == 0:
+            process_bytes: int = current_memory()
+            self.peak_process_bytes = max(self.peak_process_bytes, process_bytes)
+            if self.max_bytes is not None and process_bytes > self.max_bytes:
+                report: MemoryReport = self.finish()
+                raise MemoryBudgetExceeded(
+                    f'the search went over its memory limit ({process_bytes / 2 ** 20:.0f} MB used, the limit is '
+                    f'{self.max_bytes / 2 ** 20:.0f} MB) after {self.nodes} iterations, with {len(mech_stack)} '
+                    f'states on the search stack of about {report.mean_state.total if report.mean_state else 0} '
+                    f'bytes each', report)
+
+    def finish(self) -> MemoryReport:
+        """Called by engine() after the search (and before MemoryBudgetExceeded is raised)"""
+        self.seconds = time.perf_counter() - self.start_time
+        self.peak_process_bytes = max(self.peak_process_bytes, current_memory())
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        return self.report()
+
+    def report(self) -> MemoryReport:
+        mean_state: Optional[StateSize] = None
+        max_state: Optional[StateSize] = None
+        if self.sizes:
+            mean_state = StateSize(*(sum(column) // len(self.sizes) for column in zip(*self.sizes)))
+            max_state = max(self.sizes, key=lambda size: size.total)
+        return MemoryReport(self.nodes, self.peak_stack, len(self.sizes), mean_state, max_state,
+                            self.peak_stack_bytes, self.peak_process_bytes,
+                            self.peak_traced_bytes if self.trace else None, self.by_card(), self.seconds)
+
+    def by_card(self) -> Dict[str, int]:
+        """Puts the allocations alive at the traced peak down to the card method that made them"""
+        if self.peak_snapshot is None:
+            return {}
+        entities_file: str = inspect.getsourcefile(Mech)
+        ranges: List[Tuple[str, int, int]] = card_line_ranges()
+        totals: Dict[str, int] = {}
+        for statistic in self.peak_snapshot.statistics('traceback'):
+            owner: str = 'other'
+            # from the allocation outwards: the first card method on the way is the one that asked for it
+            for frame in reversed(statistic.traceback):
+                if frame.filename == entities_file:
+                    card: Optional[str] = next((card for card, first, last in ranges
+                                                if first <= frame.lineno <= last), None)
+                    if card is not None:
+                        owner = card
+                        break
+                elif frame.filename.endswith('copy.py'):
+                    owner = 'copying'
+                    break
+            totals[owner] = totals.get(owner, 0) + statistic.size
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def report_text(report: MemoryReport) -> str:
+    """Describes a MemoryReport"""
+    lines: List[str] = [f'{report.nodes} iterations in {report.seconds:.2f}s, the search stack peaked at '
+                        f'{report.peak_stack} states']
+    if report.mean_state is not None:
+        mean, biggest = report.mean_state, report.max_state
+        lines.append(f'a state is {mean.total} bytes on average (board {mean.board}, prompts {mean.prompts}, '
+                     f'Mech {mean.mech}), {biggest.total} at most, over {report.samples} samples')
+    lines.append(f'peak stack about {report.peak_stack_bytes / 1024:.0f} KB, '
+                 f'peak process {report.peak_process_bytes / 2 ** 20:.0f} MB')
+    if report.peak_traced_bytes is not None:
+        lines.append(f'peak traced {report.peak_traced_bytes / 1024:.0f} KB, alive at the peak:')
+        for owner, size in report.by_card.items():
+            lines.append(f'    {owner:<16} {size / 1024:>9.1f} KB')
+    return '\n'.join(lines)
@@ -0,0 +1,232 @@
+import json
+import os
+import random
+from copy import deepcopy
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from auxiliary_functions import Prompt
+from board import BoardTemplate
+from board_tables import BoardTables
+from engine import engine, win_check, SearchResult
+from entities import Mech
+from solve import list_jobs, make_mech, SolveCache, SolveOptions
+
+# Learns which option of a prompt tends to lead to a win, so that a search for the first winning line
+# (engine(..., order=stats.order, stop_at_first=True)) can try the likely winners first.
+# An option is described by its card and level, its index, and which of the squares around the Mech (in front,
+# to the left, to the right, behind) have a Minion on them. Every time an option is searched while learning,
+# it's counted, along with whether any line below it still wins. The options of a prompt are then tried
+# from the best win rate down. The statistics are kept in a JSON file, so they keep growing from sweep to sweep.
+
+Cell = Tuple[int, int]
+Job = Tuple[Tuple[str, ...], Cell]
+
+# cards that don't push any prompts, so they're never the card a prompt belongs to
+no_prompt_cards: Tuple[str, ...] = ('Empty', 'Short Circuit')
+
+# the version of the statistics file (files of another version are ignored)
+stats_version: int = 1
+
+
+def current_card(mech: Mech, prompt: Prompt) -> Tuple[str, int]:
+    """
+    The card (and its level) a prompt belongs to. Prompts pushed while a card is being executed aren't tagged
+    (see Prompt.slot), but they're always above the prompts of the cards that haven't started yet,
+    so they belong to the last card before the next tagged prompt on the stack
+    :param mech: the Mech (with the prompt already taken off its stack)
+    :param prompt: the prompt
+    :return: (card, level)
+    """
+    slot: Optional[int] = prompt.slot
+    if slot is None:
+        next_slot: int = 7
+        for waiting in reversed(mech.prompt_stack):
+            if waiting.slot is not None:
+                next_slot = waiting.slot
+                break
+        slot = next_slot - 1
+        while slot > 1 and mech.command_line[slot - 1][0] in no_prompt_cards:
+            slot -= 1
+    return mech.command_line[slot - 1]
+
+
+def neighbourhood(mech: Mech) -> str:
+    """
+    Which squares around the Mech have a Minion on them, as 4 characters (in front, left, right, behind),
+    e.g. 'F..B' for Minions in front and behind
+    """
+    x, y = int(mech.position[0]), int(mech.position[1])
+    dx, dy = int(mech.orientation[0]), int(mech.orientation[1])
+    width, height = mech.board.shape
+    context: List[str] = []
+    for letter, (step_x, step_y) in zip('FLRB', ((dx, dy), (-dy, dx), (dy, -dx), (-dx, -dy))):
+        square: Cell = (x + step_x, y + step_y)
+        occupied: bool = (0 <= square[0] < width and 0 <= square[1] < height and
+                          mech.board[square].has_minion())
+        context.append(letter if occupied else '.')
+    return ''.join(context)
+
+
+class MoveStats:
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        Win statistics of prompt options, learned from past searches
+        :param path: JSON file the statistics are loaded from and saved to. If None, nothing is persisted
+        """
+        self.path: Optional[str] = path
+        # 'card|level|option|context' -> [times searched, times a line below it won]
+        # (the context '*' counts the option in every context, for contexts that were never seen)
+        self.counts: Dict[str, List[int]] = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                data = json.load(file)
+            if data.get('version') == stats_version:
+                self.counts = data['counts']
+
+    def keys(self, mech: Mech, prompt: Prompt) -> List[Tuple[str, str]]:
+        """The (key, key without context) of every option of a prompt (the Mech has the prompt taken off)"""
+        card, level = current_card(mech, prompt)
+        context: str = neighbourhood(mech)
+        return [(f'{card}|{level}|{i}|{context}', f'{card}|{level}|{i}|*') for i in range(prompt.num_options)]
+
+    def win_rate(self, key: str, general_key: str) -> float:
+        """The smoothed win rate of an option (0.5 if it's never been seen in any context)"""
+        tries, wins = self.counts.get(key) or self.counts.get(general_key) or (0, 0)
+        return (wins + 1) / (tries + 2)
+
+    def order(self, mech: Mech, prompt: Prompt) -> List[int]:
+        """
+        The options of a prompt from the highest win rate down, for engine(..., order=...). Ties keep the usual order
+        :param mech: the Mech (with the prompt already taken off its stack)
+        :param prompt: the prompt
+        :return: the option indices
+        """
+        rates: List[float] = [self.win_rate(key, general_key) for key, general_key in self.keys(mech, prompt)]
+        return sorted(range(prompt.num_options), key=lambda i: -rates[i])
+
+    def record(self, key: str, general_key: str, won: bool) -> None:
+        for counted_key in (key, general_key):
+            counts: List[int] = self.counts.setdefault(counted_key, [0, 0])
+            counts[0] += 1
+            counts[1] += won
+
+    def learn(self, mech: Mech) -> int:
+        """
+        Searches a Mech's whole command line (like engine() does) and counts every option on the way
+        :param mech: the Mech, with its command line loaded but not read
+        :return: the number of winning lines
+        """
+        mech.read_command_line()
+        return self._learn(mech)
+
+    def _learn(self, mech: Mech) -> int:
+        """The winning lines below a state (the Mech is used up)"""
+        if not mech.prompt_stack:
+            return int(win_check(mech.board))
+        top_prompt: Prompt = mech.prompt_stack.pop()
+        if top_prompt.num_options <= 1:
+            # nothing to choose from, so nothing to learn
+            if top_prompt.num_options == 1:
+                top_prompt.executable(mech, 0)
+            return self._learn(mech)
+        keys: List[Tuple[str, str]] = self.keys(mech, top_prompt)
+        wins: int = 0
+        for i in range(top_prompt.num_options):
+            # the Mech itself is used up by the last option, and only the others get copies
+            option_mech: Mech = deepcopy(mech) if i < top_prompt.num_options - 1 else mech
+            top_prompt.executable(option_mech, i)
+            option_wins: int = self._learn(option_mech)
+            self.record(*keys[i], option_wins > 0)
+            wins += option_wins
+        return wins
+
+    def save(self) -> None:
+        """Writes the statistics back to the JSON file (if there is one)"""
+        if self.path is not None:
+            with open(self.path, 'w') as file:
+                json.dump({'version': stats_version, 'counts': self.counts}, file)
+
+
+def learn_sweep(stats: MoveStats, template: BoardTemplate, mech_pose: Tuple[Cell, Optional[Cell]],
+                card_pool: Sequence[str], decksizes: Sequence[int], cache: Optional[SolveCache] = None) -> int:
+    """
+    Learns from every job of a puzzle (the arguments are the same as for solve.solve())
+    :return: the number of winning lines found
+    """
+    cache = cache if cache is not None else SolveCache()
+    tables: BoardTables = cache.tables(template.shape)
+    position: Cell = (int(mech_pose[0][0]), int(mech_pose[0][1]))
+    jobs: List[Job] = list_jobs(template, tables, mech_pose, card_pool, decksizes, SolveOptions(), cache)
+    return sum(stats.learn(make_mech(template, tables, position, orientation, cmd_line))
+               for cmd_line, orientation in jobs)
+
+
+# -- Measuring the difference --
+
+class FirstWinRow(NamedTuple):
+    ordering: str  # 'index' (the usual order) or 'learned'
+    jobs: int  # winnable jobs searched
+    nodes: int  # prompts executed until the first win, over all the jobs
+    seconds: float  # time until the first win, over all the jobs
+
+
+benchmark_cards: Tuple[str, ...] = ('Scythe', 'Skewer', 'Ripsaw', 'Fuel Tank', 'Blaze', 'Flamespitter', 'Cyclotron',
+                                    'Speed', 'Chain Lightning', 'Memory Core', 'Omnistomp', 'Hexmatic Aimbot')
+
+
+def random_job(rng: random.Random, size: int = 6) -> Tuple[BoardTemplate, Cell, Cell, List[str]]:
+    """A random map with a few Minions, and a random 4 card command line for a Mech on it"""
+    squares: List[Cell] = [(x, y) for x in range(size) for y in range(size)]
+    rng.shuffle(squares)
+    minions: List[Cell] = squares[1:rng.randint(2, 5)]
+    template = BoardTemplate((size, size), minions, squares[6:8], [(squares[8], (1, 0), False)])
+    orientation: Cell = rng.choice([(1, 0), (0, 1), (-1, 0), (0, -1)])
+    cmd_line: List[str] = [f'{rng.choice(benchmark_cards)}{rng.randint(1, 3)}' for _ in range(4)]
+    return template, squares[0], orientation, cmd_line
+
+
+def first_win_benchmark(train_jobs: int = 300, test_jobs: int = 300, seed: int = 0,
+                        stats: Optional[MoveStats] = None) -> List[FirstWinRow]:
+    """
+    Learns from some random jobs, then searches other random jobs for their first winning line,
+    once in the usual order and once in the learned order (jobs that can't win are left out)
+    :param train_jobs: number of jobs to learn from
+    :param test_jobs: number of jobs to test on
+    :param seed: seed of the random jobs
+    :param stats: statistics to start from (and add to). If None, it starts from nothing
+    :return: a FirstWinRow for either order
+    """
+    rng = random.Random(seed)
+    stats = stats if stats is not None else MoveStats()
+    cache = SolveCache()
+
+    def mech_for(job: Tuple[BoardTemplate, Cell, Cell, List[str]]) -> Mech:
+        template, position, orientation, cmd_line = job
+        return make_mech(template, cache.tables(template.shape), position, orientation, cmd_line)
+
+    for _ in range(train_jobs):
+        stats.learn(mech_for(random_job(rng)))
+
+    totals: Dict[str, List[float]] = {'index': [0, 0, 0.0], 'learned': [0, 0, 0.0]}
+    for _ in range(test_jobs):
+        job = random_job(rng)
+        for ordering, order in (('index', None), ('learned', stats.order)):
+            mech: Mech = mech_for(job)
+            result: SearchResult = engine(mech.board, mech, order=order, stop_at_first=True)
+            if result.first_win_seconds is None:
+                break
+            totals[ordering][0] += 1
+            totals[ordering][1] += result.nodes
+            totals[ordering][2] += result.first_win_seconds
+    return [FirstWinRow(ordering, int(jobs), int(nodes), seconds) for ordering, (jobs, nodes, seconds) in totals.items()]
+
+
+def first_win_table(rows: List[FirstWinRow]) -> str:
+    """Formats the rows as a table"""
+    lines = [f"{'ordering':>8}  {'jobs':>5}  {'nodes':>9}  {'seconds':>8}"]
+    for row in rows:
+        lines.append(f'{row.ordering:>8}  {row.jobs:>5}  {row.nodes:>9}  {row.seconds:>8.3f}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    print(first_win_table(first_win_benchmark()))
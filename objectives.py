@@ -0,0 +1,133 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence, Tuple
+from board import Board
+from entities import Bomb, Mech
+from feasibility import Footprint, footprint_from, in_bounds, minion_squares
+from game_flow import count_minions
+
+# What makes a line good, for when clearing the board isn't possible (or isn't the only thing that matters).
+# Every Objective gives a finished board a score (higher is better), and gives a Mech that's still in the middle of
+# its command line an upper bound on the best score it could still get. The bounds use the footprint of the cards
+# that haven't been executed yet (see feasibility.py), so they never underestimate, which is what lets
+# engine.optimize() skip every subtree that can't beat the lines it already has. That includes the Minions the Bomb
+# could still be pushed onto: the footprint follows the Bomb as well, from wherever it is right now.
+
+Cell = Tuple[int, int]
+
+
+def find_bomb(board: Board) -> Optional[Bomb]:
+    """The Bomb on the board, or None if there isn't one"""
+    for _, tile in board.occupied():
+        if isinstance(tile.thing, Bomb):
+            return tile.thing
+    return None
+
+
+def remaining_footprint(mech: Mech) -> Footprint:
+    """
+    Over-approximates what the rest of a Mech's command line could still reach and damage
+    (the card that's being executed, if any, plus every card that hasn't been started yet)
+    :param mech: a Mech in the middle of its command line (see Prompt.slot)
+    :return: a Footprint, starting from where the Mech is now
+    """
+    first_slot: int = 7
+    for prompt in mech.prompt_stack:
+        if prompt.slot is not None:
+            first_slot = min(first_slot, prompt.slot)
+    if mech.prompt_stack and mech.prompt_stack[-1].slot is None:
+        # a card is halfway done: the last card before first_slot that pushed any prompts at all
+        for slot in range(first_slot - 1, 0, -1):
+            if mech.command_line[slot - 1][0] not in ('Empty', 'Short Circuit'):
+                first_slot = slot
+                break
+    pose = ((int(mech.position[0]), int(mech.position[1])), (int(mech.orientation[0]), int(mech.orientation[1])))
+    return footprint_from(mech.board, {pose}, mech.command_line[first_slot - 1:])
+
+
+class Objective(ABC):
+    """Something to maximise"""
+
+    @abstractmethod
+    def score(self, board: Board) -> float:
+        """
+        Scores a board at the end of a line
+        :param board: the game board
+        :return: the score (higher is better)
+        """
+        ...
+
+    @abstractmethod
+    def bound(self, mech: Mech, footprint: Footprint) -> float:
+        """
+        An upper bound on the score of any line that continues from here
+        :param mech: the Mech, in the middle of its command line
+        :param footprint: remaining_footprint(mech)
+        :return: a score that no continuation can beat
+        """
+        ...
+
+
+class MinionsKilled(Objective):
+    """As few Minions left as possible (the score is minus the number of Minions left)"""
+
+    def score(self, board: Board) -> float:
+        return -count_minions(board)
+
+    def bound(self, mech: Mech, footprint: Footprint) -> float:
+        # every Minion out of reach (of the Mech, and of the Bomb it could push) is going to survive
+        return -len(minion_squares(mech.board) - footprint.damage)
+
+
+class BombDistance(Objective):
+    """The Bomb as close as possible to the repair pad (the score is minus the Manhattan distance)"""
+
+    def score(self, board: Board) -> float:
+        bomb: Optional[Bomb] = find_bomb(board)
+        if bomb is None or board.repair_pad is None:
+            return 0.0
+        return -float(abs(int(bomb.position[0]) - board.repair_pad[0]) +
+                      abs(int(bomb.position[1]) - board.repair_pad[1]))
+
+    def bound(self, mech: Mech, footprint: Footprint) -> float:
+        board: Board = mech.board
+        bomb: Optional[Bomb] = find_bomb(board)
+        if bomb is None or board.repair_pad is None:
+            return 0.0
+        # the Bomb only moves if the Mech pushes it (walks into it) or tows it (from a square next to it)
+        x, y = int(bomb.position[0]), int(bomb.position[1])
+        around: List[Cell] = [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                              if in_bounds(board, (x + dx, y + dy))]
+        if any(square in footprint.reach for square in around):
+            return 0.0
+        return self.score(board)
+
+
+class BombHealth(Objective):
+    """As much Bomb HP left as possible (the score is the Bomb's HP)"""
+
+    def score(self, board: Board) -> float:
+        bomb: Optional[Bomb] = find_bomb(board)
+        return float(bomb.health) if bomb is not None else 0.0
+
+    def bound(self, mech: Mech, footprint: Footprint) -> float:
+        # the Bomb never heals
+        return self.score(mech.board)
+
+
+class WeightedSum(Objective):
+    """A weighted sum of other objectives"""
+
+    def __init__(self, terms: Sequence[Tuple[float, Objective]]) -> None:
+        """
+        :param terms: (weight, objective) pairs. The weights can't be negative, since that would turn the objective's
+        upper bound into a lower bound (flip the objective around instead)
+        """
+        if any(weight < 0 for weight, _ in terms):
+            raise ValueError('the weights of a WeightedSum have to be >= 0')
+        self.terms: List[Tuple[float, Objective]] = list(terms)
+
+    def score(self, board: Board) -> float:
+        return sum(weight * objective.score(board) for weight, objective in self.terms)
+
+    def bound(self, mech: Mech, footprint: Footprint) -> float:
+        return sum(weight * objective.bound(mech, footprint) for weight, objective in self.terms)
@@ -0,0 +1,364 @@
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from auxiliary_functions import ChancePrompt
+from board import BoardTemplate
+from board_tables import BoardTables
+from engine import engine, SearchBudget
+from entities import Mech
+from game_flow import count_minions, minions_phase, players_move, resolve_prompts
+from solve import direction_names
+
+# Plans several turns ahead: which cards to draft, and which slots to put them in.
+# Every turn, the Mech is dealt a hand and drafts a few cards out of it, slotting every drafted card into its
+# (persistent) command line with the usual stacking rules. Then the command line is executed, and the Minions
+# move, spawn and attack. There are way too many ways this could go to search all of them,
+# so this is a Monte Carlo tree search over the draft and slot decisions.
+# - Inside the tree, a command line is played out with the engine (the line that leaves the fewest Minions).
+# - The rollouts below the tree make random decisions, and play the command lines out either with the engine
+#   or with random choices (a lot cheaper), see PlannerConfig.rollout_policy.
+# - Rollouts run in a process pool. While a rollout is out, its path is given a virtual loss,
+#   so that the next selections spread out over the tree instead of all piling onto the same leaf.
+# The deals (and the damage cards drawn when the Minions attack) come from a seeded random generator,
+# so the planner plans against one known sequence of hands.
+
+Cell = Tuple[int, int]
+Action = Tuple[str, object]  # ('draft', card name) or ('slot', slot number)
+
+
+class PlannerConfig(NamedTuple):
+    deck: Tuple[str, ...]  # the cards the hands are dealt from (repeat a card to make it more common)
+    turns: int = 3  # how many turns to plan for
+    hand_size: int = 4
+    picks: int = 2  # cards drafted per turn
+    spawn_points: Tuple[Cell, ...] = ()
+    turn_budget: SearchBudget = SearchBudget(max_nodes=20_000)  # for every engine call
+    rollout_policy: str = 'random'  # 'engine' or 'random'
+    hit_penalty: float = 0.5  # how much every hit a Mech takes is worth, in killed Minions
+    seed: int = 0
+
+
+class PlanState(NamedTuple):
+    template: BoardTemplate  # the board at the start of the turn (without the Mech)
+    position: Cell
+    orientation: Cell
+    command_line: Tuple[Tuple[str, int], ...]
+    turn: int
+    hand: Tuple[str, ...]  # the cards of this turn's deal that weren't drafted (yet)
+    drafted: Optional[str]  # a drafted card that still needs a slot
+    picks_left: int
+    killed: int  # Minions killed so far
+    hits: int  # hits taken so far
+    damage_deck: Optional[Tuple[int, ...]] = None  # see Board.damage_deck
+
+
+class TreeStats(NamedTuple):
+    iterations: int
+    seconds: float
+    tree_nodes: int
+    max_depth: int
+    rollouts_per_second: float
+    root_children: List[Tuple[Action, int, float]]  # (action, visits, mean reward) of every child of the root
+
+    def __str__(self) -> str:
+        lines = [f'{self.iterations} iterations in {self.seconds:.1f}s ({self.rollouts_per_second:.1f} rollouts/s), '
+                 f'{self.tree_nodes} nodes, depth {self.max_depth}']
+        for action, visits, mean in self.root_children:
+            lines.append(f'  {action[0]} {action[1]}: {visits} visits, mean {mean:.2f}')
+        return '\n'.join(lines)
+
+
+class Plan(NamedTuple):
+    actions: List[Action]  # the most visited line of decisions, as far as the tree goes
+    value: float  # the mean reward of the first decision of actions
+    stats: TreeStats
+
+
+def deal(config: PlannerConfig, turn: int) -> Tuple[str, ...]:
+    """The hand dealt on a turn (the same every time for the same seed)"""
+    rng = random.Random(config.seed * 1_000_003 + turn)
+    return tuple(sorted(rng.sample(config.deck, min(config.hand_size, len(config.deck)))))
+
+
+def initial_state(template: BoardTemplate, position: Cell, orientation: Cell, config: PlannerConfig,
+                  command_line: Sequence[Tuple[str, int]] = (('Empty', 1),) * 6) -> PlanState:
+    """
+    The state at the start of the first turn
+    :param template: the starting board (without the Mech)
+    :param position: (x, y) of the Mech
+    :param orientation: the direction the Mech is facing
+    :param config: PlannerConfig
+    :param command_line: the command line the Mech starts with
+    :return: a PlanState
+    """
+    return PlanState(template, tuple(position), tuple(orientation), tuple(command_line), 0, deal(config, 0), None,
+                     config.picks, 0, 0)
+
+
+def slotted(command_line: Tuple[Tuple[str, int], ...], slot: int, card: str) -> Tuple[Tuple[str, int], ...]:
+    """Slots a card into a command line, following the stacking rules of Mech.modify_command_line()"""
+    # a bare Mech is enough, modify_command_line() only looks at the command line
+    holder: Mech = Mech.__new__(Mech)
+    holder.command_line = list(command_line)
+    holder.modify_command_line(slot, card)
+    return tuple(holder.command_line)
+
+
+def legal_actions(state: PlanState, config: PlannerConfig) -> List[Action]:
+    """
+    The decisions that can be made in a state
+    :return: a list of actions (empty once the last turn is over)
+    """
+    if state.turn >= config.turns:
+        return []
+    if state.drafted is not None:
+        # slots that would end up with the same command line are the same decision
+        actions: List[Action] = []
+        seen = set()
+        for slot in range(1, 7):
+            result = slotted(state.command_line, slot, state.drafted)
+            if result not in seen:
+                seen.add(result)
+                actions.append(('slot', slot))
+        return actions
+    return [('draft', card) for card in sorted(set(state.hand))]
+
+
+# lookup tables of the boards the planner has seen (in this process)
+tables_by_shape: Dict[Tuple[int, int], BoardTables] = {}
+
+
+def play_turn(state: PlanState, config: PlannerConfig, rng: Optional[random.Random] = None) -> PlanState:
+    """
+    Executes the command line and plays out the Minion phases, moving on to the next turn
+    :param state: a state with every card of the turn slotted
+    :param config: PlannerConfig
+    :param rng: if given, the command line is played out with random choices instead of searched with the engine
+    :return: the state at the start of the next turn
+    """
+    shape: Tuple[int, int] = state.template.shape
+    if shape not in tables_by_shape:
+        tables_by_shape[shape] = BoardTables(shape)
+    board = state.template.instantiate(tables_by_shape[shape])
+    board.damage_deck = state.damage_deck
+    mech = Mech(board, np.array(state.position), np.array(state.orientation),
+                direction_names.get(state.orientation, 'Mech'))
+    mech.command_line = list(state.command_line)
+    minions_before: int = count_minions(board)
+    final_mech: Optional[Mech] = None
+    if rng is None:
+        final_mech = engine(board, mech, config.turn_budget).best_mech
+    if final_mech is None:
+        # either a random rollout, or the engine ran out of budget before finishing a single line
+        chooser_rng = rng if rng is not None else random.Random(config.seed)
+        players_move(board, lambda player, prompt: chooser_rng.randrange(prompt.num_options))
+        final_mech = mech
+    killed: int = minions_before - count_minions(final_mech.board)
+    hits: int = sum(minions_phase(final_mech.board, np.array(config.spawn_points, dtype=int).reshape(-1, 2)))
+    # the damage cards are drawn at random (the same way every time inside the tree)
+    damage_rng = rng if rng is not None else random.Random(config.seed * 1_000_003 + state.turn)
+    resolve_prompts(final_mech, lambda player, prompt: damage_rng.choices(range(prompt.num_options),
+                                                                           prompt.probabilities)[0]
+                    if isinstance(prompt, ChancePrompt) else 0)
+    return PlanState(BoardTemplate.from_board(final_mech.board),
+                     (int(final_mech.position[0]), int(final_mech.position[1])),
+                     (int(final_mech.orientation[0]), int(final_mech.orientation[1])),
+                     tuple(final_mech.command_line), state.turn + 1, deal(config, state.turn + 1), None, config.picks,
+                     state.killed + killed, state.hits + hits, final_mech.board.damage_deck)
+
+
+def apply(state: PlanState, action: Action, config: PlannerConfig,
+          rng: Optional[random.Random] = None) -> PlanState:
+    """
+    Makes a decision (if it was the last decision of the turn, the turn is played out as well)
+    :param state: the current state
+    :param action: one of legal_actions(state, config)
+    :param config: PlannerConfig
+    :param rng: passed on to play_turn()
+    :return: the next state
+    """
+    kind, value = action
+    if kind == 'draft':
+        hand: List[str] = list(state.hand)
+        hand.remove(value)
+        return state._replace(hand=tuple(hand), drafted=value, picks_left=state.picks_left - 1)
+    state = state._replace(command_line=slotted(state.command_line, value, state.drafted), drafted=None)
+    if state.picks_left == 0 or not state.hand:
+        return play_turn(state, config, rng)
+    return state
+
+
+def reward(state: PlanState, config: PlannerConfig) -> float:
+    return state.killed - config.hit_penalty * state.hits
+
+
+def rollout(state: PlanState, config: PlannerConfig, seed: int) -> float:
+    """
+    Makes random decisions until the last turn is over
+    :return: the reward of the final state
+    """
+    rng = random.Random(seed)
+    policy_rng: Optional[random.Random] = rng if config.rollout_policy == 'random' else None
+    while True:
+        actions: List[Action] = legal_actions(state, config)
+        if not actions:
+            return reward(state, config)
+        state = apply(state, rng.choice(actions), config, policy_rng)
+
+
+# the config of a worker process (set once by _init_worker)
+worker_config: Optional[PlannerConfig] = None
+
+
+def _init_worker(config: PlannerConfig) -> None:
+    global worker_config
+    worker_config = config
+
+
+def _rollout_job(job: Tuple[PlanState, int]) -> float:
+    return rollout(job[0], worker_config, job[1])
+
+
+class Node:
+    __slots__ = ('parent', 'action', 'state', 'children', 'untried', 'visits', 'total', 'pending', 'depth')
+
+    def __init__(self, parent: Optional['Node'], action: Optional[Action], state: PlanState,
+                 config: PlannerConfig) -> None:
+        self.parent: Optional[Node] = parent
+        self.action: Optional[Action] = action
+        self.state: PlanState = state
+        self.children: List[Node] = []
+        self.untried: List[Action] = legal_actions(state, config)
+        self.visits: int = 0
+        self.total: float = 0.0
+        self.pending: int = 0  # rollouts that are still out (the virtual loss)
+        self.depth: int = parent.depth + 1 if parent is not None else 0
+
+    def mean(self) -> float:
+        return self.total / self.visits if self.visits else 0.0
+
+
+class MCTSPlanner:
+    def __init__(self, config: PlannerConfig, workers: int = 1, exploration: float = 1.4) -> None:
+        """
+        :param config: PlannerConfig
+        :param workers: number of processes the rollouts run in (1 means everything runs in this process)
+        :param exploration: the UCT exploration constant (scaled by the largest reward seen so far)
+        """
+        self.config: PlannerConfig = config
+        self.workers: int = workers
+        self.exploration: float = exploration
+        self.reward_scale: float = 1.0
+        self.tree_nodes: int = 0
+        self.max_depth: int = 0
+
+    def uct(self, parent: Node, child: Node) -> float:
+        # pending rollouts count as visits that returned nothing (the virtual loss)
+        visits: int = child.visits + child.pending
+        if visits == 0:
+            return math.inf
+        return (child.total / visits + self.exploration * self.reward_scale *
+                math.sqrt(math.log(parent.visits + parent.pending + 1) / visits))
+
+    def select(self, root: Node) -> Node:
+        """Walks down the tree and expands one new node (or stops at a terminal one)"""
+        node: Node = root
+        while not node.untried and node.children:
+            node = max(node.children, key=lambda child: self.uct(node, child))
+        if node.untried:
+            action: Action = node.untried.pop()
+            child = Node(node, action, apply(node.state, action, self.config), self.config)
+            node.children.append(child)
+            self.tree_nodes += 1
+            self.max_depth = max(self.max_depth, child.depth)
+            node = child
+        walker: Optional[Node] = node
+        while walker is not None:
+            walker.pending += 1
+            walker = walker.parent
+        return node
+
+    def backpropagate(self, node: Node, value: float) -> None:
+        self.reward_scale = max(self.reward_scale, abs(value))
+        walker: Optional[Node] = node
+        while walker is not None:
+            walker.pending -= 1
+            walker.visits += 1
+            walker.total += value
+            walker = walker.parent
+
+    def plan(self, state: PlanState, max_iterations: Optional[int] = 1000,
+             max_seconds: Optional[float] = None) -> Plan:
+        """
+        Searches for the best decisions from a state
+        :param state: the state to plan from (see initial_state())
+        :param max_iterations: stop after this many rollouts (None for no limit)
+        :param max_seconds: stop after this much time (None for no limit)
+        :return: a Plan
+        """
+        if max_iterations is None and max_seconds is None:
+            raise ValueError('the planner needs an iteration or a time budget')
+        start_time = time.perf_counter()
+        root = Node(None, None, state, self.config)
+        self.tree_nodes, self.max_depth, self.reward_scale = 1, 0, 1.0
+        started: int = 0
+        finished: int = 0
+        rng = random.Random(self.config.seed)
+
+        def can_start() -> bool:
+            if max_iterations is not None and started >= max_iterations:
+                return False
+            return max_seconds is None or time.perf_counter() - start_time < max_seconds
+
+        if self.workers <= 1:
+            _init_worker(self.config)
+            while can_start():
+                leaf = self.select(root)
+                started += 1
+                self.backpropagate(leaf, _rollout_job((leaf.state, rng.getrandbits(32))))
+                finished += 1
+        else:
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.config,)) as executor:
+                in_flight: Dict[Future, Node] = {}
+                while True:
+                    # keep every worker busy (with a little slack so they never wait on the tree)
+                    while len(in_flight) < 2 * self.workers and can_start():
+                        leaf = self.select(root)
+                        started += 1
+                        in_flight[executor.submit(_rollout_job, (leaf.state, rng.getrandbits(32)))] = leaf
+                    if not in_flight:
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.backpropagate(in_flight.pop(future), future.result())
+                        finished += 1
+
+        seconds: float = time.perf_counter() - start_time
+        actions: List[Action] = []
+        node = root
+        while node.children:
+            node = max(node.children, key=lambda child: child.visits)
+            actions.append(node.action)
+        # the value of the decision that's actually taken (the most visited one, not the one with the best mean,
+        # which is often just a lucky child with a handful of visits)
+        first_value: float = (max(root.children, key=lambda child: child.visits).mean() if root.children
+                              else root.mean())
+        stats = TreeStats(finished, seconds, self.tree_nodes, self.max_depth, finished / seconds if seconds else 0.0,
+                          sorted(((child.action, child.visits, child.mean()) for child in root.children),
+                                 key=lambda entry: -entry[1]))
+        return Plan(actions, first_value, stats)
+
+
+if __name__ == '__main__':
+    from puzzles import load_puzzle
+
+    demo_puzzle = load_puzzle(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'puzzles', 'puzzle_1.json'))
+    demo_config = PlannerConfig(deck=tuple(demo_puzzle.cards) * 2, turns=2, spawn_points=((0, 0), (5, 5)))
+    demo_state = initial_state(demo_puzzle.template, demo_puzzle.mech_poses[0][0], (1, 0), demo_config)
+    demo_plan = MCTSPlanner(demo_config, workers=os.cpu_count() or 1).plan(demo_state, max_iterations=200)
+    print(demo_plan.stats)
+    print('plan:', ', '.join(f'{kind} {value}' for kind, value in demo_plan.actions))
@@ -0,0 +1,101 @@
+import json
+import os
+from typing import List, NamedTuple, Optional, Tuple
+from board import BoardTemplate
+
+# Puzzles are stored as JSON files that look like this (everything but "size" and "cards" is optional):
+# {
+#     "name": "puzzle 2",
+#     "size": [6, 6],
+#     "minions": [[0, 2], [1, 2]],
+#     "oil": [[2, 2], [2, 3]],
+#     "walls": [[3, 0]],
+#     "spiked_walls": [{"position": [3, 1], "facing": [1, 0]}],
+#     "bomb": {"position": [0, 0], "health": 3},
+#     "repair_pad": [5, 5],
+#     "mechs": [{"position": [4, 4], "orientation": [1, 0]}],
+#     "cards": ["Blaze", "Cyclotron", "Omnistomp", "Omnistomp"],
+#     "decksizes": [6]
+# }
+# A Mech without an orientation (or with "orientation": null) is tried facing every direction.
+# With a repair pad, a line only wins once the Bomb is on it (see engine.win_check()).
+# If "name" is left out, the file name is used instead, and if "decksizes" is left out, every size up to 6 is used.
+
+Cell = Tuple[int, int]
+
+
+class Puzzle(NamedTuple):
+    name: str
+    template: BoardTemplate
+    mech_poses: List[Tuple[Cell, Optional[Cell]]]
+    cards: List[str]
+    decksizes: List[int]
+
+
+def puzzle_from_dict(data: dict, default_name: str = 'puzzle') -> Puzzle:
+    """
+    Reads a puzzle out of a dictionary (in the format above)
+    :param data: the dictionary
+    :param default_name: the name used if the dictionary doesn't have one
+    :return: the Puzzle
+    """
+    walls = [((x, y), (1, 0), False) for x, y in data.get('walls', [])]
+    walls += [(tuple(wall['position']), tuple(wall['facing']), True) for wall in data.get('spiked_walls', [])]
+    bomb = data.get('bomb')
+    repair_pad = data.get('repair_pad')
+    template = BoardTemplate(tuple(data['size']), data.get('minions', []), data.get('oil', []), walls,
+                             (tuple(bomb['position']), bomb['health']) if bomb is not None else None,
+                             tuple(repair_pad) if repair_pad is not None else None)
+    mech_poses: List[Tuple[Cell, Optional[Cell]]] = []
+    for mech in data.get('mechs', []):
+        orientation = mech.get('orientation')
+        mech_poses.append((tuple(mech['position']), tuple(orientation) if orientation is not None else None))
+    return Puzzle(data.get('name', default_name), template, mech_poses, list(data['cards']),
+                  list(data.get('decksizes', range(1, 7))))
+
+
+def puzzle_to_dict(puzzle: Puzzle) -> dict:
+    """Writes a Puzzle into a dictionary (in the format above)"""
+    template: BoardTemplate = puzzle.template
+    data: dict = {
+        'name': puzzle.name,
+        'size': list(template.shape),
+        'minions': [list(square) for square in template.minions],
+        'oil': [[int(x), int(y)] for x in range(template.shape[0]) for y in range(template.shape[1])
+                if template.oil[x, y]],
+        'walls': [list(position) for position, _, is_spiked in template.walls if not is_spiked],
+        'spiked_walls': [{'position': list(position), 'facing': list(facing)}
+                         for position, facing, is_spiked in template.walls if is_spiked],
+        'mechs': [{'position': list(position), 'orientation': list(orientation) if orientation is not None else None}
+                  for position, orientation in puzzle.mech_poses],
+        'cards': list(puzzle.cards),
+        'decksizes': list(puzzle.decksizes)
+    }
+    # left out when there's nothing there, like in the format above
+    if template.bomb is not None:
+        data['bomb'] = {'position': list(template.bomb[0]), 'health': template.bomb[1]}
+    if template.repair_pad is not None:
+        data['repair_pad'] = list(template.repair_pad)
+    return data
+
+
+def load_puzzle(path: str) -> Puzzle:
+    """
+    Loads a puzzle file
+    :param path: path of the JSON file
+    :return: the Puzzle
+    """
+    with open(path) as file:
+        data = json.load(file)
+    return puzzle_from_dict(data, os.path.splitext(os.path.basename(path))[0])
+
+
+def save_puzzle(puzzle: Puzzle, path: str) -> None:
+    """
+    Saves a puzzle file
+    :param puzzle: the Puzzle
+    :param path: path of the JSON file
+    :return: None
+    """
+    with open(path, 'w') as file:
+        json.dump(puzzle_to_dict(puzzle), file, indent=1)
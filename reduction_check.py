@@ -0,0 +1,103 @@
+import random
+import sys
+import numpy as np
+from board import Board
+from entities import Bomb, Mech, Minion
+from engine import JointSearchResult, joint_engine
+from game_flow import load_command_line
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+# Checks that splitting the Mechs into independent groups (engine.independent_groups()) doesn't change what
+# joint_engine() finds: every board is searched with reduce=True and reduce=False, and the wins and the fewest
+# Minions left have to be the same. The boards have the Bomb on them, since the Bomb is shared by every Mech
+# and can stomp Minions nobody walks over.
+
+Cell = Tuple[int, int]
+card_choices: Tuple[str, ...] = ('Skewer1', 'Skewer2', 'Blaze1', 'Omnistomp1', 'Speed1', 'Scythe1', 'Flamespitter1')
+directions: Tuple[Cell, ...] = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+
+class CheckRow(NamedTuple):
+    name: str
+    groups: int  # groups the reduction found
+    reduced: Tuple[int, Optional[int]]  # (wins, best_minions) with reduce=True
+    full: Tuple[int, Optional[int]]  # (wins, best_minions) with reduce=False
+
+    @property
+    def ok(self) -> bool:
+        return self.reduced == self.full
+
+
+def make_board(shape: Cell, minions: Sequence[Cell], bomb: Optional[Cell],
+               mechs: Sequence[Tuple[Cell, Cell, List[str]]]) -> Board:
+    """
+    Sets up a board with Minions, the Bomb and some Mechs with their command lines
+    :param mechs: (position, orientation, command line) of every Mech, in hourglass order
+    """
+    board = Board(np.zeros(shape))
+    for square in minions:
+        Minion(board, np.array(square))
+    if bomb is not None:
+        Bomb(board, np.array(bomb), 3)
+    for i, (position, orientation, cmd_line) in enumerate(mechs):
+        mech = Mech(board, np.array(position), np.array(orientation), f'Mech {i}')
+        load_command_line(mech, cmd_line)
+    return board
+
+
+def random_board(rng: random.Random, size: int = 6, mech_count: int = 2) -> Board:
+    """A small board with a few Minions, the Bomb, and Mechs with short random command lines"""
+    squares: List[Cell] = [(x, y) for x in range(size) for y in range(size)]
+    rng.shuffle(squares)
+    minion_count: int = rng.randint(1, 4)
+    mechs = [(squares[1 + minion_count + i], rng.choice(directions), rng.sample(card_choices, 2))
+             for i in range(mech_count)]
+    return make_board((size, size), squares[1:1 + minion_count], squares[0], mechs)
+
+
+def compare(name: str, make: Callable[[], Board]) -> CheckRow:
+    """Searches the same board (made twice, since the Mechs' boards get used up) with and without the reduction"""
+    reduced: JointSearchResult = joint_engine(make(), reduce=True)
+    full: JointSearchResult = joint_engine(make(), reduce=False)
+    return CheckRow(name, len(reduced.groups), (reduced.wins, reduced.best_minions), (full.wins, full.best_minions))
+
+
+def run_check(random_boards: int = 30, seed: int = 0) -> List[CheckRow]:
+    """
+    Compares the reduction with the full search on a few hand-made boards and some random ones
+    :param random_boards: how many random boards to add
+    :param seed: seed of the random boards
+    :return: a CheckRow for every board
+    """
+    rows: List[CheckRow] = [
+        # Mech 0 pushes the Bomb onto the only Minion, Mech 1 is far away
+        compare('bomb push', lambda: make_board((8, 1), [(2, 0)], (1, 0),
+                                                [((0, 0), (1, 0), ['Skewer1']), ((7, 0), (-1, 0), ['Blaze1'])])),
+        # Mech 0 pushes Mech 1, which pushes the Bomb onto the Minion
+        compare('chain push', lambda: make_board((8, 1), [(3, 0)], (2, 0),
+                                                 [((0, 0), (1, 0), ['Skewer1']), ((1, 0), (1, 0), ['Scythe1'])])),
+        # two Mechs far apart, and the Bomb out of everybody's way
+        compare('bomb aside', lambda: make_board((8, 3), [(1, 0), (6, 2)], (4, 1),
+                                                 [((0, 0), (1, 0), ['Skewer1']), ((7, 2), (-1, 0), ['Skewer1'])])),
+    ]
+    rng = random.Random(seed)
+    for _ in range(random_boards):
+        board_seed: int = rng.randrange(2 ** 30)
+        rows.append(compare(f'random {board_seed}', lambda: random_board(random.Random(board_seed))))
+    return rows
+
+
+def check_table(rows: List[CheckRow]) -> str:
+    """Formats the rows as a table"""
+    lines = [f"{'board':>18}  {'groups':>6}  {'reduced':>10}  {'full':>10}  {'ok':>3}"]
+    for row in rows:
+        lines.append(f'{row.name:>18}  {row.groups:>6}  {str(row.reduced):>10}  {str(row.full):>10}  '
+                     f"{'yes' if row.ok else 'NO':>3}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    check_rows: List[CheckRow] = run_check()
+    print(check_table(check_rows))
+    # a non-zero exit status, so the check can be scripted
+    sys.exit(0 if all(row.ok for row in check_rows) else 1)
@@ -0,0 +1,135 @@
+import random
+import time
+import tracemalloc
+from itertools import permutations
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from basislists import generate
+from board_tables import BoardTables
+from engine import engine, SearchBudget, SearchResult
+from generator import GeneratorConfig, generate_corpus, one_at_a_time
+from puzzles import Puzzle
+from solve import make_mech
+
+# How the engine and basislists.generate() scale with the board size, the Minion and oil densities and the size
+# of the card pool, on a corpus of generated puzzles (see generator.py). Only one parameter is varied at a time,
+# so every table shows the effect of that parameter alone.
+# The engine is run on a fixed sample of every puzzle's (command line, orientation) jobs: a full sweep of a big pool
+# takes hours, and the time and memory per job are what this is after.
+
+
+class ScalingRow(NamedTuple):
+    parameter: str  # the parameter that was varied
+    value: float
+    puzzles: int
+    basis_lists: float  # average number of basis lists per puzzle
+    generate_ms: float  # average time of basislists.generate()
+    generate_kb: float  # average peak memory of basislists.generate()
+    jobs: int  # jobs searched, over all the puzzles
+    partial: int  # jobs that ran out of budget
+    job_ms: float  # average time per job
+    nodes_per_job: float
+    job_kb: float  # average peak memory per job
+
+
+def sample_jobs(puzzle: Puzzle, basis_lists: List[List[str]], max_jobs: int,
+                rng: random.Random) -> List[Tuple[Tuple[str, ...], Tuple[int, int]]]:
+    """A random sample of a puzzle's (command line, orientation) jobs, like solve.list_jobs() has them"""
+    orientation: Tuple[int, int] = puzzle.mech_poses[0][1]
+    # the same command line can come out of more than one basis list (like in solve.list_jobs())
+    cmd_lines = sorted({cmd_line for basis_list in basis_lists for cmd_line in permutations(basis_list)})
+    jobs = [(cmd_line, orientation) for cmd_line in cmd_lines]
+    return rng.sample(jobs, min(max_jobs, len(jobs)))
+
+
+def measure_puzzle(puzzle: Puzzle, max_jobs: int, budget: SearchBudget,
+                   rng: random.Random) -> Tuple[int, float, float, List[Tuple[SearchResult, float]]]:
+    """
+    Times (and measures the peak memory of) basislists.generate() and the engine on a sample of the jobs of a puzzle
+    :return: (basis lists, generate() seconds, generate() peak bytes, (SearchResult, peak bytes) of every job)
+    """
+    start_time = time.perf_counter()
+    basis_lists: List[List[str]] = generate(list(puzzle.cards), list(puzzle.decksizes))
+    generate_seconds: float = time.perf_counter() - start_time
+    tracemalloc.start()
+    generate(list(puzzle.cards), list(puzzle.decksizes))
+    generate_peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tables = BoardTables(puzzle.template.shape)
+    position = puzzle.mech_poses[0][0]
+    results: List[Tuple[SearchResult, float]] = []
+    for cmd_line, orientation in sample_jobs(puzzle, basis_lists, max_jobs, rng):
+        # timed without tracemalloc (which slows everything down), then run again for the memory
+        mech = make_mech(puzzle.template, tables, position, orientation, cmd_line)
+        search: SearchResult = engine(mech.board, mech, budget)
+        mech = make_mech(puzzle.template, tables, position, orientation, cmd_line)
+        tracemalloc.start()
+        engine(mech.board, mech, budget)
+        peak: int = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append((search, peak))
+    return len(basis_lists), generate_seconds, generate_peak, results
+
+
+def run_benchmark(base: GeneratorConfig = GeneratorConfig(), sizes: Sequence[int] = (5, 6, 8, 10, 14),
+                  minion_densities: Sequence[float] = (0.05, 0.15, 0.3), oil_densities: Sequence[float] = (0.0, 0.1, 0.3),
+                  pool_sizes: Sequence[int] = (5, 7, 9), per_config: int = 3, max_jobs: int = 8,
+                  budget: Optional[SearchBudget] = SearchBudget(max_nodes=200_000), seed: int = 0) -> List[ScalingRow]:
+    """
+    Runs the benchmark over a generated corpus
+    :param base: the config every parameter is varied from
+    :param sizes: board sizes to try
+    :param minion_densities: Minion densities to try
+    :param oil_densities: oil densities to try
+    :param pool_sizes: card pool sizes to try
+    :param per_config: puzzles per config
+    :param max_jobs: jobs searched per puzzle
+    :param budget: limits for every job
+    :param seed: seed of the corpus and of the job samples
+    :return: a ScalingRow for every value of every parameter
+    """
+    rng = random.Random(seed)
+    configs = one_at_a_time(base, sizes, minion_densities, oil_densities, pool_sizes)
+    corpus = generate_corpus([config for _, config in configs], per_config, seed)
+    rows: List[ScalingRow] = []
+    for config_index, (parameter, config) in enumerate(configs):
+        totals: Dict[str, float] = dict(basis_lists=0, generate_seconds=0.0, generate_peak=0, jobs=0, partial=0,
+                                        job_seconds=0.0, nodes=0, job_peak=0)
+        for _, puzzle in corpus[config_index * per_config:(config_index + 1) * per_config]:
+            basis_lists, generate_seconds, generate_peak, results = measure_puzzle(puzzle, max_jobs, budget, rng)
+            totals['basis_lists'] += basis_lists
+            totals['generate_seconds'] += generate_seconds
+            totals['generate_peak'] += generate_peak
+            for search, peak in results:
+                totals['jobs'] += 1
+                totals['partial'] += search.status == 'partial'
+                totals['job_seconds'] += search.seconds
+                totals['nodes'] += search.nodes
+                totals['job_peak'] += peak
+        jobs: int = max(int(totals['jobs']), 1)
+        rows.append(ScalingRow(parameter, getattr(config, parameter), per_config, totals['basis_lists'] / per_config,
+                               totals['generate_seconds'] / per_config * 1000,
+                               totals['generate_peak'] / per_config / 1024, int(totals['jobs']),
+                               int(totals['partial']), totals['job_seconds'] / jobs * 1000, totals['nodes'] / jobs,
+                               totals['job_peak'] / jobs / 1024))
+    return rows
+
+
+def benchmark_table(rows: List[ScalingRow]) -> str:
+    """Formats the rows as one table per parameter"""
+    lines: List[str] = []
+    for parameter in dict.fromkeys(row.parameter for row in rows):
+        if lines:
+            lines.append('')
+        lines.append(f"{parameter:>14}  {'basis':>6}  {'gen ms':>8}  {'gen KB':>8}  {'jobs':>5}  {'partial':>7}  "
+                     f"{'ms/job':>8}  {'nodes/job':>10}  {'KB/job':>8}")
+        for row in rows:
+            if row.parameter == parameter:
+                lines.append(f'{row.value:>14g}  {row.basis_lists:>6.0f}  {row.generate_ms:>8.1f}  '
+                             f'{row.generate_kb:>8.1f}  {row.jobs:>5}  {row.partial:>7}  {row.job_ms:>8.1f}  '
+                             f'{row.nodes_per_job:>10.0f}  {row.job_kb:>8.1f}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    print(benchmark_table(run_benchmark()))
@@ -0,0 +1,168 @@
+import json
+import os
+import time
+from math import prod
+from typing import Any, Callable, Dict, Hashable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from game_flow import parse_card
+
+# Schedules the jobs of a sweep over a pool of worker processes.
+# The search cost of a command line depends a lot on what's in it (a line full of Chain Lightning and
+# Hexmatic Aimbot takes way longer than a line of Skewers and Fuel Tanks), so if the jobs are just chopped into
+# equal chunks, some workers finish early and sit around while the others grind through the expensive lines.
+# Instead, every job's cost is estimated up front, the most expensive jobs are handed out first
+# (longest-processing-time first), and every worker grabs a new job as soon as it's done with the last one.
+
+# Roughly how many options each card creates per level (for cards that weren't measured on the actual board).
+# Movement cards only branch on towing, and the scanning cards depend on how many Minions are around.
+default_branching: Dict[str, Tuple[float, float, float]] = {
+    'Scythe': (6.0, 9.0, 12.0), 'Skewer': (1.0, 1.5, 2.0), 'Ripsaw': (1.0, 1.0, 1.0),
+    'Fuel Tank': (2.0, 3.0, 4.0), 'Blaze': (1.0, 1.5, 2.0), 'Flamespitter': (1.0, 1.0, 1.0),
+    'Cyclotron': (2.0, 3.0, 4.0), 'Speed': (2.0, 3.0, 4.0), 'Chain Lightning': (3.0, 6.0, 9.0),
+    'Memory Core': (2.0, 3.0, 4.0), 'Omnistomp': (3.0, 3.0, 3.0), 'Hexmatic Aimbot': (4.0, 4.0, 4.0),
+    'Short Circuit': (1.0, 1.0, 1.0), 'Stuck Left': (1.0, 1.0, 1.0), 'Stuck Right': (1.0, 1.0, 1.0),
+    'Stuck Forward': (1.5, 1.5, 1.5),
+    'Empty': (1.0, 1.0, 1.0)
+}
+
+Job = Tuple[Tuple[str, ...], Hashable]  # (command line as card strings, anything else -- e.g. the orientation)
+
+
+class CardTimings:
+    def __init__(self, path: Optional[str] = None, branching: Optional[Dict[Tuple[str, int], float]] = None) -> None:
+        """
+        Per-card timing factors (seconds per unit of branching), learned from past sweeps.
+        :param path: JSON file the timings are loaded from and saved to. If None, nothing is persisted
+        :param branching: (card, level) -> the number of options the card actually asks for on the board of the sweep
+        (see solve.measure_branching()). Cards that aren't in it fall back to default_branching
+        """
+        self.path: Optional[str] = path
+        self.branching_by_card: Dict[Tuple[str, int], float] = dict(branching) if branching is not None else {}
+        # card -> (average seconds per unit of branching, number of samples)
+        self.factors: Dict[str, Tuple[float, int]] = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                self.factors = {card: (factor, samples) for card, (factor, samples) in json.load(file).items()}
+
+    def factor(self, card: str) -> float:
+        """The timing factor of a card; cards that were never timed get the average of all the others"""
+        if card in self.factors:
+            return self.factors[card][0]
+        if self.factors:
+            return sum(factor for factor, _ in self.factors.values()) / len(self.factors)
+        return 1.0
+
+    def branching(self, cmd_line: Sequence[str]) -> float:
+        """The product of the branching of every card in a command line"""
+        cards: List[Tuple[str, int]] = [parse_card(card) for card in cmd_line]
+        return prod(self.branching_by_card.get((card, level), default_branching[card][level - 1])
+                    for card, level in cards)
+
+    def estimate(self, cmd_line: Sequence[str]) -> float:
+        """
+        Estimates the cost of searching a command line
+        :param cmd_line: the command line as card strings
+        :return: the product of the cards' branching, times the average timing factor of the cards
+        """
+        cards: List[str] = [parse_card(card)[0] for card in cmd_line]
+        return self.branching(cmd_line) * sum(self.factor(card) for card in cards) / max(len(cards), 1)
+
+    def record(self, cmd_line: Sequence[str], seconds: float) -> None:
+        """Updates the timing factors of every card in a command line with how long it actually took"""
+        cards: List[str] = [parse_card(card)[0] for card in cmd_line]
+        if not cards:
+            return
+        observed: float = seconds / self.branching(cmd_line)
+        # the estimate is the branching times the average factor, so the observed time is split up between the cards
+        # in proportion to their current factors (the average of the shares is the observed factor again).
+        # Giving every card the same share would pull the expensive and the cheap cards towards the same number
+        current: List[float] = [self.factor(card) for card in cards]
+        total: float = sum(current)
+        for card, factor_now in zip(cards, current):
+            share: float = observed * len(cards) * factor_now / total if total > 0 else observed
+            factor, samples = self.factors.get(card, (0.0, 0))
+            self.factors[card] = ((factor * samples + share) / (samples + 1), samples + 1)
+
+    def save(self) -> None:
+        """Writes the timing factors back to the JSON file (if there is one)"""
+        if self.path is not None:
+            with open(self.path, 'w') as file:
+                json.dump(self.factors, file, indent=1)
+
+
+class JobTiming(NamedTuple):
+    job: Job
+    result: Any
+    seconds: float
+    worker: int  # pid of the worker process
+
+
+class ScheduleReport(NamedTuple):
+    jobs: int
+    workers: int
+    makespan: float  # wall time from the first job being handed out to the last one finishing
+    busy_time: float  # the sum of the job times
+    ideal: float  # the best possible makespan: the larger of (busy time / workers) and the longest job
+
+    def __str__(self) -> str:
+        efficiency = self.ideal / self.makespan if self.makespan else 1.0
+        return (f'{self.jobs} jobs on {self.workers} workers: makespan {self.makespan:.2f}s, '
+                f'ideal {self.ideal:.2f}s ({efficiency:.0%} of ideal)')
+
+
+def _timed_call(arguments: Tuple[Callable[[Job], Any], Job]) -> JobTiming:
+    """Runs a single job inside a worker and times it"""
+    job_function, job = arguments
+    start_time = time.perf_counter()
+    result = job_function(job)
+    return JobTiming(job, result, time.perf_counter() - start_time, os.getpid())
+
+
+class JobScheduler:
+    def __init__(self, job_function: Callable[[Job], Any], workers: int = os.cpu_count() or 1,
+                 timings: Optional[CardTimings] = None, initializer: Optional[Callable[..., None]] = None,
+                 initargs: tuple = ()) -> None:
+        """
+        Runs the jobs of a sweep on a pool of workers, most expensive first
+        :param job_function: a top-level function (so it can be pickled) that runs one job
+        :param workers: number of worker processes
+        :param timings: the CardTimings used to estimate the cost of each job (and which learn from the actual costs)
+        :param initializer: runs once in every worker before any jobs (e.g. to hand out the board)
+        :param initargs: arguments for the initializer
+        """
+        self.job_function: Callable[[Job], Any] = job_function
+        self.workers: int = workers
+        self.timings: CardTimings = timings if timings is not None else CardTimings()
+        self.initializer: Optional[Callable[..., None]] = initializer
+        self.initargs: tuple = initargs
+        # filled in once a run is finished
+        self.report: Optional[ScheduleReport] = None
+
+    def order(self, jobs: Sequence[Job]) -> List[Job]:
+        """Sorts the jobs from most to least expensive (longest-processing-time first)"""
+        return sorted(jobs, key=lambda job: self.timings.estimate(job[0]), reverse=True)
+
+    def run(self, jobs: Sequence[Job]) -> Iterator[JobTiming]:
+        """
+        Runs the jobs and yields them as they finish. Afterward, self.report holds the ScheduleReport
+        :param jobs: (command line, anything else) pairs
+        :return: yields a JobTiming for every job
+        """
+        # imported here, so that processes that never start a pool (and the workers themselves) don't pay for it
+        from multiprocessing import Pool
+
+        ordered_jobs: List[Job] = self.order(jobs)
+        busy_time: float = 0.0
+        longest: float = 0.0
+        start_time = time.perf_counter()
+        with Pool(self.workers, self.initializer, self.initargs) as pool:
+            # chunksize=1 means every worker takes the next job off the queue as soon as it's free
+            arguments = [(self.job_function, job) for job in ordered_jobs]
+            for job_timing in pool.imap_unordered(_timed_call, arguments, 1):
+                busy_time += job_timing.seconds
+                longest = max(longest, job_timing.seconds)
+                self.timings.record(job_timing.job[0], job_timing.seconds)
+                yield job_timing
+        self.timings.save()
+        makespan: float = time.perf_counter() - start_time
+        self.report = ScheduleReport(len(ordered_jobs), self.workers, makespan, busy_time,
+                                     max(busy_time / self.workers, longest))
@@ -0,0 +1,392 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Deque, Dict, Hashable, List, Optional, Set, Tuple
+from board import BoardTemplate
+from board_tables import BoardTables
+from engine import engine, SearchBudget, SearchResult
+from puzzles import Puzzle, puzzle_from_dict
+from solve import list_jobs, make_mech, SolveCache, SolveOptions
+
+# A local solve service, so that several tools can share one pool of worker processes instead of each of them
+# starting a sweep of its own. Clients connect over a Unix socket (or a localhost port) and talk newline-delimited
+# JSON, one message per line:
+#
+#     -> {"type": "solve", "id": "a", "puzzle": {...}, "max_nodes": 100000, "max_seconds": 10}
+#     <- {"type": "accepted", "id": "a", "jobs": 96}
+#     <- {"type": "solution", "id": "a", "cmd_line": [...], "orientation": [1, 0], "position": [2, 3], "wins": 4, ...}
+#     <- {"type": "done", "id": "a", "jobs": 96, "searched": 96, "wins": 17, "cancelled": false}
+#     -> {"type": "cancel", "id": "a"}
+#     <- {"type": "error", "id": "a", "message": "..."}   (a malformed message, an unknown id, or a failed request)
+#
+# The puzzle is in the format of puzzles.py. Every (Mech pose, command line, orientation) of a puzzle is a job of its
+# own, and the jobs of all the clients wait in one queue per client, which are taken from in turn (so a client that
+# sends a huge sweep doesn't hold up everyone else), with a limit on how many jobs of a single client run at once.
+# Only as many jobs as there are workers are handed to the pool, so that cancelling a request just drops its jobs
+# from the queue. Identical jobs (same board, Mech, command line and budget) that are queued or running at the same
+# time are only searched once, and the result goes to everyone who asked for it.
+
+Cell = Tuple[int, int]
+# (board, Mech position, orientation, command line, budget): everything a worker needs to search one job
+JobSpec = Tuple[BoardTemplate, Cell, Cell, Tuple[str, ...], Optional[SearchBudget]]
+
+# lookup tables of a worker process, per board size
+worker_tables: Dict[Tuple[int, int], BoardTables] = {}
+
+
+def list_puzzle_jobs(puzzle: Puzzle, budget: Optional[SearchBudget]) -> List[JobSpec]:
+    """Lists the jobs of a puzzle (runs in a worker, since the prefilter makes a board for every command line)"""
+    cache = SolveCache()
+    tables: BoardTables = cache.tables(puzzle.template.shape)
+    specs: List[JobSpec] = []
+    for mech_pose in puzzle.mech_poses:
+        position: Cell = (int(mech_pose[0][0]), int(mech_pose[0][1]))
+        for cmd_line, orientation in list_jobs(puzzle.template, tables, mech_pose, puzzle.cards, puzzle.decksizes,
+                                               SolveOptions(), cache):
+            specs.append((puzzle.template, position, orientation, tuple(cmd_line), budget))
+    return specs
+
+
+def run_job(spec: JobSpec) -> dict:
+    """Searches a single job with engine.engine() (runs in a worker)"""
+    template, position, orientation, cmd_line, budget = spec
+    if template.shape not in worker_tables:
+        worker_tables[template.shape] = BoardTables(template.shape)
+    mech = make_mech(template, worker_tables[template.shape], position, orientation, cmd_line)
+    search: SearchResult = engine(mech.board, mech, budget)
+    return {'position': list(position), 'orientation': list(orientation), 'cmd_line': list(cmd_line),
+            'status': search.status, 'wins': search.wins, 'nodes': search.nodes,
+            'best_minions': search.best_minions, 'seconds': search.seconds}
+
+
+def job_key(spec: JobSpec) -> Hashable:
+    """Two jobs with the same key would search exactly the same thing"""
+    template, position, orientation, cmd_line, budget = spec
+    return (template.shape, tuple(sorted(template.minions)), template.oil.tobytes(), tuple(sorted(template.walls)),
+            template.bomb, template.repair_pad, position, orientation, cmd_line, budget)
+
+
+class SolveRequest:
+    def __init__(self, client: 'ClientState', request_id: str) -> None:
+        """A solve message of a client, and how far along its jobs are"""
+        self.client: ClientState = client
+        self.id: str = request_id
+        self.jobs: int = 0
+        self.searched: int = 0
+        self.wins: int = 0
+        self.cancelled: bool = False
+        self.finished: bool = False
+
+
+class ClientState:
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        """A connected client: where its messages go, its queue of jobs, and how many of them are running"""
+        self.writer: asyncio.StreamWriter = writer
+        self.queue: Deque[Tuple[SolveRequest, JobSpec]] = deque()
+        self.running: int = 0
+        self.requests: Dict[str, SolveRequest] = {}
+        self.connected: bool = True
+
+
+class RunningJob:
+    def __init__(self, spec: JobSpec, owner: ClientState) -> None:
+        """A job that's queued in the pool or being searched, with every request waiting for its result"""
+        self.spec: JobSpec = spec
+        self.owner: ClientState = owner  # the client whose concurrency slot it takes up
+        self.waiting: List[SolveRequest] = []
+
+
+class SolveService:
+    def __init__(self, workers: int = os.cpu_count() or 1, per_client_limit: Optional[int] = None,
+                 default_budget: Optional[SearchBudget] = None) -> None:
+        """
+        :param workers: number of worker processes (shared by every client)
+        :param per_client_limit: the most jobs of a single client that can run at once (None for workers)
+        :param default_budget: limits for every job whose request doesn't set any
+        """
+        self.workers: int = workers
+        self.per_client_limit: int = per_client_limit if per_client_limit is not None else workers
+        self.default_budget: Optional[SearchBudget] = default_budget
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        # the clients with jobs in their queues, in the order they get their next turn
+        self.turns: Deque[ClientState] = deque()
+        self.running: Dict[Hashable, RunningJob] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        # the connected clients, with the tasks that read their messages
+        self.clients: Dict[ClientState, asyncio.Task] = {}
+        # jobs that were searched, and jobs whose result went to another request as well (for the stats)
+        self.searched: int = 0
+        self.deduplicated: int = 0
+
+    # -- starting and stopping --
+
+    async def start(self, socket_path: Optional[str] = None, host: str = '127.0.0.1', port: int = 0) -> None:
+        """
+        Starts listening, on a Unix socket if there's a path, on a localhost port otherwise
+        :param socket_path: path of the Unix socket
+        :param host: the interface to listen on (keep it local, there's no authentication)
+        :param port: the port (0 picks a free one, see self.address)
+        :return: None
+        """
+        # forked workers would inherit the sockets of the clients connected at the time, which then never close
+        start_method: str = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context(start_method))
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.server = await asyncio.start_unix_server(self.handle_client, socket_path)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, host, port)
+
+    @property
+    def address(self):
+        """The socket path, or the (host, port) the service listens on"""
+        return self.server.sockets[0].getsockname()
+
+    async def close(self) -> None:
+        """Stops listening and shuts the pool down (jobs that are still running are dropped)"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        # hanging up on the clients lets their tasks finish on their own
+        for client in self.clients:
+            client.writer.close()
+        if self.clients:
+            await asyncio.wait(list(self.clients.values()))
+        for task in list(self.tasks):
+            task.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # -- talking to the clients --
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = ClientState(writer)
+        self.clients[client] = asyncio.current_task()
+        try:
+            while True:
+                line: bytes = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    await self.send(client, {'type': 'error', 'message': 'not a JSON line'})
+                    continue
+                if not isinstance(message, dict):
+                    await self.send(client, {'type': 'error', 'message': 'a message has to be a JSON object'})
+                    continue
+                if message.get('type') == 'solve':
+                    await self.handle_solve(client, message)
+                elif message.get('type') == 'cancel':
+                    request: Optional[SolveRequest] = client.requests.get(str(message.get('id')))
+                    if request is not None:
+                        self.cancel(request)
+                        await self.finish(request)
+                    else:
+                        await self.send(client, {'type': 'error', 'id': message.get('id'),
+                                                 'message': 'no request with this id is running'})
+                else:
+                    await self.send(client, {'type': 'error', 'id': message.get('id'),
+                                             'message': f'unknown message type {message.get("type")!r}'})
+        except ConnectionError:
+            pass
+        finally:
+            # whatever the client was waiting for isn't needed any more
+            client.connected = False
+            for request in list(client.requests.values()):
+                self.cancel(request)
+            writer.close()
+            del self.clients[client]
+
+    async def send(self, client: ClientState, message: dict) -> None:
+        if not client.connected:
+            return
+        try:
+            client.writer.write((json.dumps(message) + '\n').encode())
+            await client.writer.drain()
+        except ConnectionError:
+            client.connected = False
+
+    async def handle_solve(self, client: ClientState, message: dict) -> None:
+        request_id = str(message.get('id'))
+        if request_id in client.requests:
+            await self.send(client, {'type': 'error', 'id': request_id, 'message': 'this id is already in use'})
+            return
+        try:
+            puzzle: Puzzle = puzzle_from_dict(message['puzzle'])
+        except Exception as error:
+            # anything malformed fails somewhere in there (a missing key, a size with one number, ...)
+            await self.send(client, {'type': 'error', 'id': request_id, 'message': f'bad puzzle: {error!r}'})
+            return
+        budget: Optional[SearchBudget] = self.default_budget
+        if message.get('max_nodes') is not None or message.get('max_seconds') is not None:
+            budget = SearchBudget(message.get('max_nodes'), message.get('max_seconds'))
+
+        request = SolveRequest(client, request_id)
+        client.requests[request_id] = request
+        # listing the jobs takes a while, and the client's messages (a cancel for this request, say) keep being read
+        task: asyncio.Task = asyncio.create_task(self.queue_jobs(request, puzzle, budget))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def queue_jobs(self, request: SolveRequest, puzzle: Puzzle, budget: Optional[SearchBudget]) -> None:
+        """Lists the jobs of a request in the pool, and puts them in its client's queue"""
+        client: ClientState = request.client
+        try:
+            specs: List[JobSpec] = await asyncio.get_running_loop().run_in_executor(
+                self.executor, list_puzzle_jobs, puzzle, budget)
+        except Exception as exception:
+            # e.g. a BrokenProcessPool, or the puzzle crashing the prefilter: the request ends here
+            if not request.cancelled:
+                request.finished = True
+                client.requests.pop(request.id, None)
+                await self.send(client, {'type': 'error', 'id': request.id,
+                                         'message': f'could not list the jobs: {exception!r}'})
+            return
+        if request.cancelled:
+            return
+        request.jobs = len(specs)
+        await self.send(client, {'type': 'accepted', 'id': request.id, 'jobs': len(specs)})
+        if not specs:
+            await self.finish(request)
+            return
+        if not client.queue:
+            self.turns.append(client)
+        client.queue.extend((request, spec) for spec in specs)
+        self.dispatch()
+
+    def cancel(self, request: SolveRequest) -> None:
+        """Drops the queued jobs of a request, and stops waiting for its running ones"""
+        request.cancelled = True
+        client: ClientState = request.client
+        client.queue = deque(entry for entry in client.queue if entry[0] is not request)
+        if not client.queue and client in self.turns:
+            self.turns.remove(client)
+        for running_job in self.running.values():
+            if request in running_job.waiting:
+                running_job.waiting.remove(request)
+
+    async def finish(self, request: SolveRequest) -> None:
+        """Tells the client a request is done (once)"""
+        if request.finished:
+            return
+        request.finished = True
+        request.client.requests.pop(request.id, None)
+        await self.send(request.client, {'type': 'done', 'id': request.id, 'jobs': request.jobs,
+                                         'searched': request.searched, 'wins': request.wins,
+                                         'cancelled': request.cancelled})
+
+    # -- scheduling --
+
+    def dispatch(self) -> None:
+        """Hands jobs to the pool while it has free workers, taking one from every client's queue in turn"""
+        skipped: int = 0
+        while self.turns and len(self.running) < self.workers and skipped < len(self.turns):
+            client: ClientState = self.turns.popleft()
+            if client.running >= self.per_client_limit:
+                # at its limit, so it sits this turn out
+                self.turns.append(client)
+                skipped += 1
+                continue
+            skipped = 0
+            request, spec = client.queue.popleft()
+            if client.queue:
+                self.turns.append(client)
+            key: Hashable = job_key(spec)
+            if key in self.running:
+                # someone's already searching exactly this
+                self.running[key].waiting.append(request)
+                self.deduplicated += 1
+                continue
+            running_job = RunningJob(spec, client)
+            running_job.waiting.append(request)
+            self.running[key] = running_job
+            client.running += 1
+            task: asyncio.Task = asyncio.create_task(self.run(key, running_job))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def run(self, key: Hashable, running_job: RunningJob) -> None:
+        error: Optional[str] = None
+        try:
+            result: dict = await asyncio.get_running_loop().run_in_executor(self.executor, run_job, running_job.spec)
+        except Exception as exception:
+            # a job that crashed still counts as searched, so that its requests get to finish
+            error, result = repr(exception), {'wins': 0}
+        finally:
+            del self.running[key]
+            running_job.owner.running -= 1
+        self.searched += 1
+        self.dispatch()
+        for request in running_job.waiting:
+            request.searched += 1
+            request.wins += result['wins']
+            if error is not None:
+                await self.send(request.client, {'type': 'error', 'id': request.id, 'message': error,
+                                                 'cmd_line': list(running_job.spec[3])})
+            elif result['wins'] > 0:
+                await self.send(request.client, {'type': 'solution', 'id': request.id, **result})
+            if request.searched == request.jobs:
+                await self.finish(request)
+
+
+async def request_solve(puzzle: dict, request_id: str = 'solve', socket_path: Optional[str] = None,
+                        host: str = '127.0.0.1', port: Optional[int] = None,
+                        budget: Optional[SearchBudget] = None) -> AsyncIterator[dict]:
+    """
+    Sends a puzzle to a running service and yields its messages (accepted, solutions, done) as they come in
+    :param puzzle: the puzzle, in the format of puzzles.py
+    :param request_id: the id of the request
+    :param socket_path: the service's Unix socket (or None to use host and port)
+    :param host: the service's host
+    :param port: the service's port
+    :param budget: limits for every job (max_nodes and max_seconds are used)
+    :return: yields the messages as dictionaries, up to and including 'done' (or an error about the request itself)
+    """
+    if socket_path is not None:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    message: dict = {'type': 'solve', 'id': request_id, 'puzzle': puzzle}
+    if budget is not None:
+        message.update(max_nodes=budget.max_nodes, max_seconds=budget.max_seconds)
+    try:
+        writer.write((json.dumps(message) + '\n').encode())
+        await writer.drain()
+        while True:
+            line: bytes = await reader.readline()
+            if not line:
+                return
+            reply = json.loads(line)
+            yield reply
+            if reply['type'] == 'done' or (reply['type'] == 'error' and 'cmd_line' not in reply):
+                return
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: Optional[str], port: int, workers: int, per_client_limit: Optional[int]) -> None:
+    service = SolveService(workers, per_client_limit)
+    await service.start(socket_path, port=port)
+    print(f'listening on {service.address}')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the local solve service')
+    parser.add_argument('--socket', default=None, help='path of the Unix socket (a localhost port is used if left out)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--per-client-limit', type=int, default=None)
+    arguments = parser.parse_args()
+    asyncio.run(serve(arguments.socket, arguments.port, arguments.workers, arguments.per_client_limit))
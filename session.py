@@ -0,0 +1,236 @@
+import threading
+from copy import deepcopy
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+from auxiliary_functions import ChancePrompt, Prompt
+from board import Board
+from engine import state_key, win_check
+from entities import Mech
+
+# Lets a person play a command line one Prompt at a time (e.g. from a GUI), like the header of engine.py has in mind:
+# the session shows the top Prompt of the Mech's stack, applies whatever option the player picks, and can undo.
+# While the player is thinking, a background thread counts the winning continuations below every option.
+# Every state it finishes is remembered (keyed by engine.state_key()), so once a subtree has been counted,
+# the hints for every state in it are a dictionary lookup away, no matter which way the player goes or undoes.
+
+
+class OptionHint(NamedTuple):
+    option: int
+    wins: Optional[int]  # the number of winning continuations after picking this option (None if not counted yet)
+    probability: Optional[float] = None  # the chance of the option, for a ChancePrompt (e.g. a damage draw)
+
+
+def hint_text(hint: OptionHint) -> str:
+    """Describes a hint for the player"""
+    if hint.wins is None:
+        return f'option {hint.option}: still thinking'
+    if hint.wins == 0:
+        return f'option {hint.option} can no longer win'
+    return f'option {hint.option} still wins ({hint.wins} winning continuation{"s" if hint.wins != 1 else ""})'
+
+
+class _Superseded(Exception):
+    """Raised inside the hint thread when the player has moved on from the state it's counting"""
+
+
+class PlaySession:
+    def __init__(self, mech: Mech, hints: bool = True) -> None:
+        """
+        Starts a session: reads the Mech's command line and waits for the player's first choice
+        :param mech: the Mech (on its board) whose command line is played
+        :param hints: if True, a background thread counts the winning continuations of every option
+        """
+        self.mech: Mech = mech
+        self.history: List[Mech] = []  # a copy of the Mech before every choice, for undo()
+        self.choices: List[int] = []
+        self.mech.read_command_line()
+        self._skip_empty_prompts()
+
+        # the hint thread's memory: state key -> (winning continuations, winning continuations of every option)
+        self._counted: Dict[Hashable, Tuple[int, Tuple[int, ...]]] = {}
+        # the objects whose ids are part of the stored keys (see engine.freeze()). Only keys that get stored in
+        # self._counted add to it, lookups use a list of their own that's thrown away afterwards
+        self._keep_alive: List = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._generation: int = 0
+        self._pending: Optional[Tuple[int, Mech]] = None
+        self._closed: bool = False
+        self._thread: Optional[threading.Thread] = None
+        if hints:
+            self._thread = threading.Thread(target=self._hint_loop, daemon=True)
+            self._thread.start()
+            self._request_hints()
+
+    # -- playing --
+
+    @property
+    def board(self) -> Board:
+        return self.mech.board
+
+    def current_prompt(self) -> Optional[Prompt]:
+        """The Prompt waiting for a choice, or None if the command line is done"""
+        return self.mech.prompt_stack[-1] if self.mech.prompt_stack else None
+
+    def describe_prompt(self) -> str:
+        """A short description of the current Prompt, for the player"""
+        prompt: Optional[Prompt] = self.current_prompt()
+        if prompt is None:
+            return 'the puzzle is solved' if self.won() else 'the command line is done'
+        if isinstance(prompt, ChancePrompt):
+            return f'damage draw ({prompt.num_options} outcomes)'
+        if prompt.card is not None:
+            level: int = self.mech.command_line[prompt.slot - 1][1]
+            return f'{prompt.card} {level} (slot {prompt.slot}): {prompt.num_options} options'
+        return f'{prompt.num_options} options'
+
+    def finished(self) -> bool:
+        return not self.mech.prompt_stack
+
+    def won(self) -> bool:
+        return win_check(self.board)
+
+    def choose(self, option: int) -> None:
+        """
+        Applies the player's choice to the current Prompt
+        :param option: int from 0 to num_options - 1
+        :return: None
+        """
+        prompt: Optional[Prompt] = self.current_prompt()
+        if prompt is None:
+            raise ValueError('there is no prompt left to choose for')
+        if not 0 <= option < prompt.num_options:
+            raise ValueError(f'option {option} is out of range (the prompt has {prompt.num_options} options)')
+        self.history.append(deepcopy(self.mech))
+        self.mech.prompt_stack.pop()
+        prompt.executable(self.mech, option)
+        self.choices.append(option)
+        self._skip_empty_prompts()
+        self._request_hints()
+
+    def undo(self) -> bool:
+        """
+        Takes back the last choice
+        :return: False if there was nothing to undo
+        """
+        if not self.history:
+            return False
+        self.mech = self.history.pop()
+        self.choices.pop()
+        self._request_hints()
+        return True
+
+    def _skip_empty_prompts(self) -> None:
+        # a prompt with no options (e.g. Hexmatic Aimbot without any targets) does nothing, so there's nothing to ask
+        while self.mech.prompt_stack and self.mech.prompt_stack[-1].num_options == 0:
+            self.mech.prompt_stack.pop()
+
+    # -- hints --
+
+    def hints(self) -> List[OptionHint]:
+        """
+        The hints for the current Prompt (a lookup, it never waits for the hint thread)
+        :return: an OptionHint for every option (empty if there's no prompt left)
+        """
+        prompt: Optional[Prompt] = self.current_prompt()
+        if prompt is None:
+            return []
+        # the objects only have to outlive the lookup, since the key isn't stored
+        lookup_alive: List = []
+        with self._lock:
+            counted = self._counted.get(state_key(self.mech, lookup_alive))
+        probabilities: Optional[List[float]] = prompt.probabilities if isinstance(prompt, ChancePrompt) else None
+        return [OptionHint(i, counted[1][i] if counted is not None else None,
+                           probabilities[i] if probabilities is not None else None)
+                for i in range(prompt.num_options)]
+
+    def wait_for_hints(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the hints of the current state are all counted
+        :param timeout: seconds to wait at most (None waits forever)
+        :return: True if they're ready
+        """
+        return self._thread is not None and self._ready.wait(timeout)
+
+    def close(self) -> None:
+        """Stops the hint thread"""
+        self._closed = True
+        self._generation += 1
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'PlaySession':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _request_hints(self) -> None:
+        """Points the hint thread at the current state"""
+        if self._thread is None:
+            return
+        # the thread gets its own copy, so the player can keep going while it's counting
+        mech_copy: Mech = deepcopy(self.mech)
+        with self._lock:
+            self._ready.clear()
+            self._generation += 1
+            self._pending = (self._generation, mech_copy)
+        self._wake.set()
+
+    def _hint_loop(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            with self._lock:
+                pending, self._pending = self._pending, None
+            if pending is None:
+                continue
+            generation, mech = pending
+            try:
+                self._count(mech, generation)
+            except _Superseded:
+                continue
+            with self._lock:
+                if generation == self._generation:
+                    self._ready.set()
+
+    def _count(self, mech: Mech, generation: int) -> int:
+        """
+        Counts the winning continuations of a state (the Mech is used up), remembering every state below it
+        :return: the number of winning lines
+        """
+        if generation != self._generation:
+            # only finished states are remembered, so nothing counted so far goes to waste
+            raise _Superseded
+        # kept alive by this call until the key is stored (the Mech gets used up below)
+        key_alive: List = []
+        with self._lock:
+            key = state_key(mech, key_alive)
+            counted = self._counted.get(key)
+        if counted is not None:
+            return counted[0]
+
+        options: Tuple[int, ...] = ()
+        if not mech.prompt_stack:
+            wins: int = int(win_check(mech.board))
+        else:
+            top_prompt: Prompt = mech.prompt_stack.pop()
+            if top_prompt.num_options == 0:
+                wins = self._count(mech, generation)
+            else:
+                # like in engine.depth_first(), the Mech itself is used up by option 0 and the others get copies
+                later: List[int] = []
+                for i in range(1, top_prompt.num_options):
+                    copy_mech: Mech = deepcopy(mech)
+                    top_prompt.executable(copy_mech, i)
+                    later.append(self._count(copy_mech, generation))
+                top_prompt.executable(mech, 0)
+                options = (self._count(mech, generation), *later)
+                wins = sum(options)
+        with self._lock:
+            self._counted[key] = (wins, options)
+            self._keep_alive.extend(key_alive)
+        return wins
@@ -0,0 +1,246 @@
+import os
+from contextlib import nullcontext
+from functools import partial
+import numpy as np
+from itertools import permutations
+from typing import Callable, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+from board import BoardTemplate, record_reads
+from board_tables import BoardTables
+from basislists import generate
+from branch_counts import collapsed_branches
+from entities import Mech
+from engine import (engine, count_engine, optimize, win_check, CountResult, OptimizeResult, ScoredLine, SearchBudget,
+                    SearchResult)
+from feasibility import is_feasible
+from game_flow import count_minions, load_command_line, parse_card
+from objectives import Objective
+from scheduler import CardTimings, JobScheduler, ScheduleReport
+
+# The library entry point: solve a puzzle for a card pool without going through main.py.
+# Anything that only depends on the board (the lookup tables) or on the card pool (the basis lists)
+# is kept in a SolveCache, so solving many hands against the same board only pays for the set-up once.
+
+Cell = Tuple[int, int]
+
+direction_names: Dict[Cell, str] = {(1, 0): 'Right', (0, 1): 'Up', (-1, 0): 'Left', (0, -1): 'Down'}
+
+
+class SolveOptions(NamedTuple):
+    budget: Optional[SearchBudget] = None  # limits for every single job
+    prefilter: bool = True  # skip command lines that can't possibly clear the board (see feasibility.py)
+    workers: int = 1  # 1 means everything runs in this process
+    timings_path: Optional[str] = None  # where the scheduler keeps its per-card timings (only used with workers > 1)
+    # if set, every job looks for its best lines by this objective (see engine.optimize()) instead of counting wins,
+    # and the prefilter is skipped (it only knows about clearing the board)
+    objective: Optional[Objective] = None
+    top_k: int = 1
+    # if True, every result says which squares its search looked at (see board.record_reads() and incremental.py)
+    record_reads: bool = False
+    # if True, the lines of every job are counted (see engine.count_engine()) instead of searched one by one.
+    # There's no best_mech then, and the objective is ignored
+    count_only: bool = False
+
+
+class SolveResult(NamedTuple):
+    cmd_line: Tuple[str, ...]
+    orientation: Cell
+    search: SearchResult
+    worker: int  # pid of the process that ran the job
+    lines: Optional[List[ScoredLine]] = None  # the best lines, if there was an objective
+    read_set: Optional[FrozenSet[Cell]] = None  # the squares the search looked at, if SolveOptions.record_reads
+    counts: Optional[CountResult] = None  # the path and final state counts, if SolveOptions.count_only
+
+
+class SolveCache:
+    def __init__(self, table_directory: Optional[str] = None) -> None:
+        """
+        Keeps precomputed data alive between calls to solve()
+        :param table_directory: if given, the lookup tables are kept on disk there (see BoardTables.load()),
+        so the next process doesn't have to build them again
+        """
+        self.table_directory: Optional[str] = table_directory
+        self.tables_by_shape: Dict[Tuple[int, int], BoardTables] = {}
+        self.basis_lists_by_pool: Dict[Tuple[Tuple[str, ...], Tuple[int, ...]], List[List[str]]] = {}
+        # the number of jobs of the last solve (known as soon as it yields its first result)
+        self.last_job_count: int = 0
+        # the ScheduleReport of the last parallel solve
+        self.last_report: Optional[ScheduleReport] = None
+
+    def tables(self, shape: Tuple[int, int]) -> BoardTables:
+        """The lookup tables for boards of a certain size"""
+        shape = (int(shape[0]), int(shape[1]))
+        if shape not in self.tables_by_shape:
+            self.tables_by_shape[shape] = (BoardTables.load(shape, self.table_directory)
+                                           if self.table_directory is not None else BoardTables(shape))
+        return self.tables_by_shape[shape]
+
+    def basis_lists(self, card_pool: Sequence[str], decksizes: Sequence[int]) -> List[List[str]]:
+        """The basis lists of a card pool (see basislists.py)"""
+        key = (tuple(card_pool), tuple(decksizes))
+        if key not in self.basis_lists_by_pool:
+            self.basis_lists_by_pool[key] = generate(list(card_pool), list(decksizes))
+        return self.basis_lists_by_pool[key]
+
+
+def as_template(board_spec: Union[BoardTemplate, dict]) -> BoardTemplate:
+    """
+    Accepts either a BoardTemplate, or a dictionary with the arguments of BoardTemplate
+    ('shape', and optionally 'minions', 'oil', 'walls', 'bomb' and 'repair_pad')
+    """
+    if isinstance(board_spec, BoardTemplate):
+        return board_spec
+    return BoardTemplate(**board_spec)
+
+
+def make_mech(template: BoardTemplate, tables: BoardTables, position: Cell, orientation: Cell,
+              cmd_line: Sequence[str]) -> Mech:
+    """
+    Puts a Mech with a command line onto a fresh board
+    :param template: the starting board
+    :param tables: the lookup tables of the board
+    :param position: (x, y) of the Mech
+    :param orientation: the direction the Mech is facing
+    :param cmd_line: the command line as card strings
+    :return: the Mech
+    """
+    mech = Mech(template.instantiate(tables), np.array(position), np.array(orientation),
+                direction_names.get(orientation, 'Mech'))
+    load_command_line(mech, cmd_line)
+    return mech
+
+
+# everything a job needs besides its command line and orientation
+JobState = Tuple[BoardTemplate, BoardTables, Cell, SolveOptions]
+
+# state of a worker process (set once by _init_worker). Only the pool uses it: solves in this process pass their
+# state along with every job, since several solve() generators could be taking turns
+worker_state: Optional[JobState] = None
+
+
+def _init_worker(template: BoardTemplate, tables: BoardTables, position: Cell, options: SolveOptions) -> None:
+    global worker_state
+    worker_state = (template, tables, position, options)
+
+
+def _solve_job(job: Tuple[Tuple[str, ...], Cell]) -> SolveResult:
+    return _solve_job_with(worker_state, job)
+
+
+def _solve_job_with(state: JobState, job: Tuple[Tuple[str, ...], Cell]) -> SolveResult:
+    template, tables, position, options = state
+    cmd_line, orientation = job
+    mech = make_mech(template, tables, position, orientation, cmd_line)
+    if options.count_only:
+        with record_reads() if options.record_reads else nullcontext() as read_set:
+            counts: CountResult = count_engine(mech.board, mech, options.budget)
+        search = SearchResult(counts.status, counts.nodes, counts.seconds, counts.winning_paths, counts.best_minions,
+                              None)
+        return SolveResult(cmd_line, orientation, search, os.getpid(), counts=counts,
+                           read_set=frozenset(read_set) if read_set is not None else None)
+    if options.objective is None:
+        if options.record_reads:
+            with record_reads() as read_set:
+                search: SearchResult = engine(mech.board, mech, options.budget)
+            return SolveResult(cmd_line, orientation, search, os.getpid(), read_set=frozenset(read_set))
+        return SolveResult(cmd_line, orientation, engine(mech.board, mech, options.budget), os.getpid())
+    result: OptimizeResult = optimize(mech.board, mech, options.objective, options.top_k, options.budget)
+    # summarize the best lines the same way engine() would
+    minions_left: List[int] = [count_minions(line.mech.board) for line in result.lines]
+    best_mech: Optional[Mech] = result.lines[0].mech if result.lines else None
+    search = SearchResult(result.status, result.nodes, result.seconds,
+                          sum(win_check(line.mech.board) for line in result.lines),
+                          min(minions_left) if minions_left else None, best_mech)
+    return SolveResult(cmd_line, orientation, search, os.getpid(), result.lines)
+
+
+def list_jobs(template: BoardTemplate, tables: BoardTables, mech_pose: Tuple[Cell, Optional[Cell]],
+              card_pool: Sequence[str], decksizes: Sequence[int], options: SolveOptions,
+              cache: SolveCache) -> List[Tuple[Tuple[str, ...], Cell]]:
+    """
+    Lists the (command line, orientation) jobs of a solve, leaving out the ones the prefilter rules out
+    (the arguments are the same as for solve())
+    :return: the jobs
+    """
+    position: Cell = (int(mech_pose[0][0]), int(mech_pose[0][1]))
+    if mech_pose[1] is None:
+        orientations: List[Cell] = list(direction_names)
+    else:
+        orientations: List[Cell] = [(int(mech_pose[1][0]), int(mech_pose[1][1]))]
+
+    jobs: List[Tuple[Tuple[str, ...], Cell]] = []
+    # generate() can hand out the same multiset of cards more than once (in a different order),
+    # so the command lines are deduplicated across all the basis lists, not just within one
+    seen: Set[Tuple[str, ...]] = set()
+    for basis_list in cache.basis_lists(card_pool, decksizes):
+        for cmd_line in sorted(set(permutations(basis_list)) - seen):
+            seen.add(cmd_line)
+            for orientation in orientations:
+                if (options.prefilter and options.objective is None and
+                        not is_feasible(make_mech(template, tables, position, orientation, cmd_line))):
+                    continue
+                jobs.append((cmd_line, orientation))
+    return jobs
+
+
+def measure_branching(template: BoardTemplate, tables: BoardTables, position: Cell,
+                      jobs: List[Tuple[Tuple[str, ...], Cell]]) -> Dict[Tuple[str, int], float]:
+    """
+    Counts the options every card of the jobs actually asks for on the board, with the Mech where it starts
+    (see branch_counts.collapsed_branches()), averaged over the orientations of the jobs. It's what the scheduler
+    estimates the cost of a job with
+    :return: (card, level) -> the average number of options
+    """
+    cards: Set[Tuple[str, int]] = {parse_card(card) for cmd_line, _ in jobs for card in cmd_line}
+    orientations: Set[Cell] = {orientation for _, orientation in jobs}
+    branching: Dict[Tuple[str, int], float] = {}
+    for card, level in sorted(cards):
+        counts: List[int] = [collapsed_branches(make_mech(template, tables, position, orientation, []), card, level)
+                             for orientation in sorted(orientations)]
+        branching[(card, level)] = sum(counts) / len(counts)
+    return branching
+
+
+def run_jobs(template: BoardTemplate, tables: BoardTables, position: Cell, jobs: List[Tuple[Tuple[str, ...], Cell]],
+             options: SolveOptions, cache: SolveCache) -> Iterator[SolveResult]:
+    """
+    Searches a list of jobs, in this process or in worker processes (see SolveOptions.workers)
+    :return: yields a SolveResult for every job (in the order they finish)
+    """
+    cache.last_report = None
+    if options.workers <= 1:
+        solve_job: Callable[[Tuple[Tuple[str, ...], Cell]], SolveResult] = partial(
+            _solve_job_with, (template, tables, position, options))
+        for job in jobs:
+            yield solve_job(job)
+        return
+
+    timings: CardTimings = CardTimings(options.timings_path, measure_branching(template, tables, position, jobs))
+    scheduler = JobScheduler(_solve_job, options.workers, timings,
+                             _init_worker, (template, tables, position, options))
+    for job_timing in scheduler.run(jobs):
+        yield job_timing.result
+    cache.last_report = scheduler.report
+
+
+def solve(board_spec: Union[BoardTemplate, dict], mech_pose: Tuple[Cell, Optional[Cell]], card_pool: Sequence[str],
+          decksizes: Sequence[int], options: Optional[SolveOptions] = None,
+          cache: Optional[SolveCache] = None) -> Iterator[SolveResult]:
+    """
+    Searches every command line that can be made out of a card pool
+    :param board_spec: the starting board, as a BoardTemplate (or a dictionary, see as_template())
+    :param mech_pose: ((x, y), orientation) of the Mech. If the orientation is None, all 4 orientations are tried
+    :param card_pool: the card pool (see basislists.generate())
+    :param decksizes: the numbers of cards to put in the command line (see basislists.generate())
+    :param options: SolveOptions
+    :param cache: a SolveCache to reuse between calls. If None, a new one is made (and thrown away)
+    :return: yields a SolveResult for every (command line, orientation) job that was searched
+    """
+    options = options if options is not None else SolveOptions()
+    cache = cache if cache is not None else SolveCache()
+    template: BoardTemplate = as_template(board_spec)
+    tables: BoardTables = cache.tables(template.shape)
+    position: Cell = (int(mech_pose[0][0]), int(mech_pose[0][1]))
+    jobs: List[Tuple[Tuple[str, ...], Cell]] = list_jobs(template, tables, mech_pose, card_pool, decksizes,
+                                                         options, cache)
+    cache.last_job_count = len(jobs)
+    yield from run_jobs(template, tables, position, jobs, options, cache)
@@ -0,0 +1,79 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+# Measures how long a fresh process takes from starting up to its first solve() result, which is what short jobs
+# and CLI calls mostly pay for: the imports, building the lookup tables (or mapping them, see BoardTables.load())
+# and then a single tiny job.
+
+# the child process: solve a one-card puzzle on an empty-ish board, and stop at the first result
+child_script: str = '''
+import sys
+from solve import solve, SolveCache, SolveOptions
+size, table_directory = int(sys.argv[1]), sys.argv[2] or None
+board = {'shape': (size, size), 'minions': [(0, 0), (size - 1, size - 1)]}
+cache = SolveCache(table_directory)
+next(solve(board, ((size // 2, size // 2), (1, 0)), ['Scythe'], [1], SolveOptions(prefilter=False), cache))
+'''
+
+
+class StartupRow(NamedTuple):
+    size: int
+    tables: str  # 'built' (every process builds them), 'cold' (built and saved) or 'cached' (mapped from disk)
+    seconds: float  # median wall time of a whole process, from starting it to its first result
+
+
+def time_process(arguments: List[str], repeats: int) -> float:
+    """The median wall time of running a process a few times"""
+    times: List[float] = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        subprocess.run(arguments, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(time.perf_counter() - start_time)
+    return sorted(times)[len(times) // 2]
+
+
+def run_benchmark(sizes: Tuple[int, ...] = (6, 20, 40, 80), repeats: int = 5,
+                  table_directory: Optional[str] = None) -> Tuple[float, List[StartupRow]]:
+    """
+    Times the first result of a fresh process with the tables built, saved for the first time, and mapped from disk
+    :param sizes: board sizes to try
+    :param repeats: runs per measurement (the median is kept)
+    :param table_directory: where to keep the tables (a temporary directory, thrown away afterwards, if None)
+    :return: (the time it takes just to import solve.py, a StartupRow for every size and way of getting the tables)
+    """
+    own_directory: bool = table_directory is None
+    table_directory = tempfile.mkdtemp(prefix='board_tables_') if own_directory else table_directory
+    rows: List[StartupRow] = []
+    try:
+        import_seconds: float = time_process([sys.executable, '-c', 'import solve'], repeats)
+        for size in sizes:
+            rows.append(StartupRow(size, 'built', time_process([sys.executable, '-c', child_script, str(size), ''],
+                                                               repeats)))
+            # only the first run finds the directory empty
+            size_directory: str = os.path.join(table_directory, str(size))
+            rows.append(StartupRow(size, 'cold', time_process([sys.executable, '-c', child_script, str(size),
+                                                               size_directory], 1)))
+            rows.append(StartupRow(size, 'cached', time_process([sys.executable, '-c', child_script, str(size),
+                                                                 size_directory], repeats)))
+    finally:
+        if own_directory:
+            shutil.rmtree(table_directory, ignore_errors=True)
+    return import_seconds, rows
+
+
+def benchmark_table(import_seconds: float, rows: List[StartupRow]) -> str:
+    """Formats the rows as a table"""
+    lines = [f'importing solve.py alone: {import_seconds * 1000:.0f} ms',
+             f"{'size':>5}  {'tables':>7}  {'first result ms':>15}"]
+    for row in rows:
+        lines.append(f'{row.size:>5}  {row.tables:>7}  {row.seconds * 1000:>15.0f}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    print(benchmark_table(*run_benchmark()))
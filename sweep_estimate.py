@@ -0,0 +1,186 @@
+import random
+import time
+from collections import Counter
+from fractions import Fraction
+from itertools import product
+from math import factorial
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+from board import Board
+from entities import Mech
+from basislists import generate
+from game_flow import load_command_line
+from engine import engine
+from copy import deepcopy
+import numpy as np
+
+# Counts how big a sweep is going to be *before* running it.
+# basislists.generate() puts every card of the pool that isn't in the command line on top of a card of the same color
+# (or throws it away), so within a single color, a basis list is just a choice of cards plus a level for each of them,
+# where the levels above 1 can't add up to more than the leftover cards of that color.
+# The colors don't interact, so every color is counted on its own and then the colors are multiplied together.
+
+orientations: int = 4  # every command line is tried facing right, up, left and down
+
+
+class SweepCount(NamedTuple):
+    basis_lists: int  # distinct basis lists (multisets of cards and levels)
+    permutations: int  # what itertools.permutations hands out for them, duplicates included
+    command_lines: int  # distinct command lines
+    jobs: int  # distinct command lines * orientations (what solve.list_jobs() lists without the prefilter)
+
+
+# maps a number of cards to (number of distinct partial basis lists, sum of 1 / (product of multiplicity factorials))
+# the second number is what turns "number of basis lists" into "number of distinct orderings of basis lists"
+SizeTable = Dict[int, Tuple[int, Fraction]]
+
+
+def level_table(copies: int) -> Dict[int, List[Tuple[int, Fraction]]]:
+    """
+    Lists the ways to give levels to several copies of the same card
+    :param copies: number of copies of the card in the basis list
+    :return: maps the cost (number of extra cards used to level the copies up) to (1, weight) entries
+    """
+    table: Dict[int, List[Tuple[int, Fraction]]] = {}
+    for level_2 in range(copies + 1):
+        for level_3 in range(copies - level_2 + 1):
+            level_1: int = copies - level_2 - level_3
+            weight = Fraction(1, factorial(level_1) * factorial(level_2) * factorial(level_3))
+            table.setdefault(level_2 + 2 * level_3, []).append((1, weight))
+    return table
+
+
+def color_table(pool: Counter) -> SizeTable:
+    """
+    Counts the partial basis lists a single color can contribute
+    :param pool: how many copies of each card of this color are in the card pool
+    :return: a SizeTable
+    """
+    total: int = sum(pool.values())
+    table: SizeTable = {0: (1, Fraction(1))}
+    names: List[str] = list(pool)
+    for chosen in product(*(range(pool[name] + 1) for name in names)):
+        size: int = sum(chosen)
+        if size == 0:
+            continue
+        leftover: int = total - size
+        # costs maps the number of leftover cards used so far to (count, weight)
+        costs: Dict[int, Tuple[int, Fraction]] = {0: (1, Fraction(1))}
+        for copies in chosen:
+            if copies == 0:
+                continue
+            new_costs: Dict[int, Tuple[int, Fraction]] = {}
+            for cost, (count, weight) in costs.items():
+                for extra_cost, entries in level_table(copies).items():
+                    if cost + extra_cost > leftover:
+                        continue
+                    for extra_count, extra_weight in entries:
+                        old_count, old_weight = new_costs.get(cost + extra_cost, (0, Fraction(0)))
+                        new_costs[cost + extra_cost] = (old_count + count * extra_count,
+                                                        old_weight + weight * extra_weight)
+            costs = new_costs
+        old_count, old_weight = table.get(size, (0, Fraction(0)))
+        table[size] = (old_count + sum(count for count, _ in costs.values()),
+                       old_weight + sum(weight for _, weight in costs.values()))
+    return table
+
+
+def combine(first: SizeTable, second: SizeTable) -> SizeTable:
+    """Multiplies two SizeTables together (the sizes add up)"""
+    table: SizeTable = {}
+    for size_1, (count_1, weight_1) in first.items():
+        for size_2, (count_2, weight_2) in second.items():
+            old_count, old_weight = table.get(size_1 + size_2, (0, Fraction(0)))
+            table[size_1 + size_2] = (old_count + count_1 * count_2, old_weight + weight_1 * weight_2)
+    return table
+
+
+def count_sweep(cards: Sequence[str], decksizes: Sequence[int]) -> SweepCount:
+    """
+    Counts the basis lists, command lines and jobs a sweep would produce, without generating any of them.
+    Every basis list is only counted once, even though generate() can hand out the same one more than once
+    (in a different order), so the command lines and jobs are the ones solve.list_jobs() actually searches.
+    :param cards: the card pool (same as for basislists.generate)
+    :param decksizes: the numbers of cards to put in the command line (same as for basislists.generate)
+    :return: a SweepCount
+    """
+    pools: Dict[str, Counter] = {}
+    unknown: int = 0
+    for card in cards:
+        color = Mech.card_colors.get(card)
+        if color is None or color == 'none':
+            # generate() lets these take up room in the command line, but then drops them
+            unknown += 1
+        else:
+            pools.setdefault(color, Counter())[card] += 1
+    table: SizeTable = {0: (1, Fraction(1))}
+    for pool in pools.values():
+        table = combine(table, color_table(pool))
+    sizes = {size - dropped for size in decksizes for dropped in range(min(unknown, size) + 1)}
+    sizes.discard(0)
+    basis_lists = permutations = command_lines = 0
+    for size in sizes:
+        count, weight = table.get(size, (0, Fraction(0)))
+        basis_lists += count
+        permutations += count * factorial(size)
+        command_lines += int(weight * factorial(size))
+    return SweepCount(basis_lists, permutations, command_lines, command_lines * orientations)
+
+
+def sample_job_seconds(board: Board, position: Tuple[int, int], cards: Sequence[str], decksizes: Sequence[int],
+                       samples: int = 5, seed: int = 0) -> List[float]:
+    """
+    Times the engine on a few random jobs of a sweep
+    :param board: the starting board (without the Mech)
+    :param position: the Mech's starting square
+    :param cards: the card pool
+    :param decksizes: the numbers of cards to put in the command line
+    :param samples: number of jobs to time
+    :param seed: seed for picking the jobs
+    :return: the time each job took, in seconds
+    """
+    rng = random.Random(seed)
+    # generate() can repeat a basis list, which would make its command lines come up more often than the others
+    basis_lists: List[List[str]] = [list(basis_list) for basis_list in
+                                    sorted({tuple(sorted(basis_list)) for basis_list in generate(list(cards),
+                                                                                                 list(decksizes))})]
+    if not basis_lists:
+        return []
+    # every ordering is a job, so longer basis lists have to be picked more often
+    weights: List[int] = [factorial(len(basis_list)) for basis_list in basis_lists]
+    directions = [np.array([1, 0]), np.array([0, 1]), np.array([-1, 0]), np.array([0, -1])]
+    seconds: List[float] = []
+    for _ in range(samples):
+        cmd_line: List[str] = rng.choices(basis_lists, weights)[0].copy()
+        rng.shuffle(cmd_line)
+        mech = Mech(deepcopy(board), np.array(position), rng.choice(directions).copy(), 'Sample')
+        load_command_line(mech, cmd_line)
+        start_time = time.perf_counter()
+        engine(mech.board, mech)
+        seconds.append(time.perf_counter() - start_time)
+    return seconds
+
+
+def estimate_eta(count: SweepCount, job_seconds: Sequence[float], workers: int = 1) -> float:
+    """
+    Estimates how long a sweep will take
+    :param count: the SweepCount of the sweep
+    :param job_seconds: sampled job times (see sample_job_seconds)
+    :param workers: number of worker processes
+    :return: the estimated wall time, in seconds
+    """
+    if not job_seconds:
+        return 0.0
+    return count.jobs * (sum(job_seconds) / len(job_seconds)) / workers
+
+
+if __name__ == '__main__':
+    from game_flow import initialize_starting_board
+
+    estimate_cards = ['Blaze', 'Cyclotron', 'Flamespitter', 'Omnistomp', 'Omnistomp', 'Skewer', 'Speed']
+    estimate_count = count_sweep(estimate_cards, [6])
+    print(estimate_count)
+    estimate_board: Board = Board(np.zeros((6, 6)))
+    initialize_starting_board(estimate_board, np.array([[0, 2], [1, 2], [2, 0], [2, 1], [2, 4], [5, 2]]),
+                              np.array([[2, 2], [2, 3], [3, 2], [3, 3]]))
+    estimate_seconds = sample_job_seconds(estimate_board, (4, 4), estimate_cards, [6])
+    print(f'ETA: {estimate_eta(estimate_count, estimate_seconds):.1f} seconds on 1 worker')
@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+import time
+from typing import Dict, Optional, TextIO
+
+# Keeps track of how a sweep is going: how fast jobs and search nodes are getting through, how long is left,
+# how many wins have been found, and how busy each worker is.
+# The console line and the stats file are only refreshed every so often, so reporting progress
+# doesn't slow down the sweep itself.
+
+
+class WorkerStats:
+    def __init__(self) -> None:
+        """Running totals for a single worker process"""
+        self.jobs: int = 0
+        self.nodes: int = 0
+        self.busy_seconds: float = 0.0
+
+
+class SweepTelemetry:
+    def __init__(self, total_jobs: int, workers: int, print_interval: float = 2.0,
+                 stats_path: Optional[str] = None, stats_interval: float = 5.0,
+                 stream: TextIO = sys.stdout) -> None:
+        """
+        Creates the progress tracker of a sweep
+        :param total_jobs: number of jobs in the sweep (for the ETA)
+        :param workers: number of worker processes (for the utilisation)
+        :param print_interval: minimum number of seconds between two progress lines
+        :param stats_path: if given, a JSON file with the current stats is written here every stats_interval seconds
+        :param stats_interval: minimum number of seconds between two writes of the stats file
+        :param stream: where the progress lines are printed
+        """
+        self.total_jobs: int = total_jobs
+        self.workers: int = workers
+        self.print_interval: float = print_interval
+        self.stats_path: Optional[str] = stats_path
+        self.stats_interval: float = stats_interval
+        self.stream: TextIO = stream
+        self.start_time: float = time.perf_counter()
+        self.last_print: float = self.start_time
+        self.last_stats: float = self.start_time
+        self.jobs_done: int = 0
+        self.nodes: int = 0
+        self.wins: int = 0
+        self.worker_stats: Dict[int, WorkerStats] = {}
+
+    def elapsed(self) -> float:
+        """Seconds since the sweep started"""
+        return time.perf_counter() - self.start_time
+
+    def jobs_per_second(self) -> float:
+        elapsed = self.elapsed()
+        return self.jobs_done / elapsed if elapsed > 0 else 0.0
+
+    def nodes_per_second(self) -> float:
+        elapsed = self.elapsed()
+        return self.nodes / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        """Estimated seconds until the sweep is done (None until the first job finishes)"""
+        rate = self.jobs_per_second()
+        if rate == 0:
+            return None
+        return (self.total_jobs - self.jobs_done) / rate
+
+    def utilisation(self) -> Dict[int, float]:
+        """The fraction of the elapsed time each worker spent running jobs"""
+        elapsed = self.elapsed()
+        return {worker: (stats.busy_seconds / elapsed if elapsed > 0 else 0.0)
+                for worker, stats in self.worker_stats.items()}
+
+    def job_done(self, worker: int, nodes: int, wins: int, seconds: float) -> None:
+        """
+        Records a finished job, and refreshes the console line and stats file if it's time to
+        :param worker: id of the worker that ran the job (e.g. its pid)
+        :param nodes: number of search nodes the job took
+        :param wins: number of winning lines the job found
+        :param seconds: how long the job took inside the worker
+        :return: None
+        """
+        self.jobs_done += 1
+        self.nodes += nodes
+        self.wins += wins
+        stats = self.worker_stats.setdefault(worker, WorkerStats())
+        stats.jobs += 1
+        stats.nodes += nodes
+        stats.busy_seconds += seconds
+        now = time.perf_counter()
+        if now - self.last_print >= self.print_interval:
+            self.last_print = now
+            self.print_progress()
+        if self.stats_path is not None and now - self.last_stats >= self.stats_interval:
+            self.last_stats = now
+            self.write_stats()
+
+    def progress_line(self) -> str:
+        eta = self.eta()
+        eta_text = f'{eta:.0f}s' if eta is not None else '?'
+        utilisation = self.utilisation()
+        average_utilisation = sum(utilisation.values()) / self.workers if self.workers else 0.0
+        return (f'{self.jobs_done}/{self.total_jobs} jobs, {self.jobs_per_second():.1f} jobs/s, '
+                f'{self.nodes_per_second():.0f} nodes/s, {self.wins} wins, ETA {eta_text}, '
+                f'workers {average_utilisation:.0%} busy')
+
+    def print_progress(self) -> None:
+        print(self.progress_line(), file=self.stream, flush=True)
+
+    def stats(self) -> dict:
+        """Everything tracked so far, as a JSON-friendly dictionary"""
+        utilisation = self.utilisation()
+        return {
+            'elapsed': self.elapsed(), 'total_jobs': self.total_jobs, 'jobs_done': self.jobs_done,
+            'jobs_per_second': self.jobs_per_second(), 'nodes': self.nodes,
+            'nodes_per_second': self.nodes_per_second(), 'wins': self.wins, 'eta': self.eta(),
+            'workers': {str(worker): {'jobs': stats.jobs, 'nodes': stats.nodes,
+                                      'busy_seconds': stats.busy_seconds, 'utilisation': utilisation[worker]}
+                        for worker, stats in self.worker_stats.items()}
+        }
+
+    def write_stats(self) -> None:
+        """Writes the stats file (to a temporary file first, so readers never see half a file)"""
+        temporary_path = f'{self.stats_path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(self.stats(), file, indent=1)
+        os.replace(temporary_path, self.stats_path)
+
+    def close(self) -> None:
+        """Prints the final progress line and writes the stats file one last time"""
+        self.print_progress()
+        if self.stats_path is not None:
+            self.write_stats()
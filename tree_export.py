@@ -0,0 +1,186 @@
+import json
+import random
+import sys
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from auxiliary_functions import Prompt
+    from entities import Mech
+
+# Records the search tree of engine.engine() (engine(..., tree=TreeRecorder())), for when a command line is a lot
+# slower than it should be and it's not clear where its tree blows up.
+# Every executed prompt is a node. A sample of them is kept with their parent, card, option and how big their subtree
+# turned out to be (a reservoir sample, so huge trees don't need huge files), and every node is counted under
+# its card sequence ("Blaze 2;Speed 1;...") exactly. The card sequences can be folded into the "collapsed stacks"
+# that flame graph tools read (python tree_export.py fold tree.json > tree.folded), which shows which
+# cards the nodes (or the time) go to.
+
+
+class TreeNode(NamedTuple):
+    id: int  # the root (the Mech before any prompt) is 0, every executed prompt gets the next number
+    parent: int  # -1 for the root
+    card: str  # the card the prompt belongs to ('root' for the root)
+    choice: int  # the option that was picked (-1 for the root)
+    subtree: int  # nodes in its subtree, including itself
+    seconds: float  # time spent executing the prompt (copying the Mech included)
+    subtree_seconds: float  # the same, for the whole subtree
+
+
+class _OpenNode(NamedTuple):
+    """A node whose subtree is still being searched"""
+    id: int
+    parent: int
+    card: str
+    choice: int
+    seconds: float
+    position: int  # where the node's Mech went on the search stack (its subtree is done once the stack is back to it)
+    first_node: int  # nodes recorded before its subtree started being searched
+    first_seconds: float  # time recorded before its subtree started being searched
+
+
+class TreeRecorder:
+    def __init__(self, capacity: int = 10000, seed: Optional[int] = None) -> None:
+        """
+        :param capacity: the most nodes kept in the sample
+        :param seed: seed of the reservoir sampling (None for a random one)
+        """
+        self.capacity: int = capacity
+        self.rng = random.Random(seed)
+        self.sample: List[TreeNode] = []
+        self.nodes: int = 0
+        self.seconds: float = 0.0
+        # card sequence -> [nodes, seconds], for every node
+        self.folded: Dict[Tuple[str, ...], List[float]] = {}
+        self.open_nodes: List[_OpenNode] = []
+        self.closed: int = 0
+
+    def start(self, mech: 'Mech') -> None:
+        """Makes the Mech the root of the tree (called by engine.depth_first())"""
+        mech.tree_node = (0, None, ())
+        self.nodes = 1
+        self.open_nodes.append(_OpenNode(0, -1, 'root', -1, 0.0, 0, 1, 0.0))
+        self.folded.setdefault((), [0, 0.0])[0] += 1
+
+    def add(self, mech: 'Mech', prompt: 'Prompt', choice: int, seconds: float, position: int) -> None:
+        """
+        Records an executed prompt (called by engine.depth_first())
+        :param mech: the Mech the prompt was executed on (it still has its parent's tree_node)
+        :param prompt: the prompt
+        :param choice: the option that was picked
+        :param seconds: the time it took
+        :param position: where on the search stack the Mech is going
+        :return: None
+        """
+        parent, slot, cards = mech.tree_node if mech.tree_node is not None else (-1, None, ())
+        if prompt.slot is not None and prompt.slot != slot:
+            # the first prompt of the next card
+            slot = prompt.slot
+            cards = cards + (f'{prompt.card} {mech.command_line[slot - 1][1]}',)
+        node_id: int = self.nodes
+        mech.tree_node = (node_id, slot, cards)
+        self.nodes += 1
+        self.seconds += seconds
+        node = _OpenNode(node_id, parent, cards[-1] if cards else 'root', choice, seconds, position,
+                         self.nodes, self.seconds)
+        if mech.prompt_stack:
+            self.open_nodes.append(node)
+        else:
+            # the line ends here
+            self._close(node)
+        counts: List[float] = self.folded.setdefault(cards, [0, 0.0])
+        counts[0] += 1
+        counts[1] += seconds
+
+    def expand(self, mech: 'Mech') -> None:
+        """
+        Marks where the subtree of the Mech's node starts (called by engine.depth_first() when it takes the Mech
+        off the stack). Its siblings are made before it's searched, so counting from when it was made would include them
+        """
+        if self.open_nodes and mech.tree_node is not None and self.open_nodes[-1].id == mech.tree_node[0]:
+            self.open_nodes[-1] = self.open_nodes[-1]._replace(first_node=self.nodes, first_seconds=self.seconds)
+
+    def close_subtrees(self, stack_length: int) -> None:
+        """
+        Finishes the nodes whose subtrees are done, now that the search stack is down to stack_length
+        (called by engine.depth_first())
+        """
+        while self.open_nodes and self.open_nodes[-1].position >= stack_length:
+            self._close(self.open_nodes.pop())
+
+    def _close(self, open_node: _OpenNode) -> None:
+        """Finishes a node, and puts it in the sample with reservoir sampling (every node has the same chance)"""
+        node = TreeNode(open_node.id, open_node.parent, open_node.card, open_node.choice,
+                        1 + self.nodes - open_node.first_node, open_node.seconds,
+                        open_node.seconds + self.seconds - open_node.first_seconds)
+        self.closed += 1
+        if len(self.sample) < self.capacity:
+            self.sample.append(node)
+        else:
+            index: int = self.rng.randrange(self.closed)
+            if index < self.capacity:
+                self.sample[index] = node
+
+    def to_dict(self) -> dict:
+        """The recorded tree, column by column (the card names are stored once and referred to by index)"""
+        card_names: List[str] = sorted({node.card for node in self.sample})
+        card_index: Dict[str, int] = {name: i for i, name in enumerate(card_names)}
+        sample: List[TreeNode] = sorted(self.sample, key=lambda node: node.id)
+        return {
+            'nodes': self.nodes,
+            'seconds': self.seconds,
+            'cards': card_names,
+            'sample': {
+                'id': [node.id for node in sample],
+                'parent': [node.parent for node in sample],
+                'card': [card_index[node.card] for node in sample],
+                'choice': [node.choice for node in sample],
+                'subtree': [node.subtree for node in sample],
+                'seconds': [round(node.seconds, 7) for node in sample],
+                'subtree_seconds': [round(node.subtree_seconds, 7) for node in sample]
+            },
+            'folded': [[list(cards), int(counts[0]), round(counts[1], 7)] for cards, counts in self.folded.items()]
+        }
+
+    def save(self, path: str) -> None:
+        """Writes the recorded tree to a JSON file"""
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, separators=(',', ':'))
+
+
+def load_sample(path: str) -> List[TreeNode]:
+    """Reads the sampled nodes back out of a file written by TreeRecorder.save()"""
+    with open(path) as file:
+        data = json.load(file)
+    columns = data['sample']
+    return [TreeNode(*row[:2], data['cards'][row[2]], *row[3:])
+            for row in zip(columns['id'], columns['parent'], columns['card'], columns['choice'], columns['subtree'],
+                           columns['seconds'], columns['subtree_seconds'])]
+
+
+def fold(path: str, weight: str = 'nodes') -> List[str]:
+    """
+    Turns a file written by TreeRecorder.save() into collapsed stacks ("root;Blaze 2;Speed 1 1234"), one line per
+    card sequence, which flame graph tools (flamegraph.pl, speedscope, ...) can read
+    :param path: the file
+    :param weight: 'nodes' to weigh every card sequence by its number of nodes, 'time' by its time (in microseconds)
+    :return: the lines
+    """
+    with open(path) as file:
+        data = json.load(file)
+    lines: List[str] = []
+    for cards, nodes, seconds in sorted(data['folded']):
+        value: int = nodes if weight == 'nodes' else round(seconds * 1e6)
+        if value > 0:
+            lines.append(';'.join(['root'] + cards) + f' {value}')
+    return lines
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fold a recorded search tree into flame graph collapsed stacks')
+    parser.add_argument('command', choices=['fold'])
+    parser.add_argument('tree_file')
+    parser.add_argument('--weight', choices=['nodes', 'time'], default='nodes')
+    arguments = parser.parse_args()
+    sys.stdout.write('\n'.join(fold(arguments.tree_file, arguments.weight)) + '\n')